@@ -1,4 +1,5 @@
 """Backend module for University AI Assistant."""
+import os
 from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
@@ -16,10 +17,24 @@ def create_app(config_name='development'):
     
     # Initialize extensions
     db.init_app(app)
-    CORS(app)
+    CORS(app, expose_headers=['Server-Timing'])
+    
+    # Request latency histograms, /metrics and the Server-Timing header
+    from backend import instrumentation
+    instrumentation.init_app(app)
     
     # Register blueprints
-    from backend.routes import api_bp
+    from backend.routes import api_bp, services
     app.register_blueprint(api_bp)
     
+    # SESSION_STORE=sqlalchemy keeps chat sessions in this database
+    if os.getenv('SESSION_STORE', 'memory').lower() == 'sqlalchemy':
+        import backend.models  # defines the tables create_all() creates
+        with app.app_context():
+            db.create_all()
+    
+    # Build services in the background; otherwise the first /api/ready starts it
+    if os.getenv('WARMUP_ON_START', 'True') == 'True':
+        services.start_warm_up()
+    
     return app
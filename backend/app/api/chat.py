@@ -4,82 +4,299 @@ Handles user queries and returns AI-generated responses with source citations
 """
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+import asyncio
 import logging
+import os
+import time
+import uuid
+import numpy as np
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from app.core.context_selection import ContextChunk
+from app.core.conversation import PackedContext, Turn
+from app.core.executor import DeadlineExceeded, Overloaded
+from app.core.metrics import record_stage, timed
+from app.core.streaming import FakeStreamingLLM, sse_event
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Passages below this cosine similarity are not worth sending to the LLM
+CHAT_MIN_SCORE = float(os.getenv('CHAT_MIN_SCORE', 0.3))
+
+# Passages cited per answer, and how many times as many candidates are
+# retrieved for the context selector to choose them from
+CHAT_TOP_K = int(os.getenv('CHAT_TOP_K', 3))
+CONTEXT_FETCH_FACTOR = int(os.getenv('CONTEXT_FETCH_FACTOR', 3))
+
+# Mock local LLM - replace with actual LLM inference (e.g. Mistral or LLaMA)
+local_llm = FakeStreamingLLM.from_env()
+
 class ChatRequest(BaseModel):
     """Chat request model"""
     query: str = Field(..., min_length=1, max_length=1000)
     max_tokens: int = Field(default=512, ge=50, le=2048)
+    # Continue an earlier conversation; a new session is started when omitted
+    session_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
+
+class Source(BaseModel):
+    """Passage cited by a response"""
+    doc_id: str
+    text: str
+    score: float
 
 class ChatResponse(BaseModel):
     """Chat response model"""
     response: str
-    sources: list = Field(default_factory=list)
+    sources: list[Source] = Field(default_factory=list)
+    # Served from the answer cache for a sufficiently similar earlier query
+    cached: bool = False
+    # Pass back as ChatRequest.session_id to continue the conversation
+    session_id: Optional[str] = None
+
+async def _cached_answer(request: Request, chat_req: ChatRequest) -> Tuple[Optional[np.ndarray], Optional[ChatResponse]]:
+    """Query embedding and the cached answer for it, if any (both None without a cache)"""
+    answer_cache = getattr(request.app.state, "answer_cache", None)
+    if answer_cache is None:
+        return None, None
+    vector_store = request.app.state.vector_store
+    # Lands in the embedding cache, so the search that follows does not re-embed the query
+    embedding = (await request.app.state.executor.run(vector_store.embedding_gen.embed, [chat_req.query]))[0]
+    cached = answer_cache.get(embedding, f"max_tokens={chat_req.max_tokens}")
+    if cached is None:
+        return embedding, None
+    logger.info(f"Answer cache hit ({cached.similarity:.3f}): {chat_req.query[:50]}...")
+    return embedding, cached.answer.model_copy(update={"cached": True})
+
+async def _retrieve_sources(request: Request, chat_req: ChatRequest) -> List[Source]:
+    """
+    Search for relevant passages (batched with concurrent requests)
+
+    With a context selector, CONTEXT_FETCH_FACTOR times as many candidates
+    are retrieved and reduced to a diverse, non-overlapping set.
+    """
+    selector = getattr(request.app.state, "context_selector", None)
+    top_k = CHAT_TOP_K * CONTEXT_FETCH_FACTOR if selector is not None else CHAT_TOP_K
+    with timed("retrieve"):
+        results = await request.app.state.query_batcher.search(chat_req.query, top_k=top_k, min_score=CHAT_MIN_SCORE)
+    if not results:
+        logger.info(f"No passages above {CHAT_MIN_SCORE} for: {chat_req.query[:50]}...")
+    # Passage text is read from the corpus only here, once per hit
+    if selector is None:
+        return [Source(doc_id=passage.doc_key, text=passage.text, score=passage.score) for passage in results]
+    # Passage IDs are allocated consecutively within a document, so they order its chunks
+    chunks = [ContextChunk(passage.text, passage.score, passage.doc_key, passage.id) for passage in results]
+    with timed("select", len(chunks)):
+        embeddings = request.app.state.vector_store.passage_vectors([passage.id for passage in results]) if results else None
+        selected = selector.select(chunks, CHAT_TOP_K, embeddings)
+    return [Source(doc_id=chunk.doc_id, text=chunk.text, score=chunk.score) for chunk in selected]
+
+def _format_context(sources: List[Source]) -> str:
+    return "\n".join([f"- {source.text}" for source in sources])
+
+# Session stores may hit disk (SESSION_STORE=sqlite), so they are called off the event loop
+async def _history(request: Request, session_id: str) -> List[Turn]:
+    sessions = getattr(request.app.state, "sessions", None)
+    return await asyncio.to_thread(sessions.history, session_id) if sessions is not None else []
+
+async def _remember(request: Request, session_id: str, query: str, answer: str):
+    sessions = getattr(request.app.state, "sessions", None)
+    if sessions is not None:
+        await asyncio.to_thread(sessions.append, session_id, Turn("user", query), Turn("assistant", answer))
+
+def _pack(request: Request, query: str, history: List[Turn], sources: List[Source]) -> Tuple[List[Source], str]:
+    """Fit history and passages into the prompt budget; returns the passages kept and the context"""
+    packer = getattr(request.app.state, "context_packer", None)
+    if packer is None:
+        return sources, _format_context(sources)
+    with timed("pack"):
+        packed: PackedContext = packer.pack(query, history, [source.text for source in sources])
+    sources = [sources[i] for i in packed.passages]
+    context = _format_context(sources)
+    if packed.history or packed.summary:
+        context += f"\n\nConversation so far:\n{packed.history_text()}"
+    return sources, context
+
+def _cache_answer(request: Request, chat_req: ChatRequest, embedding: Optional[np.ndarray],
+                  generation: Optional[str], chat_response: ChatResponse):
+    """Store an answer generated from sources, unless the index changed while it was generated"""
+    answer_cache = getattr(request.app.state, "answer_cache", None)
+    # An answer built from passages that changed meanwhile would outlive their invalidation
+    if (answer_cache is None or embedding is None or not chat_response.sources
+            or request.app.state.vector_store.generation != generation):
+        return
+    answer_cache.put(
+        embedding, chat_response, {source.doc_id for source in chat_response.sources},
+        f"max_tokens={chat_req.max_tokens}"
+    )
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: Request, chat_req: ChatRequest):
     """
     Chat endpoint - conversational Q&A with RAG
-    
-    Retrieves relevant documents and generates response using local LLM
-    
+
+    Retrieves relevant documents and generates response using local LLM.
+    Earlier turns of the session and the passages are packed into a fixed
+    token budget, so prompts do not grow with the conversation. Answers to
+    opening questions are cached by query embedding, so a near-duplicate
+    question skips retrieval and generation.
+
     Args:
         request: FastAPI request object
         chat_req: ChatRequest object with user query
-    
+
     Returns:
         ChatResponse with generated answer and sources
-    
+
     Raises:
         HTTPException: If query is invalid or processing fails
     """
     try:
         if not chat_req.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
-        
-        # Get vector store from app state
-        vector_store = request.app.state.vector_store
-        
-        # Search for relevant documents
-        results = vector_store.search(chat_req.query, top_k=3)
-        
-        # Format context from search results
-        context = "\n".join([f"- {doc[:100]}" for doc in results])
-        
-        # Generate response using mock LLM
-        response = generate_response(chat_req.query, context)
-        
+
+        session_id = chat_req.session_id or uuid.uuid4().hex
+        history = await _history(request, session_id)
+        generation = request.app.state.vector_store.generation
+        # A follow-up depends on the conversation, so only opening questions use the cache
+        embedding, cached = (None, None) if history else await _cached_answer(request, chat_req)
+        if cached is not None:
+            await _remember(request, session_id, chat_req.query, cached.response)
+            return cached.model_copy(update={"session_id": session_id})
+
+        sources = await _retrieve_sources(request, chat_req)
+
+        # Nothing relevant: skip context assembly and generation entirely
+        if not sources:
+            response = await asyncio.to_thread(generate_response, chat_req.query, "", chat_req.max_tokens)
+            await _remember(request, session_id, chat_req.query, response)
+            return ChatResponse(response=response, session_id=session_id)
+
+        # Generate response using mock LLM; a real local model blocks, so it runs off the event loop
+        sources, context = _pack(request, chat_req.query, history, sources)
+        response = await asyncio.to_thread(generate_response, chat_req.query, context, chat_req.max_tokens)
+
         logger.info(f"Chat query processed: {chat_req.query[:50]}...")
-        
-        return ChatResponse(
+
+        chat_response = ChatResponse(
             response=response,
-            sources=results
+            sources=sources
         )
-    
+        _cache_answer(request, chat_req, embedding, generation, chat_response)
+        await _remember(request, session_id, chat_req.query, response)
+        return chat_response.model_copy(update={"session_id": session_id})
+
     except HTTPException:
         raise
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Search timed out")
     except Exception as e:
         logger.error(f"Chat error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to process chat query")
 
-def generate_response(query: str, context: str) -> str:
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: Request, chat_req: ChatRequest):
+    """
+    Streaming chat over Server-Sent Events
+
+    Retrieval happens before the response starts, so errors still map to
+    HTTP status codes. The stream then sends:
+    - event: sources  list of cited passages, before any answer text
+    - event: token    {"text": ...} for each generated token
+    - event: done     {"cached": bool}
+    - event: error    {"detail": ...} if generation fails midway
+
+    The session ID is sent in the X-Session-ID header. Generation stops as
+    soon as the client disconnects; only completed answers join the session.
+    """
+    try:
+        if not chat_req.query.strip():
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+        session_id = chat_req.session_id or uuid.uuid4().hex
+        history = await _history(request, session_id)
+        generation = request.app.state.vector_store.generation
+        embedding, cached = (None, None) if history else await _cached_answer(request, chat_req)
+        if cached is not None:
+            sources, tokens = cached.sources, iter([cached.response])
+        else:
+            sources = await _retrieve_sources(request, chat_req)
+            sources, context = _pack(request, chat_req.query, history, sources) if sources else ([], "")
+            tokens = local_llm.stream(chat_req.query, context, chat_req.max_tokens)
+    except HTTPException:
+        raise
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to process chat query")
+
+    events = _stream_events(request, chat_req, session_id, sources, tokens, cached is not None, embedding, generation)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-ID": session_id}
+    )
+
+async def _stream_events(request: Request, chat_req: ChatRequest, session_id: str, sources: List[Source],
+                         tokens: Iterator[str], cached: bool, embedding: Optional[np.ndarray],
+                         generation: Optional[str]) -> AsyncIterator[str]:
+    """Sources first, then tokens as the generator produces them"""
+    yield sse_event("sources", [source.model_dump() for source in sources])
+    parts = []
+    # After the headers are sent, so only in the histogram, not in Server-Timing
+    started = time.perf_counter()
+    try:
+        while True:
+            # Stop generating for clients that went away; the server may also cancel us at an await
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected after {len(parts)} tokens: {chat_req.query[:50]}...")
+                return
+            # Each step of a real local model blocks, so it runs off the event loop
+            token = await asyncio.to_thread(next, tokens, None)
+            if token is None:
+                break
+            parts.append(token)
+            yield sse_event("token", {"text": token})
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}", exc_info=True)
+        yield sse_event("error", {"detail": "Failed to generate response"})
+        return
+    finally:
+        # Releases the generator; if a cancelled step is still running in its
+        # thread, nothing calls next() again, so generation stops after it
+        try:
+            getattr(tokens, "close", lambda: None)()
+        except ValueError:
+            pass
+        if not cached:
+            record_stage("generate", time.perf_counter() - started)
+
+    if not cached:
+        _cache_answer(request, chat_req, embedding, generation,
+                      ChatResponse(response="".join(parts), sources=sources))
+    await _remember(request, session_id, chat_req.query, "".join(parts))
+    yield sse_event("done", {"cached": cached})
+
+def generate_response(query: str, context: str, max_tokens: Optional[int] = None) -> str:
     """
     Generate response using retrieved context
     In production, this would use an actual LLM like Mistral or LLaMA
-    
+
     Args:
         query: User query
         context: Retrieved context from vector search
-    
+        max_tokens: Stop after this many tokens (as the streaming endpoint does)
+
     Returns:
         Generated response string
     """
     # Mock implementation - replace with actual LLM inference
-    if not context.strip():
-        return f"I couldn't find specific information about '{query}'. Please try a different question."
-    
-    return f"Based on our university information: {context[:200]}... For more details, please check the sources provided."
+    with timed("generate"):
+        return "".join(local_llm.stream(query, context, max_tokens))
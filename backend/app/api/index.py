@@ -0,0 +1,68 @@
+"""Index management API endpoints (incremental add/update/delete)"""
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+import logging
+from typing import Dict
+
+from app.api.search import MetadataValue
+
+from app.core.executor import Overloaded
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+class IndexDocument(BaseModel):
+    """Document to add or replace"""
+    id: str = Field(..., min_length=1, max_length=512)
+    content: str = Field(..., min_length=1)
+    # Flat fields to filter searches on, e.g. {"department": "cs", "term": "fall-2024"}
+    metadata: Dict[str, MetadataValue] = Field(default_factory=dict)
+
+class UpsertRequest(BaseModel):
+    """Batch of documents to upsert"""
+    documents: list[IndexDocument] = Field(..., min_length=1, max_length=1000)
+
+class DeleteRequest(BaseModel):
+    """Batch of document IDs to delete"""
+    ids: list[str] = Field(..., min_length=1, max_length=1000)
+
+class IndexResponse(BaseModel):
+    """Write result counts"""
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    total: int
+
+@router.post("/index", response_model=IndexResponse)
+async def upsert_endpoint(request: Request, upsert_req: UpsertRequest):
+    """
+    Add or replace documents; only changed documents are re-embedded
+
+    Each call publishes a new snapshot generation, rewriting the index and
+    BM25 arrays (see VectorStore.upsert), so batch documents per request.
+    """
+    vector_store = request.app.state.vector_store
+    documents = {doc.id: doc.content.strip() for doc in upsert_req.documents}
+    metadata = {doc.id: doc.metadata for doc in upsert_req.documents if doc.metadata}
+    try:
+        result = await request.app.state.executor.run(vector_store.upsert, documents, metadata)
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Upsert error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to index documents")
+    return IndexResponse(total=vector_store.document_count, **result)
+
+@router.post("/index/delete", response_model=IndexResponse)
+async def delete_endpoint(request: Request, delete_req: DeleteRequest):
+    """Delete documents by ID"""
+    vector_store = request.app.state.vector_store
+    try:
+        result = await request.app.state.executor.run(vector_store.delete, delete_req.ids)
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Delete error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to delete documents")
+    return IndexResponse(total=vector_store.document_count, **result)
@@ -2,25 +2,71 @@
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 import logging
+from typing import Dict, List, Literal, Optional, Union
+
+from app.core.executor import DeadlineExceeded, Overloaded
+from app.core.metrics import timed
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+MetadataValue = Union[str, int, float, bool]
+# {field: value} or {field: [values]}; a document must match every field
+MetadataFilters = Dict[str, Union[MetadataValue, List[MetadataValue]]]
+
 class SearchRequest(BaseModel):
     """Search request"""
     query: str = Field(..., min_length=1, max_length=1000)
     top_k: int = Field(default=5, ge=1, le=50)
+    # Drop hits below this cosine similarity (ignored in lexical mode)
+    min_score: Optional[float] = Field(default=None, ge=-1.0, le=1.0)
+    # Recall/latency knobs for approximate indexes; ignored by exact search
+    nprobe: Optional[int] = Field(default=None, ge=1, le=4096)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=4096)
+    # vector, lexical (BM25, no embedding) or hybrid (rank fusion); server default if omitted
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    # Restrict results to documents with matching metadata, e.g. {"department": "cs"}
+    filters: Optional[MetadataFilters] = None
 
 class SearchResult(BaseModel):
-    """Search result"""
+    """
+    Search result
+
+    relevance is the cosine similarity in vector and hybrid mode (hybrid
+    results are ordered by reciprocal rank fusion) and the BM25 score in
+    lexical mode
+    """
     document: str
+    doc_id: str
     relevance: float
+    # Unique within this server (shard nodes report their own IDs)
+    passage_id: int
 
 class SearchResponse(BaseModel):
     """Search response"""
     results: list[SearchResult]
     total: int
 
+class BatchSearchRequest(BaseModel):
+    """Several searches answered by one embedding pass and one index search"""
+    queries: list[str] = Field(..., min_length=1, max_length=256)
+    top_k: int = Field(default=5, ge=1, le=50)
+    min_score: Optional[float] = Field(default=None, ge=-1.0, le=1.0)
+    nprobe: Optional[int] = Field(default=None, ge=1, le=4096)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=4096)
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    filters: Optional[MetadataFilters] = None
+
+class BatchSearchResponse(BaseModel):
+    """One SearchResponse per query, in request order"""
+    responses: list[SearchResponse]
+
+def _to_response(results) -> SearchResponse:
+    return SearchResponse(
+        results=[SearchResult(document=r.text, doc_id=r.doc_key, relevance=r.score, passage_id=r.id) for r in results],
+        total=len(results)
+    )
+
 @router.post("/search", response_model=SearchResponse)
 async def search_endpoint(request: Request, search_req: SearchRequest):
     """Semantic search over university documents"""
@@ -28,13 +74,62 @@ async def search_endpoint(request: Request, search_req: SearchRequest):
         if not search_req.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
-        vector_store = request.app.state.vector_store
-        results = vector_store.search(search_req.query, top_k=search_req.top_k)
+        query_batcher = request.app.state.query_batcher
+        # Queueing plus the batched search (itself recorded under endpoint "query_batcher")
+        with timed("retrieve"):
+            results = await query_batcher.search(
+                search_req.query,
+                top_k=search_req.top_k,
+                nprobe=search_req.nprobe,
+                ef_search=search_req.ef_search,
+                min_score=search_req.min_score,
+                mode=search_req.mode,
+                filters=search_req.filters
+            )
         
-        return SearchResponse(
-            results=[SearchResult(document=r, relevance=0.85) for r in results],
-            total=len(results)
-        )
+        return _to_response(results)
+    except HTTPException:
+        raise
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Search timed out")
     except Exception as e:
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search_endpoint(request: Request, batch_req: BatchSearchRequest):
+    """
+    Semantic search for many queries at once
+    
+    The request is already a batch, so it skips the query batcher and runs
+    a single VectorStore.search_many on the worker pool.
+    """
+    try:
+        if any(not query.strip() or len(query) > 1000 for query in batch_req.queries):
+            raise HTTPException(status_code=400, detail="Queries must be 1-1000 non-blank characters")
+        
+        vector_store = request.app.state.vector_store
+        results = await request.app.state.executor.run(
+            vector_store.search_many,
+            batch_req.queries,
+            batch_req.top_k,
+            batch_req.nprobe,
+            batch_req.ef_search,
+            batch_req.min_score,
+            batch_req.mode,
+            batch_req.filters,
+            timeout=request.app.state.query_batcher.timeout
+        )
+        
+        return BatchSearchResponse(responses=[_to_response(r) for r in results])
+    except HTTPException:
+        raise
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except Exception as e:
+        logger.error(f"Batch search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
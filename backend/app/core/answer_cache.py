@@ -0,0 +1,188 @@
+"""
+Semantic cache for generated answers
+Looks up earlier questions by nearest-neighbor search over their query
+embeddings, so paraphrases of a frequent question ("how much is tuition?",
+"what does tuition cost") reuse one LLM answer
+
+Only depends on FAISS and NumPy, so both the FastAPI app and the Flask
+services can use it with their own embedding models.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import os
+import threading
+import time
+import faiss
+import numpy as np
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """A stored answer and the source documents it cites"""
+    answer: Any
+    sources: FrozenSet[str]
+    scope: str
+    expires_at: float
+    similarity: float = 0.0
+
+
+class AnswerCache:
+    """
+    Answer cache keyed on query-embedding similarity
+
+    Entries live in a small exact inner-product index (IndexIDMap2 over
+    IndexFlatIP), so a lookup is one brute-force search over at most
+    max_entries vectors. A hit needs cosine similarity >= threshold with a
+    stored query of the same scope (e.g. the same max_tokens), and the entry
+    must not have expired. Least recently used entries are evicted beyond
+    max_entries.
+
+    Every entry records the document IDs its answer cites; invalidate()
+    drops the entries citing any document that was changed or deleted.
+    """
+
+    def __init__(self, dim: int, threshold: float = 0.95, ttl_seconds: float = 3600.0,
+                 max_entries: int = 2048, candidates: int = 4):
+        """
+        Args:
+            dim: Query embedding dimension
+            threshold: Minimum cosine similarity for a hit
+            ttl_seconds: Entry lifetime
+            max_entries: LRU capacity
+            candidates: Neighbors checked per lookup (for scope/expiry misses)
+        """
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.candidates = candidates
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_source: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, dim: int) -> Optional["AnswerCache"]:
+        """Build the cache from ANSWER_CACHE_* settings; None when disabled"""
+        if os.getenv('ANSWER_CACHE_ENABLED', 'True') != 'True':
+            return None
+        return cls(
+            dim,
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95)),
+            ttl_seconds=float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600)),
+            max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 2048))
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _query(self, embedding) -> np.ndarray:
+        query = np.array(embedding, dtype=np.float32).reshape(1, self.dim)
+        faiss.normalize_L2(query)
+        return query
+
+    def get(self, embedding, scope: str = "") -> Optional[CachedAnswer]:
+        """
+        Closest cached answer for a query embedding
+
+        Returns:
+            A copy of the entry with .similarity set, or None on a miss
+        """
+        query = self._query(embedding)
+        now = time.monotonic()
+        with self._lock:
+            if self._entries:
+                scores, ids = self._index.search(query, min(self.candidates, len(self._entries)))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    entry = self._entries[int(entry_id)]
+                    if entry.expires_at <= now:
+                        self._remove(int(entry_id))
+                        continue
+                    if entry.scope != scope:
+                        continue
+                    self._entries.move_to_end(int(entry_id))
+                    self.hits += 1
+                    return replace(entry, similarity=float(score))
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer: Any, sources: Iterable[str], scope: str = ""):
+        """
+        Store an answer
+
+        Args:
+            embedding: Query embedding the answer was generated for
+            answer: Anything the caller wants back on a hit
+            sources: IDs of the documents the answer was generated from
+            scope: Request settings the answer depends on; lookups only
+                match entries of the same scope
+        """
+        query = self._query(embedding)
+        entry = CachedAnswer(answer, frozenset(sources), scope, time.monotonic() + self.ttl)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(query, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = entry
+            for source in entry.sources:
+                self._by_source.setdefault(source, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, sources: Iterable[str]) -> int:
+        """Drop every entry citing one of the given documents; returns the count dropped"""
+        with self._lock:
+            entry_ids = set()
+            for source in sources:
+                entry_ids.update(self._by_source.get(source, ()))
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            self.invalidations += len(entry_ids)
+        if entry_ids:
+            logger.info(f"Invalidated {len(entry_ids)} cached answers")
+        return len(entry_ids)
+
+    def clear(self):
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+            self._by_source.clear()
+
+    def _remove(self, entry_id: int):
+        """Drop one entry (lock held)"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+        for source in entry.sources:
+            cited_by = self._by_source.get(source)
+            if cited_by is not None:
+                cited_by.discard(entry_id)
+                if not cited_by:
+                    del self._by_source[source]
+
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+            }
@@ -0,0 +1,203 @@
+"""
+Micro-batching of search queries across concurrent requests
+Collects queries for a short window, runs one batched embed + index search
+off the event loop and fans the results back out to the waiting requests
+"""
+
+import asyncio
+import json
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .executor import DeadlineExceeded, Overloaded, VectorStoreExecutor
+from .metrics import label_context
+from .passages import Passage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingQuery:
+    """A query waiting for its batch"""
+    query: str
+    top_k: int
+    deadline: Optional[float]
+    future: asyncio.Future = field(repr=False)
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    min_score: Optional[float] = None
+    mode: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+
+
+class QueryBatcher:
+    """
+    Batching scheduler between the API endpoints and the vector store
+
+    A batch is dispatched as soon as it holds `max_batch_size` queries or
+    `max_wait_ms` has passed since its first query arrived. While one batch
+    is running the next one keeps filling, so batch size grows with load.
+    Batches run on the VectorStoreExecutor; when `max_queue` queries are
+    already waiting new ones are rejected with Overloaded. Queries with
+    different index tuning (nprobe/ef_search), score cutoff, search mode or
+    metadata filters are searched in separate sub-batches.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        executor: VectorStoreExecutor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 256,
+        timeout_ms: Optional[float] = 2000.0
+    ):
+        """
+        Args:
+            vector_store: VectorStore providing search_many
+            executor: Worker pool the batched search runs on
+            max_batch_size: Upper bound on queries per model call
+            max_wait_ms: Longest time a query waits for its batch to fill
+            max_queue: Queries allowed to wait before load is shed
+            timeout_ms: Default per-request deadline; None disables it
+        """
+        self.vector_store = vector_store
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.timeout = timeout_ms / 1000.0 if timeout_ms else None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, vector_store, executor: VectorStoreExecutor) -> "QueryBatcher":
+        """Build a batcher configured by QUERY_BATCH_* and SEARCH_TIMEOUT_MS"""
+        return cls(
+            vector_store,
+            executor,
+            max_batch_size=int(os.getenv('QUERY_BATCH_SIZE', 32)),
+            max_wait_ms=float(os.getenv('QUERY_BATCH_WAIT_MS', 5)),
+            max_queue=int(os.getenv('QUERY_BATCH_MAX_QUEUE', 256)),
+            timeout_ms=float(os.getenv('SEARCH_TIMEOUT_MS', 2000))
+        )
+
+    async def start(self):
+        """Start the background collector on the running event loop"""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Query batcher started (batch={self.max_batch_size}, wait={self.max_wait * 1000:.1f}ms)")
+
+    async def stop(self):
+        """Stop the collector and fail any queries still waiting"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Query batcher stopped"))
+
+    async def search(self, query: str, top_k: int = 5, timeout: Optional[float] = None,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     min_score: Optional[float] = None, mode: Optional[str] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> List[Passage]:
+        """
+        Queue a query and wait for its share of the batched result
+
+        Args:
+            query: Search query text
+            top_k: Number of results to return
+            timeout: Seconds to wait; defaults to the batcher's timeout
+            nprobe: IVF lists to visit for this query
+            ef_search: HNSW candidate list size for this query
+            min_score: Drop vector hits with cosine similarity below this
+            mode: "vector", "lexical" or "hybrid"; defaults to the store's SEARCH_MODE
+            filters: Metadata filters, see VectorStore.search_many
+
+        Raises:
+            Overloaded: Too many queries are already waiting
+            DeadlineExceeded: No result within the deadline
+        """
+        if self._worker is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = loop.time() + timeout if timeout is not None else None
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait(_PendingQuery(
+                query, top_k, deadline, future, nprobe, ef_search, min_score, mode, filters
+            ))
+        except asyncio.QueueFull:
+            raise Overloaded(f"{self._queue.qsize()} queries already waiting") from None
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Search exceeded {timeout:.3f}s") from None
+
+    async def _collect(self) -> List[_PendingQuery]:
+        """Wait for one query, then gather more until the batch is full or the window closes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            # asyncio.wait leaves the getter pending on timeout, so cancelling it
+            # can never drop a query that was dequeued at the same moment
+            getter = asyncio.ensure_future(self._queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=remaining)
+            if getter not in done:
+                getter.cancel()
+                break
+            batch.append(getter.result())
+        return batch
+
+    async def _run(self):
+        # Batches serve many requests; the task may have been started from one of them
+        label_context("query_batcher")
+        while True:
+            batch = await self._collect()
+            # Requests that gave up while waiting don't need a slot in the batch
+            groups = {}
+            for pending in batch:
+                if not pending.future.done():
+                    filters = json.dumps(pending.filters, sort_keys=True) if pending.filters else None
+                    key = (pending.nprobe, pending.ef_search, pending.min_score, pending.mode, filters)
+                    groups.setdefault(key, []).append(pending)
+            if groups:
+                await asyncio.gather(*(self._dispatch(group) for group in groups.values()))
+
+    async def _dispatch(self, batch: List[_PendingQuery]):
+        """Run one batched search and resolve every query in it"""
+        loop = asyncio.get_running_loop()
+        max_k = max(p.top_k for p in batch)
+        queries = [p.query for p in batch]
+        deadlines = [p.deadline for p in batch]
+        timeout = None if None in deadlines else max(deadlines) - loop.time()
+        first = batch[0]
+        try:
+            results = await self.executor.run(
+                self.vector_store.search_many, queries, max_k, first.nprobe, first.ef_search, first.min_score,
+                first.mode, first.filters, timeout=timeout
+            )
+        except Exception as e:
+            logger.error(f"Batched search failed: {e}")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        logger.debug(f"Dispatched batch of {len(batch)} queries (top_k={max_k})")
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result[:pending.top_k])
@@ -0,0 +1,173 @@
+"""
+Context selection for prompt assembly
+Over-fetched retrieval hits are reduced to a short, diverse set: near
+duplicates are dropped, maximal marginal relevance (MMR) picks the rest
+under a token budget, and neighboring chunks of one document are merged
+into a single passage. NumPy only, so both chat stacks can use it.
+"""
+
+from dataclasses import dataclass, field
+import hashlib
+import os
+import re
+import logging
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .conversation import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+# Dimensions of the hashed bag-of-words vectors used when no embeddings are given
+LEXICAL_DIM = 2048
+
+
+@dataclass
+class ContextChunk:
+    """A retrieved chunk; position is its ordinal within the document (None if unknown)"""
+    text: str
+    score: float
+    doc_id: str
+    position: Optional[int] = None
+    # Indices of the candidates this chunk was built from
+    members: List[int] = field(default_factory=list)
+
+
+def lexical_vectors(texts: Sequence[str], dim: int = LEXICAL_DIM) -> np.ndarray:
+    """L2-normalized hashed word-count vectors, shape (len(texts), dim)"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        for word in _WORD.findall(text.lower()):
+            rows.append(row)
+            cols.append(int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=4).digest(), 'little') % dim)
+    np.add.at(vectors, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def merge_overlapping(first: str, second: str, min_overlap: int = 8) -> str:
+    """Join two consecutive chunks, writing the text they share only once"""
+    probe = second[:min_overlap]
+    if len(probe) == min_overlap:
+        # Leftmost match first: the longest suffix of first that starts second
+        start = first.find(probe)
+        while start >= 0:
+            if second.startswith(first[start:]):
+                return first[:start] + second
+            start = first.find(probe, start + 1)
+    return f"{first} {second}"
+
+
+class ContextSelector:
+    """
+    Picks the chunks worth sending to the LLM
+
+    1. Candidates whose similarity to a more relevant one is at least
+       duplicate_threshold are dropped (overlapping chunks, copies).
+    2. MMR repeatedly takes the chunk maximizing
+       lambda * relevance - (1 - lambda) * max similarity to those taken,
+       skipping chunks that no longer fit token_budget, until max_chunks.
+    3. Chunks adjacent in the same document are merged, so the overlap
+       between them appears once.
+
+    Similarity is cosine over the given embeddings, or over hashed
+    bag-of-words vectors when none are available; one matrix product
+    covers all pairs.
+    """
+
+    def __init__(self, token_budget: int = 1024, mmr_lambda: float = 0.7, duplicate_threshold: float = 0.9,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.count_tokens = count_tokens
+
+    @classmethod
+    def from_env(cls) -> "ContextSelector":
+        return cls(
+            token_budget=int(os.getenv('CONTEXT_PASSAGE_TOKENS', 1024)),
+            mmr_lambda=float(os.getenv('CONTEXT_MMR_LAMBDA', 0.7)),
+            duplicate_threshold=float(os.getenv('CONTEXT_DUPLICATE_THRESHOLD', 0.9))
+        )
+
+    def select(self, chunks: Sequence[ContextChunk], max_chunks: int,
+               embeddings: Optional[np.ndarray] = None) -> List[ContextChunk]:
+        """
+        Args:
+            chunks: Candidates, best first
+            max_chunks: Chunks to pick before merging
+            embeddings: Optional (len(chunks), d) vectors of the candidates
+
+        Returns:
+            Selected chunks (merged where adjacent), most relevant first
+        """
+        if not chunks:
+            return []
+        if embeddings is None:
+            vectors = lexical_vectors([chunk.text for chunk in chunks])
+        else:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarity = vectors @ vectors.T
+
+        scores = np.array([chunk.score for chunk in chunks], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        tokens = np.array([self.count_tokens(chunk.text) for chunk in chunks])
+
+        # Greedy in relevance order: a candidate too similar to a better one is a duplicate
+        order = np.argsort(-relevance, kind='stable')
+        available = np.ones(len(chunks), dtype=bool)
+        for rank, i in enumerate(order):
+            if available[i]:
+                later = order[rank + 1:]
+                available[later[similarity[i, later] >= self.duplicate_threshold]] = False
+        duplicates = len(chunks) - int(available.sum())
+
+        picked: List[int] = []
+        max_similarity = np.zeros(len(chunks), dtype=np.float32)
+        remaining = self.token_budget
+        while len(picked) < max_chunks:
+            candidates = available & (tokens <= remaining)
+            if not candidates.any():
+                break
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            best = int(np.argmax(np.where(candidates, mmr, -np.inf)))
+            picked.append(best)
+            available[best] = False
+            remaining -= tokens[best]
+            max_similarity = np.maximum(max_similarity, similarity[best])
+
+        logger.debug(f"Context selection: {len(chunks)} candidates, {duplicates} duplicates, "
+                     f"{len(picked)} picked ({self.token_budget - remaining} tokens)")
+        return self._merge_adjacent([chunks[i] for i in picked], picked)
+
+    @staticmethod
+    def _merge_adjacent(picked: List[ContextChunk], indices: List[int]) -> List[ContextChunk]:
+        """Merge runs of consecutive positions within a document; keeps the order of each run's best chunk"""
+        by_doc: Dict[str, List[int]] = {}
+        for rank, chunk in enumerate(picked):
+            by_doc.setdefault(chunk.doc_id, []).append(rank)
+
+        merged: Dict[int, ContextChunk] = {}
+        for ranks in by_doc.values():
+            positioned = sorted((r for r in ranks if picked[r].position is not None), key=lambda r: picked[r].position)
+            runs = [[r] for r in ranks if picked[r].position is None]
+            for r in positioned:
+                if runs and runs[-1][-1] in positioned and picked[r].position - picked[runs[-1][-1]].position == 1:
+                    runs[-1].append(r)
+                else:
+                    runs.append([r])
+            for run in runs:
+                text = picked[run[0]].text
+                for r in run[1:]:
+                    text = merge_overlapping(text, picked[r].text)
+                first = picked[run[0]]
+                merged[min(run)] = ContextChunk(
+                    text, max(picked[r].score for r in run), first.doc_id, first.position,
+                    [indices[r] for r in run]
+                )
+        return [merged[rank] for rank in sorted(merged)]
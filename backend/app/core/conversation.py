@@ -0,0 +1,288 @@
+"""
+Per-session conversation memory and token-budgeted prompt packing
+Shared by the FastAPI and Flask chat services; stdlib only, so either
+stack can import it
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import math
+import os
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Turn:
+    """One message of a conversation"""
+    role: str
+    content: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token for English text)"""
+    return math.ceil(len(text) / 4)
+
+
+class MemorySessionStore:
+    """
+    In-process session store
+
+    Keeps the last max_turns turns of at most max_sessions conversations;
+    the least recently used session is evicted beyond that, and sessions
+    idle for ttl_seconds expire. Sessions are per process, so with several
+    workers use the SQLite store (or sticky sessions).
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600.0, max_turns: int = 50):
+        self.max_sessions = max_sessions
+        self.ttl = ttl_seconds
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def history(self, session_id: str) -> List[Turn]:
+        """Turns of a session, oldest first ([] for unknown or expired sessions)"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            touched_at, turns = entry
+            if time.monotonic() - touched_at > self.ttl:
+                del self._sessions[session_id]
+                return []
+            return list(turns)
+
+    def append(self, session_id: str, *turns: Turn):
+        with self._lock:
+            touched_at, stored = self._sessions.pop(session_id, (0.0, []))
+            if time.monotonic() - touched_at > self.ttl:
+                stored = []
+            stored = (stored + list(turns))[-self.max_turns:]
+            self._sessions[session_id] = (time.monotonic(), stored)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "sessions": len(self), "max_sessions": self.max_sessions,
+                "evictions": self.evictions, "ttl_seconds": self.ttl, "max_turns": self.max_turns}
+
+
+class SQLiteSessionStore:
+    """
+    Session store in a SQLite file, shared by every worker on the machine
+
+    Same limits as MemorySessionStore: expired sessions, turns beyond
+    max_turns and the least recently active sessions beyond max_sessions
+    are pruned every prune_every appends.
+    """
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl_seconds: float = 3600.0,
+                 max_turns: int = 50, prune_every: int = 100):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl_seconds
+        self.max_turns = max_turns
+        self.prune_every = prune_every
+        self._appends = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, seq)")
+
+    def history(self, session_id: str) -> List[Turn]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, created_at FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, self.max_turns)
+            ).fetchall()
+        # Wall clock: the file outlives processes
+        if not rows or time.time() - rows[0][2] > self.ttl:
+            return []
+        return [Turn(role, content) for role, content, _ in reversed(rows)]
+
+    def append(self, session_id: str, *turns: Turn):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO turns (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(session_id, turn.role, turn.content, now) for turn in turns]
+            )
+            self._conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND seq NOT IN "
+                "(SELECT seq FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (session_id, session_id, self.max_turns)
+            )
+            self._appends += 1
+            if self._appends % self.prune_every == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        """Drop expired sessions and the least recently active ones beyond max_sessions (lock held)"""
+        self._conn.execute(
+            "DELETE FROM turns WHERE session_id IN "
+            "(SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?)",
+            (now - self.ttl,)
+        )
+        self._conn.execute(
+            "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM turns GROUP BY session_id "
+            "ORDER BY MAX(created_at) DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def clear(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(DISTINCT session_id) FROM turns").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl, "max_turns": self.max_turns}
+
+
+# SESSION_STORE values understood by both apps; sqlalchemy (the Flask app database) only works in the Flask app
+SESSION_STORES = ("memory", "sqlite", "sqlalchemy")
+
+
+def session_store_from_env():
+    """Session store configured by SESSION_* env vars (SESSION_STORE=memory or sqlite)"""
+    limits = dict(
+        max_sessions=int(os.getenv('SESSION_MAX', 10000)),
+        ttl_seconds=float(os.getenv('SESSION_TTL_SECONDS', 3600)),
+        max_turns=int(os.getenv('SESSION_MAX_TURNS', 50))
+    )
+    backend = os.getenv('SESSION_STORE', 'memory').lower()
+    if backend not in SESSION_STORES:
+        raise ValueError(f"Unknown SESSION_STORE '{backend}', expected one of {SESSION_STORES}")
+    if backend == 'sqlalchemy':
+        raise ValueError("SESSION_STORE=sqlalchemy keeps sessions in the Flask app database; "
+                         "use memory or sqlite here")
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.getenv('SESSION_DB_PATH', 'data/sessions.sqlite3'), **limits)
+    return MemorySessionStore(**limits)
+
+
+@dataclass
+class PackedContext:
+    """What fits in the prompt: a summary of older turns, recent turns and passages"""
+    history: List[Turn] = field(default_factory=list)
+    passages: List[int] = field(default_factory=list)
+    summary: Optional[str] = None
+    tokens: int = 0
+    dropped_turns: int = 0
+
+    def history_text(self) -> str:
+        """Summary and turns as plain text (for single-prompt models)"""
+        lines = [self.summary] if self.summary else []
+        lines += [f"{turn.role}: {turn.content}" for turn in self.history]
+        return "\n".join(lines)
+
+
+class ContextPacker:
+    """
+    Fits conversation history and retrieved passages into a token budget
+
+    The query is always kept. Recent turns get up to history_share of the
+    budget (newest first, whole turns only), then passages fill what is
+    left in rank order, then any room that remains goes to further older
+    turns. Turns that still do not fit are replaced by a short extractive
+    summary of what the user asked, itself capped at summary_tokens, so
+    the prompt stays the same size however long the conversation gets.
+    """
+
+    def __init__(self, budget_tokens: int = 2048, history_share: float = 0.4, summary_tokens: int = 128,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.budget = budget_tokens
+        self.history_share = history_share
+        self.summary_tokens = summary_tokens
+        self.count_tokens = count_tokens
+
+    @classmethod
+    def from_env(cls) -> "ContextPacker":
+        return cls(
+            budget_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', 2048)),
+            history_share=float(os.getenv('CONTEXT_HISTORY_SHARE', 0.4)),
+            summary_tokens=int(os.getenv('CONTEXT_SUMMARY_TOKENS', 128))
+        )
+
+    def pack(self, query: str, history: Sequence[Turn], passages: Sequence[str]) -> PackedContext:
+        """
+        Args:
+            query: Current user message
+            history: Earlier turns, oldest first
+            passages: Retrieved passage texts, best first
+
+        Returns:
+            PackedContext; passages holds indices into the given passages
+        """
+        remaining = self.budget - self.count_tokens(query)
+        turn_tokens = [self.count_tokens(turn.content) for turn in history]
+        passage_tokens = [self.count_tokens(passage) for passage in passages]
+        # Keep room for the summary when not everything fits
+        reserve = self.summary_tokens if sum(turn_tokens) + sum(passage_tokens) > remaining else 0
+        remaining -= reserve
+
+        # Newest turns first, up to their share of the budget
+        start = len(history)
+        history_budget = min(remaining, int(self.budget * self.history_share))
+        while start > 0 and turn_tokens[start - 1] <= history_budget:
+            start -= 1
+            history_budget -= turn_tokens[start]
+            remaining -= turn_tokens[start]
+
+        kept_passages = []
+        for i, tokens in enumerate(passage_tokens):
+            if tokens <= remaining:
+                kept_passages.append(i)
+                remaining -= tokens
+
+        # Room the passages did not need goes to older turns
+        while start > 0 and turn_tokens[start - 1] <= remaining:
+            start -= 1
+            remaining -= turn_tokens[start]
+
+        remaining += reserve
+        summary = self._summarize(history[:start], min(self.summary_tokens, remaining)) if start else None
+        if summary:
+            remaining -= self.count_tokens(summary)
+        return PackedContext(list(history[start:]), kept_passages, summary, self.budget - remaining, start)
+
+    def _summarize(self, turns: Sequence[Turn], budget: int) -> Optional[str]:
+        """Extractive summary of dropped turns: the user's questions, newest kept first"""
+        prefix = "Earlier in this conversation the user asked: "
+        asked = []
+        used = self.count_tokens(prefix)
+        for turn in reversed(turns):
+            if turn.role != "user":
+                continue
+            question = " ".join(turn.content.split()[:24])
+            tokens = self.count_tokens(question) + 1
+            if used + tokens > budget:
+                break
+            asked.append(question)
+            used += tokens
+        if not asked:
+            return None
+        return prefix + "; ".join(reversed(asked))
@@ -0,0 +1,273 @@
+"""
+Content-addressed cache for text embeddings
+Two tiers: an in-process LRU bounded by bytes, and a persistent store of
+compact float16/float32 rows that survives restarts
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import unicodedata
+import numpy as np
+import logging
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 32
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """Hash of (model name, normalized text)"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class LRUTier:
+    """In-process LRU of float32 vectors with a byte-size cap"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray):
+        if vector.nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._entries[key] = vector
+        self.nbytes += vector.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+
+class DiskTier:
+    """
+    Append-only persistent store
+
+    Layout in `directory`:
+    - meta.json    embedding dimension and storage dtype
+    - keys.bin     concatenated 32-byte digests, one per row
+    - vectors.bin  raw rows of `dtype`, memory-mapped for reads
+    - lock         serializes writers when several worker processes share
+                   the directory
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float16"):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.directory / "keys.bin"
+        self.vectors_path = self.directory / "vectors.bin"
+        self.lock_path = self.directory / "lock"
+        self._rows: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        with self._locked():
+            self._open()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._rows) * self.dim * self.dtype.itemsize
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open(self):
+        meta_path = self.directory / "meta.json"
+        meta = {"dim": self.dim, "dtype": self.dtype.name}
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored != meta:
+                logger.warning(f"Embedding cache at {self.directory} has {stored}, expected {meta}; resetting")
+                self.keys_path.unlink(missing_ok=True)
+                self.vectors_path.unlink(missing_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        row_bytes = self.dim * self.dtype.itemsize
+        stored_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        # Vectors are written before keys, so a crash can only leave extra vector rows
+        n_rows = min(len(keys) // DIGEST_SIZE, stored_rows)
+        for row in range(n_rows):
+            self._rows[keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]] = row
+        if stored_rows != n_rows:
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(n_rows * row_bytes)
+        if len(keys) != n_rows * DIGEST_SIZE:
+            with open(self.keys_path, 'r+b') as f:
+                f.truncate(n_rows * DIGEST_SIZE)
+        self._remap()
+
+    def _remap(self):
+        if self._rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                                      shape=(len(self._rows), self.dim))
+        else:
+            self._vectors = None
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        return np.asarray(self._vectors[row], dtype=np.float32)
+
+    def _sync(self):
+        """Index rows appended by other processes since we last looked (lock held)"""
+        with open(self.keys_path, 'ab+') as f:
+            f.seek(len(self._rows) * DIGEST_SIZE)
+            keys = f.read()
+        for start in range(0, len(keys) - DIGEST_SIZE + 1, DIGEST_SIZE):
+            self._rows.setdefault(keys[start:start + DIGEST_SIZE], len(self._rows))
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        if all(key in self._rows for key in keys):
+            return
+        with self._locked():
+            self._sync()
+            new = [i for i, key in enumerate(keys) if key not in self._rows]
+            if new:
+                with open(self.vectors_path, 'ab') as f:
+                    # Drop rows a crashed writer left without keys, so rows stay aligned
+                    f.truncate(len(self._rows) * self.dim * self.dtype.itemsize)
+                    f.write(np.ascontiguousarray(vectors[new], dtype=self.dtype).tobytes())
+                with open(self.keys_path, 'ab') as f:
+                    f.write(b"".join(keys[i] for i in new))
+                for i in new:
+                    self._rows[keys[i]] = len(self._rows)
+        self._remap()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by hash of (model name, normalized text)
+
+    Lookups check the in-memory LRU first, then the disk tier; disk hits are
+    promoted into memory. Counters are kept so the cache can be sized from
+    observed hit rates.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        dim: int,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_dtype: str = "float16"
+    ):
+        self.model_name = model_name
+        self.memory = LRUTier(max_memory_bytes)
+        self.disk = DiskTier(disk_dir, dim, disk_dtype) if disk_dir else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> bytes:
+        return cache_key(self.model_name, text)
+
+    def get_many(self, keys: List[bytes]) -> Dict[int, np.ndarray]:
+        """Return {position: vector} for every key that is cached"""
+        found = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory_hits += 1
+                    found[i] = vector
+                    continue
+                if self.disk is not None:
+                    vector = self.disk.get(key)
+                    if vector is not None:
+                        self.disk_hits += 1
+                        self.memory.put(key, vector)
+                        found[i] = vector
+                        continue
+                self.misses += 1
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Store freshly computed vectors in both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self.memory.put(key, vector.copy())
+            if self.disk is not None:
+                self.disk.put_many(keys, vectors)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory.nbytes,
+                "memory_max_bytes": self.memory.max_bytes,
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+                "disk_bytes": self.disk.nbytes if self.disk is not None else 0,
+            }
+
+
+def cache_from_env(model_name: str, dim: int) -> Optional[EmbeddingCache]:
+    """
+    Build the cache from environment configuration
+
+    EMBEDDING_CACHE_MB=0 disables caching; EMBEDDING_CACHE_DIR="" keeps it
+    in memory only.
+    """
+    max_mb = float(os.getenv('EMBEDDING_CACHE_MB', 64))
+    if max_mb <= 0:
+        return None
+    disk_root = os.getenv('EMBEDDING_CACHE_DIR', 'data/embedding_cache')
+    disk_dir = None
+    if disk_root:
+        disk_dir = str(Path(disk_root) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+    return EmbeddingCache(
+        model_name,
+        dim,
+        max_memory_bytes=int(max_mb * 1024 * 1024),
+        disk_dir=disk_dir,
+        disk_dtype=os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+    )
@@ -3,25 +3,98 @@ Embedding generation using SentenceTransformers
 Converts text documents and queries to semantic embeddings for similarity search
 """
 
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import logging
-from typing import List
+import os
+import re
+import threading
+import zlib
+from typing import Any, List, Optional, Tuple
+from .embedding_cache import EmbeddingCache, cache_from_env
+from .metrics import timed
+from .passages import word_spans
 
 logger = logging.getLogger(__name__)
 
+# What computes embeddings (EMBEDDING_BACKEND)
+EMBEDDING_BACKENDS = ("sentence-transformers", "onnx", "hash")
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbeddingModel:
+    """
+    Tiny deterministic stand-in for a SentenceTransformer (EMBEDDING_BACKEND=hash)
+    
+    Signed feature hashing of lowercased words and word bigrams. CRC32
+    makes vectors identical across processes and runs, and no weights are
+    downloaded, so benchmarks and tests run offline. Texts sharing words
+    get similar vectors; there is no notion of meaning beyond that.
+    """
+    
+    max_seq_length = 256
+    
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+    
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        rows, hashes, weights = [], [], []
+        for row, text in enumerate(texts):
+            words = _WORD.findall(text.lower())[:self.max_seq_length]
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            rows.extend([row] * len(features))
+            hashes.extend(zlib.crc32(feature.encode("utf-8")) for feature in features)
+            weights.extend([1.0] * len(words) + [0.5] * (len(features) - len(words)))
+        hashes = np.asarray(hashes, dtype=np.int64)
+        # Low bits pick the dimension, the next bit the sign
+        signs = np.where((hashes // self.dim) & 1, -1.0, 1.0)
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(embeddings, (np.asarray(rows, dtype=np.int64), hashes % self.dim),
+                  (signs * np.asarray(weights)).astype(np.float32))
+        return embeddings
+
+
+def load_model(model_name: str, backend: Optional[str] = None) -> Tuple[Any, str]:
+    """
+    Embedding model for backend (default: EMBEDDING_BACKEND)
+    
+    Returns:
+        (model, name) - name identifies the embeddings in caches and
+        snapshot manifests, so switching backends never mixes vectors
+    """
+    backend = (backend or os.getenv('EMBEDDING_BACKEND', 'sentence-transformers')).lower()
+    if backend == "hash":
+        dim = int(os.getenv('HASH_EMBEDDING_DIM', 64))
+        return HashingEmbeddingModel(dim), f"hash-{dim}"
+    if backend == "onnx":
+        from .onnx_embeddings import load_onnx_model
+        return load_onnx_model(model_name)
+    if backend != "sentence-transformers":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    # Imported here so the hash backend needs neither torch nor the model weights
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name), model_name
+
+
 class EmbeddingGenerator:
     """
     Generate embeddings for documents and queries using SentenceTransformers
     Uses lightweight models for efficient local inference
     """
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache: Optional[EmbeddingCache] = None,
+                 normalize: bool = True, backend: Optional[str] = None):
         """
         Initialize embedding model
         
         Args:
             model_name: HuggingFace model ID (lightweight model for efficiency)
+            cache: Embedding cache; built from EMBEDDING_CACHE_* env vars if omitted
+            normalize: L2-normalize embeddings so inner product is cosine similarity
+            backend: "sentence-transformers", "onnx" or "hash"; EMBEDDING_BACKEND if omitted
         
         Models available:
         - all-MiniLM-L6-v2: Fast, 384 dimensions (default)
@@ -29,9 +102,11 @@ class EmbeddingGenerator:
         - paraphrase-MiniLM-L6-v2: Paraphrase detection
         """
         try:
-            self.model = SentenceTransformer(model_name)
+            self.normalize = normalize
+            self.model, self.model_name = load_model(model_name, backend)
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
-            logger.info(f"✅ Loaded embedding model: {model_name} ({self.embedding_dim}D)")
+            self.cache = cache if cache is not None else cache_from_env(self.model_name, self.embedding_dim)
+            logger.info(f"✅ Loaded embedding model: {self.model_name} ({self.embedding_dim}D)")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise
@@ -40,6 +115,10 @@ class EmbeddingGenerator:
         """
         Embed a list of texts to semantic vectors
         
+        Only cache misses are sent to the model; repeated texts within a
+        batch are encoded once. Vectors are L2-normalized unless the
+        generator was created with normalize=False.
+        
         Args:
             texts: List of text strings to embed
         
@@ -51,10 +130,86 @@ class EmbeddingGenerator:
             >>> embeddings.shape
             (2, 384)
         """
-        try:
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
-            logger.debug(f"Embedded {len(texts)} texts to {embeddings.shape}")
-            return embeddings
-        except Exception as e:
-            logger.error(f"Embedding error: {e}")
-            raise
+        with timed("embed", len(texts)):
+            try:
+                if self.cache is None:
+                    embeddings = self.model.encode(texts, convert_to_numpy=True).astype(np.float32, copy=False)
+                else:
+                    embeddings = self._embed_with_cache(texts)
+                
+                if self.normalize and len(embeddings):
+                    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                    np.divide(embeddings, np.maximum(norms, 1e-12), out=embeddings)
+                
+                logger.debug(f"Embedded {len(texts)} texts to {embeddings.shape}")
+                return embeddings
+            except Exception as e:
+                logger.error(f"Embedding error: {e}")
+                raise
+    
+    def _embed_with_cache(self, texts: List[str]) -> np.ndarray:
+        """Serve cached vectors and encode only the unique misses"""
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        
+        # Unique misses, in first-seen order
+        miss_positions = {}
+        for i, key in enumerate(keys):
+            if i not in cached:
+                miss_positions.setdefault(key, []).append(i)
+        
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        for i, vector in cached.items():
+            embeddings[i] = vector
+        
+        if miss_positions:
+            miss_keys = list(miss_positions)
+            miss_texts = [texts[miss_positions[key][0]] for key in miss_keys]
+            encoded = self.model.encode(miss_texts, convert_to_numpy=True)
+            self.cache.put_many(miss_keys, encoded)
+            for key, vector in zip(miss_keys, encoded):
+                embeddings[miss_positions[key]] = vector
+        
+        logger.debug(f"{len(cached)} of {len(texts)} embeddings served from cache, {len(miss_positions)} encoded")
+        return embeddings
+    
+    @property
+    def max_tokens(self) -> int:
+        """Longest input (in model tokens, excluding special tokens) the model embeds without truncation"""
+        max_seq_length = getattr(self.model, "max_seq_length", None) or 512
+        return max(1, max_seq_length - 2)
+    
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Character spans of the model's tokens in text
+        
+        Uses the model's fast tokenizer offsets when available so passage
+        sizes match what the model actually sees; falls back to whitespace.
+        """
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+            encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+            return [tuple(span) for span in encoding["offset_mapping"]]
+        return word_spans(text)
+    
+    def cache_stats(self) -> dict:
+        """Embedding cache hit/miss counters, or an empty dict if caching is disabled"""
+        return self.cache.stats() if self.cache is not None else {}
+
+
+_shared_generators = {}
+_shared_lock = threading.Lock()
+
+
+def shared_generator(model_name: str = "all-MiniLM-L6-v2") -> EmbeddingGenerator:
+    """
+    Process-wide generator for model_name, created on first use
+
+    When it is first created in a server's master process before workers
+    are forked (gunicorn preload_app, see gunicorn.conf.py), the workers
+    share the model weights copy-on-write instead of loading one copy each.
+    """
+    with _shared_lock:
+        if model_name not in _shared_generators:
+            _shared_generators[model_name] = EmbeddingGenerator(model_name)
+        return _shared_generators[model_name]
@@ -0,0 +1,111 @@
+"""
+Bounded worker pool for blocking vector store work
+Keeps model inference and FAISS searches off the event loop, sheds load
+when the backlog is full and drops work whose deadline has already passed
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
+import threading
+import time
+import faiss
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when the backlog is full; callers should answer 503"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work did not finish before its deadline; callers should answer 504"""
+
+
+class VectorStoreExecutor:
+    """
+    Dedicated thread pool that VectorStore operations run on
+
+    At most `max_pending` calls may be queued or running at once; further
+    submissions fail fast with Overloaded instead of growing latency for
+    everyone. Jobs whose deadline passes while they wait in the queue are
+    skipped rather than run for nobody.
+    """
+
+    def __init__(self, num_threads: int = 4, max_pending: int = 64, omp_threads: Optional[int] = None):
+        """
+        Args:
+            num_threads: Worker threads running model/FAISS calls
+            max_pending: Bound on queued + running calls
+            omp_threads: FAISS OpenMP threads per call; defaults to
+                cpu_count // num_threads so workers don't oversubscribe cores
+        """
+        self.num_threads = num_threads
+        self.max_pending = max_pending
+        if omp_threads is None:
+            omp_threads = max(1, (os.cpu_count() or 1) // num_threads)
+        faiss.omp_set_num_threads(omp_threads)
+        self.omp_threads = omp_threads
+        self._pool = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="vector-store")
+        self._pending = 0
+        self._lock = threading.Lock()
+        logger.info(f"Vector store executor: {num_threads} threads, {omp_threads} OpenMP threads each, "
+                    f"backlog {max_pending}")
+
+    @classmethod
+    def from_env(cls) -> "VectorStoreExecutor":
+        """Build an executor configured by VECTOR_STORE_THREADS / VECTOR_STORE_MAX_PENDING / FAISS_OMP_THREADS"""
+        omp_threads = os.getenv('FAISS_OMP_THREADS')
+        return cls(
+            num_threads=int(os.getenv('VECTOR_STORE_THREADS', 4)),
+            max_pending=int(os.getenv('VECTOR_STORE_MAX_PENDING', 64)),
+            omp_threads=int(omp_threads) if omp_threads else None
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) on the pool
+
+        Args:
+            fn: Blocking callable
+            timeout: Seconds until the caller stops waiting; None waits forever
+
+        Raises:
+            Overloaded: The backlog is full
+            DeadlineExceeded: The call did not finish within timeout
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise Overloaded(f"{self._pending} vector store calls already pending")
+            self._pending += 1
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # The caller's context, so stage timings are attributed to its request
+        context = contextvars.copy_context()
+
+        def job():
+            try:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded("Deadline passed before work started")
+                return context.run(fn, *args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+        future = asyncio.get_running_loop().run_in_executor(self._pool, job)
+        try:
+            # Shield so a timed-out job still runs its deadline check and frees its slot
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Vector store call exceeded {timeout:.3f}s") from None
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls"""
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,390 @@
+"""
+FAISS index factory
+Chooses between exact and approximate index types by corpus size, trains
+them on a sample, exposes per-query recall/latency knobs and measures the
+recall an approximate or quantized index gives up against an exact float32
+Flat baseline
+"""
+
+import math
+import os
+import time
+import faiss
+import numpy as np
+import logging
+from dataclasses import asdict, dataclass, replace
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf", "ivfpq")
+
+# Inner product on L2-normalized vectors is cosine similarity
+METRICS = {"ip": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+# Per-dimension vector storage for flat, HNSW and IVF indexes (IVF-PQ is always compressed)
+STORAGE_TYPES = {
+    "float32": None,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Corpus sizes at which "auto" switches to the next index type
+HNSW_MIN_VECTORS = 10_000
+IVF_MIN_VECTORS = 200_000
+IVFPQ_MIN_VECTORS = 2_000_000
+
+# FAISS recommends at least ~39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    """Index construction and default search settings"""
+    index_type: str = "auto"
+    metric: str = "ip"
+    storage: str = "float32"
+    rescore_factor: int = 0
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    nlist: Optional[int] = None
+    nprobe: int = 16
+    pq_m: Optional[int] = None
+    train_sample: int = 100_000
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        """Read INDEX_TYPE, INDEX_NLIST, INDEX_NPROBE, INDEX_EF_SEARCH, ... from the environment"""
+        nlist = os.getenv('INDEX_NLIST')
+        pq_m = os.getenv('INDEX_PQ_M')
+        return cls(
+            index_type=os.getenv('INDEX_TYPE', 'auto').lower(),
+            metric=os.getenv('INDEX_METRIC', 'ip').lower(),
+            storage=os.getenv('INDEX_STORAGE', 'float32').lower(),
+            rescore_factor=int(os.getenv('INDEX_RESCORE_FACTOR', 0)),
+            hnsw_m=int(os.getenv('INDEX_HNSW_M', 32)),
+            ef_construction=int(os.getenv('INDEX_EF_CONSTRUCTION', 200)),
+            ef_search=int(os.getenv('INDEX_EF_SEARCH', 64)),
+            nlist=int(nlist) if nlist else None,
+            nprobe=int(os.getenv('INDEX_NPROBE', 16)),
+            pq_m=int(pq_m) if pq_m else None,
+            train_sample=int(os.getenv('INDEX_TRAIN_SAMPLE', 100_000))
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def choose_index_type(n_vectors: int) -> str:
+    """Pick an index type for a corpus of n_vectors"""
+    if n_vectors < HNSW_MIN_VECTORS:
+        return "flat"
+    if n_vectors < IVF_MIN_VECTORS:
+        return "hnsw"
+    if n_vectors < IVFPQ_MIN_VECTORS:
+        return "ivf"
+    return "ivfpq"
+
+
+def _default_nlist(n_vectors: int) -> int:
+    nlist = int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _default_pq_m(dim: int) -> int:
+    """Largest divisor of dim that is at most dim / 4 (one byte per sub-quantizer)"""
+    for m in range(max(1, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """Unwrap an IndexIDMap/IndexIDMap2 to the index doing the actual search"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def writable_copy(index: faiss.Index) -> faiss.Index:
+    """
+    Deep copy of an index that owns all of its data
+
+    clone_index keeps pointing at memory-mapped codes of an index loaded
+    from a snapshot, which must never be written to; a serialize round trip
+    always copies them.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def build_index(embeddings: np.ndarray, config: IndexConfig, ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Build and populate an index for the given embeddings
+
+    Args:
+        embeddings: float32 matrix of shape (n, d)
+        config: Index configuration; index_type="auto" picks by corpus size
+        ids: Optional int64 IDs, one per row; the index is then wrapped in an
+            IndexIDMap2 so searches return these IDs and they can be removed
+
+    Returns:
+        Trained index containing every row of embeddings
+    """
+    n_vectors, dim = embeddings.shape
+    index_type = config.index_type
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if config.metric not in METRICS:
+        raise ValueError(f"Unknown metric '{config.metric}', expected one of {tuple(METRICS)}")
+    if config.storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{config.storage}', expected one of {tuple(STORAGE_TYPES)}")
+    metric = METRICS[config.metric]
+    qtype = STORAGE_TYPES[config.storage]
+
+    if index_type == "flat":
+        index = faiss.IndexFlat(dim, metric) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype, metric)
+    elif index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, config.hnsw_m, metric)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, config.hnsw_m, metric)
+        index.hnsw.efConstruction = config.ef_construction
+        index.hnsw.efSearch = config.ef_search
+    else:
+        nlist = config.nlist or _default_nlist(n_vectors)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if index_type == "ivf" and qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        elif index_type == "ivf":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m or _default_pq_m(dim), 8, metric)
+        index.nprobe = min(config.nprobe, nlist)
+
+    if not index.is_trained:
+        sample = embeddings
+        if n_vectors > config.train_sample:
+            rng = np.random.default_rng(0)
+            sample = embeddings[rng.choice(n_vectors, config.train_sample, replace=False)]
+        start = time.perf_counter()
+        index.train(sample)
+        logger.info(f"Trained {index_type} index on {len(sample)} vectors in {time.perf_counter() - start:.2f}s")
+
+    name = type(index).__name__
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, ids)
+    else:
+        index.add(embeddings)
+    logger.info(f"Built {index_type} index ({name}) with {index.ntotal} vectors")
+    return index
+
+
+class IndexBuilder:
+    """
+    Build an ID-mapped index from embedding batches as they are produced
+
+    Flat and HNSW indexes are created from the first batch. For "auto" and
+    IVF types the first batches are buffered until there are train_sample
+    vectors (or the input ends): enough to pick the index type and train
+    the quantizer. Every later batch goes straight into the index, so at
+    most train_sample embeddings are held however large the corpus is.
+    """
+
+    def __init__(self, config: IndexConfig, estimate_total: Optional[Callable[[], int]] = None,
+                 check_recall: bool = False):
+        """
+        Args:
+            config: Index configuration
+            estimate_total: Expected final vector count, asked when the index
+                has to be built before the input ends; "auto" and the default
+                nlist are sized for it rather than for the buffer
+            check_recall: Measure recall against exact search on the vectors
+                the index is built from (see evaluate_recall)
+        """
+        self.config = config
+        self.estimate_total = estimate_total
+        self.check_recall = check_recall
+        self.index: Optional[faiss.Index] = None
+        self.recall_report: Optional[dict] = None
+        self._buffer: List[np.ndarray] = []
+        self._buffer_ids: List[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Add a batch of embeddings with their IDs"""
+        if self.index is not None:
+            self.index.add_with_ids(embeddings, ids)
+            return
+        self._buffer.append(embeddings)
+        self._buffer_ids.append(ids)
+        self._buffered += len(ids)
+        if self.config.index_type in ("flat", "hnsw") or self._buffered >= self.config.train_sample:
+            self._build(final=False)
+
+    def finish(self) -> Optional[faiss.Index]:
+        """The index holding every added vector (None if nothing was added)"""
+        if self.index is None and self._buffered:
+            self._build(final=True)
+        return self.index
+
+    def _build(self, final: bool):
+        embeddings = self._buffer[0] if len(self._buffer) == 1 else np.concatenate(self._buffer)
+        ids = np.concatenate(self._buffer_ids)
+        self._buffer, self._buffer_ids = [], []
+        config = self.config
+        if not final and config.index_type in ("auto", "ivf", "ivfpq"):
+            total = max(len(ids), self.estimate_total() if self.estimate_total else 0)
+            index_type = choose_index_type(total) if config.index_type == "auto" else config.index_type
+            nlist = config.nlist or min(_default_nlist(total), max(1, len(ids) // MIN_POINTS_PER_CENTROID))
+            config = replace(config, index_type=index_type, nlist=nlist)
+        self.index = build_index(embeddings, config, ids=ids)
+        if self.check_recall and not isinstance(base_index(self.index), faiss.IndexFlat):
+            self.recall_report = evaluate_recall(
+                self.index, embeddings, ids=ids, rescore_factor=config.rescore_factor
+            )
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      sel: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search parameters for the given index
+
+    Passing parameters to index.search (instead of mutating index.nprobe)
+    keeps concurrent requests with different settings independent.
+    Knobs that do not apply to the index type are ignored.
+
+    Args:
+        sel: Restrict the search to these IDs; FAISS skips every other
+            vector during the scan, so results are the top k among them
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None and (nprobe is not None or sel is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe if nprobe is not None else ivf.nprobe, sel=sel)
+    hnsw = base_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW) and (ef_search is not None or sel is not None):
+        return faiss.SearchParametersHNSW(
+            efSearch=ef_search if ef_search is not None else hnsw.hnsw.efSearch, sel=sel
+        )
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+def bytes_per_vector(index: faiss.Index) -> Optional[int]:
+    """Bytes used to store one vector's code (excluding graph links and inverted list IDs)"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return getattr(index, "code_size", None)
+
+
+def rescore(queries: np.ndarray, candidate_ids: np.ndarray, candidates: np.ndarray,
+            k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-rank candidates by exact inner product with the full-precision vectors
+
+    Args:
+        queries: float32 matrix of shape (n, d)
+        candidate_ids: (n, c) IDs returned by the index, -1 for padding
+        candidates: (n, c, d) float32 vectors of those IDs
+        k: Results to keep per query
+
+    Returns:
+        (scores, ids) of shape (n, k), best first; padding keeps ID -1
+    """
+    scores = np.einsum('ncd,nd->nc', candidates, queries)
+    scores[candidate_ids < 0] = -np.inf
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(candidate_ids, order, axis=1)
+
+
+def similarity_scores(distances: np.ndarray, metric_type: int) -> np.ndarray:
+    """
+    Convert FAISS distances to cosine similarities
+
+    Assumes L2-normalized vectors: inner products already are cosines, and
+    squared L2 distance d relates to cosine as 1 - d / 2.
+    """
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return distances
+    return 1.0 - distances / 2.0
+
+
+def evaluate_recall(index: faiss.Index, embeddings: np.ndarray, n_queries: int = 100, k: int = 10,
+                    params: Optional[faiss.SearchParameters] = None, ids: Optional[np.ndarray] = None,
+                    rescore_factor: int = 0) -> dict:
+    """
+    Compare an index against exact float32 search over the same vectors
+
+    A sample of the indexed vectors is used as queries; recall@k is the
+    fraction of the exact top-k neighbors that the index also returns.
+    Pass `ids` (sorted, as passage IDs are) when the index returns IDs
+    rather than row positions.
+
+    Args:
+        rescore_factor: Also measure recall when k * rescore_factor
+            candidates are re-scored against the float32 vectors
+
+    Returns:
+        Dict with recall_at_k, per-query latency of both indexes, speedup
+        and the storage cost per vector against float32
+    """
+    n_vectors, dim = embeddings.shape
+    k = min(k, n_vectors)
+    rng = np.random.default_rng(0)
+    queries = embeddings[rng.choice(n_vectors, min(n_queries, n_vectors), replace=False)]
+
+    exact = faiss.IndexFlat(dim, index.metric_type)
+    exact.add(embeddings)
+
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    exact_time = time.perf_counter() - start
+    if ids is not None:
+        truth = ids[truth]
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k, params=params)
+    approx_time = time.perf_counter() - start
+
+    def recall(found: np.ndarray) -> float:
+        return sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / (len(queries) * k)
+
+    code_size = bytes_per_vector(index)
+    report = {
+        "index": type(base_index(index)).__name__,
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": recall(found),
+        "exact_ms_per_query": 1000 * exact_time / len(queries),
+        "index_ms_per_query": 1000 * approx_time / len(queries),
+        "speedup": exact_time / approx_time if approx_time else float("inf"),
+        "bytes_per_vector": code_size,
+        "float32_bytes_per_vector": 4 * dim,
+    }
+
+    if rescore_factor > 0:
+        n_candidates = min(k * rescore_factor, n_vectors)
+        start = time.perf_counter()
+        _, candidate_ids = index.search(queries, n_candidates, params=params)
+        rows = candidate_ids if ids is None else np.searchsorted(ids, candidate_ids)
+        candidates = embeddings[np.clip(rows, 0, n_vectors - 1)]
+        _, rescored = rescore(queries, candidate_ids, candidates, k)
+        rescore_time = time.perf_counter() - start
+        report["rescored_recall_at_k"] = recall(rescored)
+        report["rescored_ms_per_query"] = 1000 * rescore_time / len(queries)
+
+    logger.info(f"Recall@{k} {report['recall_at_k']:.3f} vs exact float32, "
+                f"{report['speedup']:.1f}x faster, {code_size} of {4 * dim} bytes/vector ({report['index']})")
+    if "rescored_recall_at_k" in report:
+        logger.info(f"Recall@{k} {report['rescored_recall_at_k']:.3f} after re-scoring "
+                    f"{rescore_factor}x candidates in float32")
+    return report
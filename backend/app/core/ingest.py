@@ -0,0 +1,72 @@
+"""
+Streaming document reader for directory ingestion
+Files are read (and fingerprinted for near-duplicate detection) on a
+small thread pool, at most read_ahead files ahead of the consumer, and
+yielded in input order - so a slow embedding stage holds back reading
+instead of letting read documents pile up in memory.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import itertools
+import logging
+from pathlib import Path
+import numpy as np
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional
+
+from .metadata import read_sidecar
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceDocument:
+    """A document read from disk: key (file stem), text, sidecar metadata and optional signature"""
+    key: str
+    text: str
+    metadata: Dict[str, Any]
+    signature: Optional[np.ndarray] = None
+
+
+def read_document(path: Path, signature: Optional[Callable[[str], np.ndarray]] = None) -> Optional[SourceDocument]:
+    """Read one .txt file and its metadata sidecar; None if it is empty or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+    except Exception as e:
+        logger.error(f"Error reading {path}: {e}")
+        return None
+    if not text:
+        return None
+    return SourceDocument(path.stem, text, read_sidecar(path), signature(text) if signature else None)
+
+
+def read_documents(files: Iterable[Path], threads: int = 4, read_ahead: int = 64,
+                   signature: Optional[Callable[[str], np.ndarray]] = None) -> Iterator[SourceDocument]:
+    """
+    Yield the documents of files in order, reading them in parallel
+
+    Args:
+        files: .txt files, consumed lazily
+        threads: Reader threads
+        read_ahead: Files read or being read ahead of the consumer (backpressure bound)
+        signature: Computed for each text on the reader threads (e.g. a MinHash)
+    """
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ingest-read") as pool:
+        pending: Deque[Future] = deque(
+            pool.submit(read_document, path, signature) for path in itertools.islice(files, max(1, read_ahead))
+        )
+        try:
+            while pending:
+                document = pending.popleft().result()
+                path = next(files, None)
+                if path is not None:
+                    pending.append(pool.submit(read_document, path, signature))
+                if document is not None:
+                    yield document
+        finally:
+            # The consumer stopped early (or failed): don't read the rest
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,296 @@
+"""
+BM25 inverted index over passages
+Exact terms such as course codes, email addresses and building names are
+matched through compact CSR postings arrays kept next to the FAISS index,
+without embedding the query
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Hits = Tuple[np.ndarray, np.ndarray]
+
+# Function words that match nearly every passage and only add noise to BM25
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me my of on or "
+    "our the their there this to was we what when where which who why will with you your".split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.@+_-][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[.@+_-]")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_COURSE_CODE = re.compile(r"\b[A-Za-z]{2,4}[ -]?\d{3,4}[A-Za-z]?\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms for indexing and querying
+
+    Compound tokens are kept whole and split into their parts, so
+    "housing@university.edu" matches both the address and "housing".
+    A short word followed by a number is also joined, so "CS 101",
+    "CS-101" and "CS101" all produce the term "cs101".
+    """
+    terms = []
+    previous = None
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        parts = _SEPARATORS.split(token)
+        if len(parts) > 1:
+            terms.append(token)
+            if parts[0].isalpha() and all(p.isdigit() for p in parts[1:]):
+                terms.append("".join(parts))
+        terms.extend(part for part in parts if part and part not in STOPWORDS)
+        if previous is not None and previous.isalpha() and len(previous) <= 4 and token.isdigit():
+            terms.append(previous + token)
+        previous = token
+    return terms
+
+
+def is_exact_match_query(query: str) -> bool:
+    """Whether the query names something literal (email, course code, quoted phrase)"""
+    return bool(_EMAIL.search(query) or _COURSE_CODE.search(query) or query.count('"') >= 2)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int = 60) -> Hits:
+    """
+    Merge ranked ID lists with reciprocal rank fusion
+
+    Each list contributes 1 / (k + rank) for every ID it contains, so
+    agreement between retrievers matters more than their raw scores,
+    which are on different scales.
+
+    Returns:
+        (ids, fused scores) sorted by descending score
+    """
+    rankings = [np.asarray(ranking, dtype=np.int64) for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    ids = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (k + 1 + np.arange(len(ranking))) for ranking in rankings])
+    unique, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions)
+    order = np.argsort(-scores, kind='stable')
+    return unique[order], scores[order].astype(np.float32)
+
+
+class LexicalIndex:
+    """
+    Immutable BM25 index over passage IDs
+
+    Postings are stored term-major in CSR form:
+    - indptr      int64  postings of term t are [indptr[t], indptr[t + 1])
+    - postings    int64  passage ID of each posting
+    - tfs         int32  term frequency in that passage
+    - lengths     int32  term count of that passage (for length normalization)
+
+    with_passages() derives an updated index, mirroring the copy-on-write
+    updates of the FAISS index and PassageTable.
+    """
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                 lengths: np.ndarray, n_passages: int, total_length: int, k1: float = 1.2, b: float = 0.75):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.tfs = tfs
+        self.lengths = lengths
+        self.n_passages = n_passages
+        self.total_length = total_length
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def empty(cls) -> "LexicalIndex":
+        return cls({}, np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64),
+                   np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), 0, 0)
+
+    def __len__(self) -> int:
+        return self.n_passages
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the postings arrays"""
+        return self.indptr.nbytes + self.postings.nbytes + self.tfs.nbytes + self.lengths.nbytes
+
+    def with_passages(self, new_ids: np.ndarray, new_texts: List[str], removed_ids: np.ndarray) -> "LexicalIndex":
+        """
+        Derive an index with passages added and removed
+
+        Args:
+            new_ids: IDs of the added passages
+            new_texts: Their texts, aligned with new_ids
+            removed_ids: IDs of passages to drop
+        """
+        keep = ~np.isin(self.postings, removed_ids) if len(removed_ids) else np.ones(len(self.postings), bool)
+        n_passages, total_length = self.n_passages, self.total_length
+        if not keep.all():
+            dropped, first = np.unique(self.postings[~keep], return_index=True)
+            n_passages -= len(dropped)
+            total_length -= int(self.lengths[~keep][first].sum())
+
+        vocab = dict(self.vocab)
+        new_terms, new_postings, new_tfs, new_lengths, added, added_length = _count_terms(vocab, new_ids, new_texts)
+        term_ids = np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.indptr))[keep]
+        return _from_postings(
+            vocab,
+            np.concatenate([term_ids, new_terms]),
+            np.concatenate([self.postings[keep], new_postings]),
+            np.concatenate([self.tfs[keep], new_tfs]),
+            np.concatenate([self.lengths[keep], new_lengths]),
+            n_passages + added,
+            total_length + added_length,
+            self.k1,
+            self.b
+        )
+
+    def search(self, query: str, top_k: int = 5, allowed: Optional[np.ndarray] = None) -> Hits:
+        """
+        BM25 search
+
+        Args:
+            allowed: Sorted passage IDs to restrict results to (metadata filter)
+
+        Returns:
+            (passage IDs, BM25 scores), best first; empty if no term matches
+        """
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not term_ids or not self.n_passages:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        avg_length = self.total_length / self.n_passages
+        ids, weights = [], []
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            df = end - start
+            if not df:
+                continue
+            idf = math.log(1 + (self.n_passages - df + 0.5) / (df + 0.5))
+            tfs = self.tfs[start:end].astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[start:end] / avg_length)
+            ids.append(self.postings[start:end])
+            weights.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        unique, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        if allowed is not None:
+            keep = np.isin(unique, allowed, assume_unique=True)
+            unique, scores = unique[keep], scores[keep]
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return unique[top], scores[top].astype(np.float32)
+
+    def save(self, directory: Path):
+        """Write postings as .npy files and the vocabulary as JSON"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ("indptr", "postings", "tfs", "lengths"):
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(directory / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                "terms": terms,
+                "n_passages": self.n_passages,
+                "total_length": self.total_length,
+                "k1": self.k1,
+                "b": self.b,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "LexicalIndex":
+        """Load an index saved by save(); postings are memory-mapped by default"""
+        directory = Path(directory)
+        with open(directory / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = [
+            np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None)
+            for name in ("indptr", "postings", "tfs", "lengths")
+        ]
+        vocab = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        return cls(vocab, *arrays, meta["n_passages"], meta["total_length"], meta["k1"], meta["b"])
+
+
+def _count_terms(vocab: Dict[str, int], ids: Sequence[int], texts: Sequence[str]) -> Tuple[
+        np.ndarray, np.ndarray, np.ndarray, np.ndarray, int, int]:
+    """
+    Postings of the given passages, unsorted; new terms are added to vocab
+
+    Returns:
+        (term IDs, passage IDs, term frequencies, passage lengths,
+        passages with at least one term, their total length)
+    """
+    terms, postings, tfs, lengths = [], [], [], []
+    n_passages = total_length = 0
+    for passage_id, text in zip(ids, texts):
+        counts = Counter(tokenize(text))
+        if not counts:
+            continue
+        length = sum(counts.values())
+        n_passages += 1
+        total_length += length
+        for term, tf in counts.items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            postings.append(passage_id)
+            tfs.append(tf)
+            lengths.append(length)
+    return (np.asarray(terms, dtype=np.int64), np.asarray(postings, dtype=np.int64),
+            np.asarray(tfs, dtype=np.int32), np.asarray(lengths, dtype=np.int32), n_passages, total_length)
+
+
+def _from_postings(vocab: Dict[str, int], term_ids: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                   lengths: np.ndarray, n_passages: int, total_length: int, k1: float = 1.2,
+                   b: float = 0.75) -> LexicalIndex:
+    """Index from unsorted postings: sort them term-major and build the CSR offsets"""
+    order = np.lexsort((postings, term_ids))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+    return LexicalIndex(vocab, indptr, postings[order], tfs[order], lengths[order], n_passages, total_length, k1, b)
+
+
+class LexicalIndexBuilder:
+    """
+    Collects postings batch by batch and sorts them once in build()
+
+    For full builds, where deriving a new index per batch with
+    with_passages() would re-sort every earlier posting each time.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self._batches: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self.n_passages = 0
+        self.total_length = 0
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        *postings, n_passages, total_length = _count_terms(self.vocab, ids, texts)
+        self._batches.append(tuple(postings))
+        self.n_passages += n_passages
+        self.total_length += total_length
+
+    def build(self) -> LexicalIndex:
+        if not self._batches:
+            return LexicalIndex.empty()
+        columns = [np.concatenate(column) for column in zip(*self._batches)]
+        self._batches = []
+        return _from_postings(self.vocab, *columns, self.n_passages, self.total_length)
+
+
+def lexical_hits(index: Optional[LexicalIndex], queries: List[str], top_k: int,
+                 allowed: Optional[np.ndarray] = None) -> List[Hits]:
+    """BM25 hits for each query; empty hits when there is no lexical index"""
+    if index is None:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+    return [index.search(query, top_k, allowed) for query in queries]
@@ -0,0 +1,124 @@
+"""
+Metadata index for filtered search
+Per field and value, keeps the sorted passage IDs of documents carrying
+that value, so a filter resolves to an allowed-ID set before the index is
+searched instead of dropping results afterwards
+"""
+
+import json
+from pathlib import Path
+import numpy as np
+import logging
+from typing import Any, Dict, Optional
+
+from .passages import PassageTable
+
+logger = logging.getLogger(__name__)
+
+# Metadata values must be JSON scalars; filters may also give a list of them (any-of)
+Scalar = (str, int, float, bool)
+
+
+def value_key(value: Any) -> str:
+    """Canonical key for a metadata value, so 1, "1" and True stay distinct"""
+    return json.dumps(value, sort_keys=True)
+
+
+def validate_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Check that metadata is a flat mapping of field name to scalar value"""
+    for field, value in metadata.items():
+        if not isinstance(field, str) or not isinstance(value, Scalar):
+            raise ValueError(f"Metadata field '{field}' must map to a string, number or boolean")
+    return metadata
+
+
+def read_sidecar(text_file: Path) -> Dict[str, Any]:
+    """Metadata from the optional JSON file next to a document (foo.txt -> foo.json)"""
+    sidecar = text_file.with_suffix(".json")
+    if not sidecar.exists():
+        return {}
+    try:
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            return validate_metadata(json.load(f))
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"Ignoring metadata in {sidecar}: {e}")
+        return {}
+
+
+class MetadataIndex:
+    """
+    Immutable map of field -> value -> sorted passage IDs
+
+    Document metadata applies to every passage of the document. The index
+    is derived from the passage table and document metadata, so it is
+    rebuilt alongside every index swap rather than updated in place.
+    """
+
+    def __init__(self, postings: Dict[str, Dict[str, np.ndarray]]):
+        self.postings = postings
+
+    @classmethod
+    def build(cls, passages: Optional[PassageTable], metadata: Dict[int, Dict[str, Any]]) -> "MetadataIndex":
+        """
+        Args:
+            passages: Passage table mapping passage IDs to document IDs
+            metadata: {doc_id: {field: value}}
+        """
+        if passages is None or not len(passages) or not metadata:
+            return cls({})
+
+        fields = sorted({field for doc_metadata in metadata.values() for field in doc_metadata})
+        postings = {}
+        for field in fields:
+            docs = sorted((doc_id, value_key(doc_metadata[field]))
+                          for doc_id, doc_metadata in metadata.items() if field in doc_metadata)
+            doc_ids = np.fromiter((doc_id for doc_id, _ in docs), dtype=np.int64, count=len(docs))
+            values, codes = np.unique([value for _, value in docs], return_inverse=True)
+
+            # Look up each passage's document and, through it, its value code
+            positions = np.minimum(np.searchsorted(doc_ids, passages.doc_ids), len(doc_ids) - 1)
+            found = doc_ids[positions] == passages.doc_ids
+            passage_codes = codes[positions[found]]
+            passage_ids = passages.ids[found]
+
+            order = np.lexsort((passage_ids, passage_codes))
+            bounds = np.searchsorted(passage_codes[order], np.arange(len(values) + 1))
+            sorted_ids = passage_ids[order]
+            postings[field] = {
+                value: sorted_ids[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)
+                if bounds[i + 1] > bounds[i]
+            }
+        return cls(postings)
+
+    @property
+    def fields(self) -> Dict[str, int]:
+        """Number of distinct values per field"""
+        return {field: len(values) for field, values in self.postings.items()}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ids.nbytes for values in self.postings.values() for ids in values.values())
+
+    def allowed(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Sorted passage IDs matching every filter
+
+        Args:
+            filters: {field: value} or {field: [value, ...]} (any of the values);
+                fields are combined with AND
+
+        Returns:
+            Sorted int64 passage IDs; empty when nothing matches (callers
+            skip filtering altogether when filters is empty)
+        """
+        allowed: Optional[np.ndarray] = None
+        for field, wanted in filters.items():
+            values = self.postings.get(field, {})
+            wanted = wanted if isinstance(wanted, (list, tuple)) else [wanted]
+            matches = [values[key] for key in map(value_key, wanted) if key in values]
+            ids = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+            allowed = ids if allowed is None else np.intersect1d(allowed, ids, assume_unique=True)
+            if not len(allowed):
+                break
+        return allowed if allowed is not None else np.empty(0, dtype=np.int64)
+
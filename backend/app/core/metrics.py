@@ -0,0 +1,179 @@
+"""
+Latency histograms in the Prometheus text format
+Stages of a request (embedding, index search, generation, ...) are timed
+with `timed`, recorded into process-wide histograms labelled with the
+endpoint and batch size, and collected per request for a Server-Timing
+header. Stdlib only, so both the FastAPI and Flask apps can use it.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached embedding lookup up to a slow LLM call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Endpoint and per-request stage list of the code running in this context.
+# VectorStoreExecutor runs jobs in a copy of the caller's context, so work
+# done on its threads is attributed to the request that submitted it.
+_endpoint: ContextVar[str] = ContextVar("metrics_endpoint", default="internal")
+_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("metrics_stages", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with a fixed set of label names
+
+    observe() is one bisect and a few integer increments under a lock,
+    cheap enough to call around every model and index call.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bucket], and sum of observed values
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {labels}")
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[bucket] += 1
+            self._sums[labels] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Per label set: cumulative bucket counts (last one is +Inf) and the sum"""
+        with self._lock:
+            series = {labels: (list(counts), self._sums[labels]) for labels, counts in self._counts.items()}
+        for counts, _ in series.values():
+            for i in range(1, len(counts)):
+                counts[i] += counts[i - 1]
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.snapshot().items()):
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                bucket_labels = ",".join(pairs + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named histograms of one process, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """The histogram registered under name, created on first use"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, label_names, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds", "Time spent in each stage of a request",
+    ("stage", "endpoint", "batch_size")
+)
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "End-to-end request latency", ("endpoint", "method", "status")
+)
+
+
+def batch_label(size: int) -> str:
+    """Batch size rounded up to a power of two, so the label has few values"""
+    if size <= 1:
+        return "1"
+    bound = 1 << (size - 1).bit_length()
+    return str(bound) if bound <= 256 else "256+"
+
+
+def record_stage(stage: str, seconds: float, batch_size: int = 1):
+    STAGE_SECONDS.observe(seconds, stage, _endpoint.get(), batch_label(batch_size))
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+def label_context(endpoint: str):
+    """Attribute stages recorded from now on in this context (e.g. a background task) to endpoint, outside any request"""
+    _endpoint.set(endpoint)
+    _stages.set(None)
+
+
+@contextmanager
+def timed(stage: str, batch_size: int = 1) -> Iterator[None]:
+    """Record the duration of the block as stage (also when it raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, batch_size)
+
+
+class RequestTimings:
+    """
+    Stages recorded while one request is handled
+
+    Created when the request starts and finished when its response is
+    ready; stages timed in between (in this context or copies of it) are
+    labelled with endpoint and listed in server_timing().
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stages: List[Tuple[str, float]] = []
+        self.start = time.perf_counter()
+        self._tokens = (_endpoint.set(endpoint), _stages.set(self.stages))
+
+    def finish(self, method: str, status: int) -> float:
+        """Record the request latency and stop collecting stages; returns the latency"""
+        elapsed = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(elapsed, self.endpoint, method, str(status))
+        endpoint_token, stages_token = self._tokens
+        _stages.reset(stages_token)
+        _endpoint.reset(endpoint_token)
+        return elapsed
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value, e.g. 'embed;dur=4.1, search;dur=6.3, total;dur=12.0'"""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
@@ -0,0 +1,140 @@
+"""
+Near-duplicate detection with MinHash
+Crawled corpora contain many almost identical pages (print views,
+paginated archives). Each document gets a MinHash signature of its word
+shingles; a document whose estimated Jaccard similarity to one already
+kept reaches the threshold is treated as a copy of it.
+"""
+
+import re
+import zlib
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_WORD = re.compile(r"\w+")
+
+# 128 hash functions, looked up in 16 bands of 8: pairs with a Jaccard
+# similarity of 0.8 share a band with probability 0.95, pairs at 0.3 with 0.001
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Only the low 16 bits of each minimum are kept (b-bit MinHash); two
+# different minima collide with probability 1/65536
+SIGNATURE_DTYPE = np.uint16
+
+# Multiply-shift hash functions: random odd multipliers, high 32 bits of the product
+_MULTIPLIERS = np.random.default_rng(20240501).integers(0, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """MurmurHash3 finalizer on uint64 arrays (wrapping arithmetic)"""
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xFF51AFD7ED558CCD)
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xC4CEB9FE1A85EC53)
+    return x ^ (x >> np.uint64(33))
+
+
+def minhash(text: str, shingle_words: int = 3) -> np.ndarray:
+    """
+    MinHash signature of the word shingles of text
+
+    Hashes are CRC32-based, so signatures are identical across processes
+    and can be stored in the index snapshot.
+    """
+    words = _WORD.findall(text.lower()) or [text]
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    n = min(shingle_words, len(hashes))
+    shingles = np.zeros(len(hashes) - n + 1, dtype=np.uint64)
+    for offset in range(n):
+        shingles = _mix(shingles ^ hashes[offset:len(hashes) - n + 1 + offset])
+    return ((shingles[:, None] * _MULTIPLIERS[None, :]) >> np.uint64(32)).min(axis=0).astype(SIGNATURE_DTYPE)
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity estimated from two signatures"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class NearDuplicateFilter:
+    """
+    Signatures of kept documents, answering "is this a near copy of one of them?"
+
+    Locality-sensitive hashing: each signature is split into bands and
+    only documents sharing a whole band with the new one are compared.
+    """
+
+    def __init__(self, threshold: float = 0.8, shingle_words: int = 3):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity of word shingles at
+                which a document counts as a duplicate
+            shingle_words: Words per shingle
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        self._tables: List[Dict[int, List[str]]] = [{} for _ in range(BANDS)]
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        return minhash(text, self.shingle_words)
+
+    @staticmethod
+    def _bands(signature: np.ndarray) -> List[int]:
+        return [hash(band.tobytes()) for band in signature.reshape(BANDS, ROWS)]
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """Key of the most similar kept document at or above the threshold, if any"""
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band, table in zip(self._bands(signature), self._tables):
+            for key in table.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                similarity = jaccard(self._signatures[key], signature)
+                if similarity >= best_similarity:
+                    best, best_similarity = key, similarity
+        return best
+
+    def add(self, key: str, signature: np.ndarray):
+        self.remove(key)
+        self._signatures[key] = signature
+        for band, table in zip(self._bands(signature), self._tables):
+            table.setdefault(band, []).append(key)
+
+    def remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, table in zip(self._bands(signature), self._tables):
+            keys = table[band]
+            keys.remove(key)
+            if not keys:
+                del table[band]
+
+    def check(self, key: str, signature: np.ndarray) -> Optional[str]:
+        """
+        Key of the kept document that key duplicates, or None after
+        keeping key itself
+        """
+        original = self.find(signature)
+        if original is None or original == key:
+            self.add(key, signature)
+            return None
+        return original
+
+    @classmethod
+    def from_signatures(cls, signatures: Iterable[Tuple[str, np.ndarray]], threshold: float = 0.8,
+                        shingle_words: int = 3) -> "NearDuplicateFilter":
+        """Filter already holding these (key, signature) pairs"""
+        near_duplicates = cls(threshold, shingle_words)
+        for key, signature in signatures:
+            near_duplicates.add(key, signature)
+        return near_duplicates
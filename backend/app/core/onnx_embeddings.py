@@ -0,0 +1,275 @@
+"""
+ONNX Runtime embedding backend (EMBEDDING_BACKEND=onnx)
+The SentenceTransformer's encoder is exported to ONNX once, optionally
+quantized to int8, and served by ONNX Runtime; pooling runs in numpy.
+Inputs are sorted by token count and padded per batch, so short queries
+are not padded to the length of the longest passage.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import time
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "embedding_config.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+# Compared against the PyTorch model after every export
+AGREEMENT_SAMPLES = [
+    "What are the admission requirements for international students?",
+    "Tuition for graduate students in Computer Science is $42,000 per year.",
+    "CS 201",
+    "The library is open from 8 am to midnight on weekdays and from 10 am to 10 pm on weekends.",
+    "Who teaches machine learning in the fall term?",
+    "Housing costs $4,500 per semester and includes laundry and a shared kitchen.",
+    "advising office hours",
+    "Scholarships covering up to 50% of tuition are available; apply before March 1 through the "
+    "financial aid office. Students must maintain a GPA of 3.0 to renew their award each year.",
+]
+
+# Modules of a SentenceTransformer the exported model reproduces
+_SUPPORTED_MODULES = {"Transformer", "Pooling", "Normalize"}
+
+
+def model_directory(root: str, model_name: str) -> Path:
+    """Export location of model_name below root"""
+    return Path(root) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two embeddings of the same texts"""
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    candidate = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cosine = np.einsum("ij,ij->i", reference, candidate)
+    return {
+        "texts": int(len(cosine)),
+        "mean": round(float(cosine.mean()), 6),
+        "min": round(float(cosine.min()), 6),
+        "p01": round(float(np.percentile(cosine, 1)), 6),
+    }
+
+
+@contextmanager
+def _export_lock(directory: Path) -> Iterator[None]:
+    """Only one process exports; the others wait and then load its files"""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".export.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _pooling_mode(pooling: Any) -> str:
+    # get_pooling_mode_str() in sentence-transformers 2.x, a pooling_mode attribute in later releases
+    mode = pooling.get_pooling_mode_str() if hasattr(pooling, "get_pooling_mode_str") else pooling.pooling_mode
+    if mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Cannot export {mode} pooling to ONNX, only mean, cls or max")
+    return mode
+
+
+def export_model(model_name: str, directory: Path, quantize: bool) -> Dict[str, Any]:
+    """
+    Export model_name's encoder to directory (and its int8 copy if quantize)
+
+    Files are written under temporary names and renamed into place, so a
+    half-written export is never loaded. The PyTorch model is only needed
+    here; serving needs onnxruntime and the tokenizer.
+
+    Returns:
+        The stored configuration, including the cosine agreement of the
+        exported model(s) with PyTorch on AGREEMENT_SAMPLES
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    reference = SentenceTransformer(model_name, device="cpu")
+    modules = {type(module).__name__: module for module in reference._modules.values()}
+    unsupported = set(modules) - _SUPPORTED_MODULES
+    if unsupported:
+        raise ValueError(f"Cannot export {model_name} to ONNX: unsupported modules {sorted(unsupported)}")
+    transformer = modules["Transformer"]
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in tokenizer.model_input_names]
+
+    class Encoder(torch.nn.Module):
+        """Token embeddings only; pooling happens outside the graph"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    sample = tokenizer(AGREEMENT_SAMPLES[:2], padding=True, return_tensors="pt")
+    fp32_path = directory / FP32_FILE
+    tmp_path = directory / f".{FP32_FILE}.tmp"
+    # The TorchScript exporter handles dynamic batch and sequence axes on all supported torch versions
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            str(tmp_path),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]},
+            opset_version=14,
+            do_constant_folding=True,
+            **options
+        )
+    os.replace(tmp_path, fp32_path)
+    tokenizer.save_pretrained(str(directory))
+
+    config = {
+        "model_name": model_name,
+        "dimension": reference.get_sentence_embedding_dimension(),
+        "max_seq_length": reference.max_seq_length,
+        "pooling": _pooling_mode(modules["Pooling"]),
+        "normalize": "Normalize" in modules,
+        "agreement": {},
+    }
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = directory / f".{INT8_FILE}.tmp"
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, directory / INT8_FILE)
+
+    expected = reference.encode(AGREEMENT_SAMPLES, convert_to_numpy=True)
+    for variant in ("fp32", "int8") if quantize else ("fp32",):
+        exported = OnnxEmbeddingModel(directory, config, quantized=variant == "int8", intra_op_threads=0)
+        config["agreement"][variant] = cosine_agreement(expected, exported.encode(AGREEMENT_SAMPLES))
+
+    tmp_config = directory / f".{CONFIG_FILE}.tmp"
+    tmp_config.write_text(json.dumps(config, indent=2), encoding="utf-8")
+    os.replace(tmp_config, directory / CONFIG_FILE)
+    logger.info(f"Exported {model_name} to ONNX in {time.perf_counter() - start:.1f}s, "
+                f"agreement with PyTorch: {config['agreement']}")
+    return config
+
+
+class OnnxEmbeddingModel:
+    """
+    Exported encoder served by ONNX Runtime
+
+    Has the parts of the SentenceTransformer interface EmbeddingGenerator
+    uses: encode(), get_sentence_embedding_dimension(), max_seq_length and
+    tokenizer.
+    """
+
+    def __init__(self, directory: Path, config: Dict[str, Any], quantized: bool = True,
+                 intra_op_threads: int = 0, batch_size: int = 32):
+        """
+        Args:
+            directory: Export directory (see export_model)
+            config: Its stored configuration
+            quantized: Serve the int8 model instead of float32
+            intra_op_threads: ONNX Runtime threads per call (0 = one per physical core)
+            batch_size: Texts per inference call
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.config = config
+        self.max_seq_length = config["max_seq_length"]
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        path = directory / (INT8_FILE if quantized else FP32_FILE)
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, batch_size: Optional[int] = None,
+               **kwargs) -> np.ndarray:
+        """Embed texts; the result is in input order"""
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if not texts:
+            return embeddings
+        token_ids = self.tokenizer(list(texts), truncation=True, max_length=self.max_seq_length)["input_ids"]
+        lengths = np.fromiter((len(ids) for ids in token_ids), dtype=np.int64, count=len(token_ids))
+        # Longest first: each batch holds similar lengths and is padded only to its own longest
+        order = np.argsort(-lengths, kind="stable")
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            width = int(lengths[batch[0]])
+            input_ids = np.full((len(batch), width), self.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :lengths[i]] = token_ids[i]
+                attention_mask[row, :lengths[i]] = 1
+            inputs = {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            }
+            tokens = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+            embeddings[batch] = self._pool(tokens, attention_mask)
+        if self.config["normalize"]:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def _pool(self, tokens: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Sentence embeddings from token embeddings, as the model's Pooling module computes them"""
+        pooling = self.config["pooling"]
+        if pooling == "cls":
+            return tokens[:, 0]
+        mask = attention_mask[:, :, None].astype(tokens.dtype)
+        if pooling == "max":
+            return np.where(mask > 0, tokens, -1e9).max(axis=1)
+        return (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def load_onnx_model(model_name: str) -> Tuple[OnnxEmbeddingModel, str]:
+    """
+    ONNX model for model_name configured by ONNX_* env vars, exported on first use
+
+    Returns:
+        (model, name); int8 and float32 embeddings get different names
+        because they are not interchangeable in caches and snapshots
+    """
+    quantized = os.getenv('ONNX_QUANTIZE', 'True') == 'True'
+    directory = model_directory(os.getenv('ONNX_MODEL_DIR', 'data/onnx_models'), model_name)
+    with _export_lock(directory):
+        config_path = directory / CONFIG_FILE
+        config = json.loads(config_path.read_text(encoding="utf-8")) if config_path.exists() else None
+        if config is None or (quantized and not (directory / INT8_FILE).exists()):
+            config = export_model(model_name, directory, quantized)
+
+    variant = "int8" if quantized else "fp32"
+    agreement = config["agreement"].get(variant)
+    min_agreement = float(os.getenv('ONNX_MIN_AGREEMENT', 0.99))
+    if agreement and agreement["min"] < min_agreement:
+        logger.warning(f"ONNX {variant} embeddings of {model_name} agree with PyTorch only down to cosine "
+                       f"{agreement['min']:.4f} (ONNX_MIN_AGREEMENT={min_agreement})")
+    model = OnnxEmbeddingModel(
+        directory,
+        config,
+        quantized=quantized,
+        intra_op_threads=int(os.getenv('ONNX_THREADS', 0)),
+        batch_size=int(os.getenv('ONNX_BATCH_SIZE', 32))
+    )
+    return model, f"{model_name}+onnx-{variant}"
@@ -0,0 +1,268 @@
+"""
+Passage chunking and compact passage table
+Documents are split into token-bounded, overlapping passages. Passage
+metadata lives in NumPy arrays and passage text is read lazily from an
+append-only, memory-mapped corpus file.
+"""
+
+import json
+import mmap
+import re
+from pathlib import Path
+import numpy as np
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+TokenSpans = Callable[[str], List[Span]]
+
+_WORD = re.compile(r"\S+")
+
+# Array columns of a PassageTable, in constructor order
+_COLUMNS = ("ids", "doc_ids", "offsets", "lengths")
+
+
+def word_spans(text: str) -> List[Span]:
+    """Whitespace tokenization fallback, returning (start, end) character spans"""
+    return [(m.start(), m.end()) for m in _WORD.finditer(text)]
+
+
+def chunk_text(text: str, chunk_tokens: int = 128, overlap_tokens: int = 32,
+               token_spans: TokenSpans = word_spans) -> List[Span]:
+    """
+    Split text into overlapping passages of at most chunk_tokens tokens
+
+    Args:
+        text: Document text
+        chunk_tokens: Maximum tokens per passage
+        overlap_tokens: Tokens shared by consecutive passages
+        token_spans: Tokenizer returning character spans of each token
+
+    Returns:
+        (start, end) character spans of the passages
+    """
+    spans = token_spans(text)
+    if not spans:
+        return []
+    stride = max(1, chunk_tokens - overlap_tokens)
+    chunks = []
+    start = 0
+    while True:
+        window = spans[start:start + chunk_tokens]
+        chunks.append((window[0][0], window[-1][1]))
+        if start + chunk_tokens >= len(spans):
+            break
+        start += stride
+    return chunks
+
+
+def _byte_offsets(text: str, positions: Iterable[int]) -> Dict[int, int]:
+    """Map character positions in text to UTF-8 byte offsets"""
+    offsets = {}
+    char_pos = byte_pos = 0
+    for position in sorted(set(positions)):
+        byte_pos += len(text[char_pos:position].encode('utf-8'))
+        char_pos = position
+        offsets[position] = byte_pos
+    return offsets
+
+
+class Passage:
+    """
+    Search hit: passage ID and cosine similarity score
+
+    Text is decoded from the corpus mmap only when accessed.
+    """
+    __slots__ = ("id", "score", "doc_key", "_table", "_row")
+
+    def __init__(self, passage_id: int, score: float, doc_key: str, table: "PassageTable", row: int):
+        self.id = passage_id
+        self.score = score
+        self.doc_key = doc_key
+        self._table = table
+        self._row = row
+
+    @property
+    def text(self) -> str:
+        return self._table.text_at(self._row)
+
+    def with_id(self, passage_id: int, score: Optional[float] = None) -> "Passage":
+        """The same passage under another ID (e.g. one that also names its shard), optionally rescored"""
+        return Passage(passage_id, self.score if score is None else score, self.doc_key, self._table, self._row)
+
+    def __repr__(self) -> str:
+        return f"Passage(id={self.id}, score={self.score:.3f}, doc_key={self.doc_key!r})"
+
+
+class PassageTable:
+    """
+    Immutable table of passages
+
+    Columns (one row per passage, sorted by passage ID):
+    - ids      int64  passage ID used in the FAISS index
+    - doc_ids  int64  owning document ID
+    - offsets  int64  byte offset of the passage in the corpus file
+    - lengths  int32  byte length of the passage
+
+    Writers derive a new table with with_documents(); the corpus file is
+    append-only, so older tables and their mmaps stay valid.
+    """
+
+    def __init__(self, corpus_path: Path, ids: np.ndarray, doc_ids: np.ndarray,
+                 offsets: np.ndarray, lengths: np.ndarray, next_id: int):
+        self.corpus_path = Path(corpus_path)
+        self.ids = ids
+        self.doc_ids = doc_ids
+        self.offsets = offsets
+        self.lengths = lengths
+        self.next_id = next_id
+        self._mmap: Optional[mmap.mmap] = None
+        if self.corpus_path.exists() and self.corpus_path.stat().st_size > 0:
+            with open(self.corpus_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def empty(cls, corpus_path: Path) -> "PassageTable":
+        Path(corpus_path).touch()
+        return cls(
+            corpus_path,
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            next_id=0
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the metadata arrays"""
+        return self.ids.nbytes + self.doc_ids.nbytes + self.offsets.nbytes + self.lengths.nbytes
+
+    @property
+    def corpus_bytes(self) -> int:
+        return self.corpus_path.stat().st_size if self.corpus_path.exists() else 0
+
+    def rows(self, passage_ids: np.ndarray) -> np.ndarray:
+        """Row positions of passage IDs; -1 for IDs not in the table (e.g. FAISS padding)"""
+        passage_ids = np.asarray(passage_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(passage_ids.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, passage_ids), len(self.ids) - 1)
+        return np.where(self.ids[rows] == passage_ids, rows, -1)
+
+    def text_at(self, row: int) -> str:
+        start = int(self.offsets[row])
+        return self._mmap[start:start + int(self.lengths[row])].decode('utf-8')
+
+    def texts(self) -> List[str]:
+        """All passage texts, in row order"""
+        return [self.text_at(row) for row in range(len(self.ids))]
+
+    def with_documents(self, added: Dict[int, Tuple[str, List[Span]]],
+                       removed: Iterable[int]) -> Tuple["PassageTable", np.ndarray, np.ndarray, List[str]]:
+        """
+        Derive a table with documents added and removed
+
+        Args:
+            added: {doc_id: (text, passage character spans)}
+            removed: Document IDs whose passages are dropped
+
+        Returns:
+            (new table, new passage IDs, removed passage IDs, new passage texts)
+        """
+        removed = np.fromiter(removed, dtype=np.int64)
+        keep = ~np.isin(self.doc_ids, removed) if len(removed) else np.ones(len(self.ids), bool)
+        removed_ids = self.ids[~keep]
+
+        new_doc_ids, new_offsets, new_lengths, new_texts = [], [], [], []
+        with open(self.corpus_path, 'ab') as f:
+            base = f.tell()
+            for doc_id, (text, spans) in added.items():
+                data = text.encode('utf-8')
+                f.write(data)
+                offsets = _byte_offsets(text, [p for span in spans for p in span])
+                for start, end in spans:
+                    new_doc_ids.append(doc_id)
+                    new_offsets.append(base + offsets[start])
+                    new_lengths.append(offsets[end] - offsets[start])
+                    new_texts.append(text[start:end])
+                base += len(data)
+
+        new_ids = np.arange(self.next_id, self.next_id + len(new_doc_ids), dtype=np.int64)
+        table = PassageTable(
+            self.corpus_path,
+            np.concatenate([self.ids[keep], new_ids]),
+            np.concatenate([self.doc_ids[keep], np.asarray(new_doc_ids, dtype=np.int64)]),
+            np.concatenate([self.offsets[keep], np.asarray(new_offsets, dtype=np.int64)]),
+            np.concatenate([self.lengths[keep], np.asarray(new_lengths, dtype=np.int32)]),
+            next_id=self.next_id + len(new_doc_ids)
+        )
+        return table, new_ids, removed_ids, new_texts
+
+    def _doc_extents(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Row order grouped by document, group start positions, and each document's byte range"""
+        order = np.argsort(self.doc_ids, kind='stable')
+        grouped = self.doc_ids[order]
+        groups = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        starts = np.minimum.reduceat(self.offsets[order], groups)
+        ends = np.maximum.reduceat((self.offsets + self.lengths)[order], groups)
+        return order, groups, starts, ends
+
+    def documents(self) -> Iterator[Tuple[int, str]]:
+        """(doc_id, text) of every document, from its first passage start to its last passage end"""
+        if not len(self.ids):
+            return
+        order, groups, starts, ends = self._doc_extents()
+        for group, start, end in zip(groups, starts, ends):
+            yield int(self.doc_ids[order[group]]), self._mmap[int(start):int(end)].decode('utf-8')
+
+    def live_bytes(self) -> int:
+        """Bytes of the corpus still referenced by some document"""
+        if not len(self.ids):
+            return 0
+        _, _, starts, ends = self._doc_extents()
+        return int((ends - starts).sum())
+
+    def compacted(self, corpus_path: Path) -> "PassageTable":
+        """Copy only live document regions into a new corpus file"""
+        offsets = self.offsets.copy()
+        if len(self.ids):
+            order, groups, starts, ends = self._doc_extents()
+            new_starts = np.r_[0, np.cumsum(ends - starts)[:-1]]
+            sizes = np.diff(np.r_[groups, len(order)])
+            offsets[order] += np.repeat(new_starts - starts, sizes)
+        with open(corpus_path, 'wb') as f:
+            if len(self.ids):
+                for start, end in zip(starts, ends):
+                    f.write(self._mmap[int(start):int(end)])
+        return PassageTable(corpus_path, self.ids, self.doc_ids, offsets, self.lengths, self.next_id)
+
+    def save(self, directory: Path):
+        """Write the metadata arrays as .npy files (the corpus file is already on disk)"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _COLUMNS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump({"next_id": self.next_id, "corpus_file": self.corpus_path.name}, f)
+
+    @classmethod
+    def load(cls, directory: Path, corpus_dir: Path, mmap: bool = True) -> "PassageTable":
+        """
+        Load metadata arrays saved by save()
+
+        Args:
+            directory: Directory holding the .npy files
+            corpus_dir: Directory the corpus file is resolved in
+            mmap: Map the arrays read-only instead of copying them into memory
+        """
+        directory = Path(directory)
+        with open(directory / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        columns = [np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None) for name in _COLUMNS]
+        return cls(Path(corpus_dir) / meta["corpus_file"], *columns, next_id=meta["next_id"])
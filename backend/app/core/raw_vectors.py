@@ -0,0 +1,75 @@
+"""
+Full-precision vector file for re-scoring
+When the index stores quantized vectors, the original float32 embeddings
+are kept in an append-only, memory-mapped file addressed by passage ID so
+the top candidates can be re-scored exactly without holding them in RAM
+"""
+
+from pathlib import Path
+import numpy as np
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RawVectors:
+    """
+    Immutable view of a float32 vector file
+
+    Row i holds the embedding of passage ID i. Passage IDs are assigned
+    sequentially and never reused, so writers only ever append; rows of
+    removed passages stay in the file until the next full rebuild starts a
+    new one. appended() returns a new view, older views stay valid.
+    """
+
+    def __init__(self, path: Path, dim: int):
+        self.path = Path(path)
+        self.dim = dim
+        row_bytes = 4 * dim
+        size = self.path.stat().st_size if self.path.exists() else 0
+        self._rows = size // row_bytes
+        self._vectors: Optional[np.memmap] = None
+        if self._rows:
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode='r', shape=(self._rows, dim))
+
+    @classmethod
+    def create(cls, path: Path, dim: int) -> "RawVectors":
+        """Start an empty file, replacing any previous one"""
+        open(path, 'wb').close()
+        return cls(path, dim)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return self._rows * 4 * self.dim
+
+    def appended(self, ids: np.ndarray, vectors: np.ndarray) -> "RawVectors":
+        """
+        Write vectors for new passage IDs
+
+        Args:
+            ids: Sequential passage IDs, starting at or after len(self)
+            vectors: float32 matrix, one row per ID
+        """
+        if not len(ids):
+            return self
+        if ids[0] < self._rows or np.any(np.diff(ids) != 1):
+            raise ValueError("Raw vectors can only be appended for new, sequential passage IDs")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with open(self.path, 'r+b') as f:
+            f.seek(int(ids[0]) * 4 * self.dim)
+            f.write(vectors.data)
+        return RawVectors(self.path, self.dim)
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors for passage IDs; -1 (FAISS padding) and unknown IDs give zero rows"""
+        ids = np.asarray(ids, dtype=np.int64)
+        valid = (ids >= 0) & (ids < self._rows)
+        if self._vectors is None:
+            return np.zeros(ids.shape + (self.dim,), dtype=np.float32)
+        vectors = self._vectors[np.where(valid, ids, 0)]
+        vectors[~valid] = 0
+        return vectors
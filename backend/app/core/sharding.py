@@ -0,0 +1,637 @@
+"""
+Sharded vector store with scatter-gather search
+Documents are spread over N shards by rendezvous hashing of their key, or
+of one metadata field (e.g. faculty), so a filter on that field only
+visits the shards holding its values. A query fans out to the shards in
+parallel, each returns its own top_k and the partial lists are merged
+with a heap. A shard that misses SHARD_TIMEOUT_MS is left out of that
+result instead of holding up the response.
+
+Shards are VectorStores in this process (data/shards/shard-NN/) or shard
+nodes, i.e. this app started with SHARD_ID, reached over HTTP.
+"""
+
+import contextvars
+import hashlib
+import heapq
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from .embeddings import shared_generator
+from .lexical import is_exact_match_query, reciprocal_rank_fusion
+from .metadata import read_sidecar, value_key
+from .metrics import registry, timed
+from .passages import Passage
+from .vector_store import SEARCH_MODES, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Passage IDs of a sharded store carry the shard number above the shard's own ID
+SHARD_ID_BITS = 48
+LOCAL_ID_MASK = (1 << SHARD_ID_BITS) - 1
+
+# Request size limits of a shard node's batch endpoints (app.api.search, app.api.index)
+REMOTE_MAX_QUERIES = 256
+REMOTE_MAX_TOP_K = 50
+REMOTE_MAX_DOCUMENTS = 1000
+
+SHARD_SECONDS = registry.histogram(
+    "rag_shard_search_duration_seconds", "Time until a shard answered its part of a search, or was given up on",
+    ("shard", "outcome")
+)
+
+
+def shard_names(count: int) -> List[str]:
+    """Names of shards 0..count-1; a shard keeps its name when more are added"""
+    return [f"shard-{i:02d}" for i in range(count)]
+
+
+def shard_index_path(index_path: str, name: str) -> str:
+    """Snapshot location of one shard, e.g. data/shards/shard-00/vector_index.faiss"""
+    path = Path(index_path)
+    return str(path.parent / "shards" / name / path.name)
+
+
+class ShardRouter:
+    """
+    Rendezvous (highest random weight) hashing of documents onto shards
+
+    Every shard is scored against the document and the highest score
+    wins, so adding a shard only moves the documents the new shard wins
+    (about 1/N of them) and removing one only moves its own.
+    """
+
+    def __init__(self, shards: Sequence[str], field: Optional[str] = None):
+        """
+        Args:
+            shards: Shard names
+            field: Metadata field to place documents by (documents without
+                it are placed by key); None places every document by key
+        """
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards = list(shards)
+        self.field = field
+
+    @classmethod
+    def from_env(cls, count: Optional[int] = None) -> "ShardRouter":
+        """Router for SHARDS shards (or count), placing documents by SHARD_KEY (hash or a metadata field)"""
+        key = os.getenv('SHARD_KEY', 'hash')
+        return cls(shard_names(count or int(os.getenv('SHARDS', 1))), None if key == 'hash' else key)
+
+    def _owner(self, value: str) -> str:
+        return max(
+            self.shards,
+            key=lambda shard: hashlib.blake2b(f"{shard}\0{value}".encode('utf-8'), digest_size=8).digest()
+        )
+
+    def shard_for(self, key: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Shard a document belongs on"""
+        if self.field is not None and metadata and metadata.get(self.field) is not None:
+            return self._owner(f"{self.field}={value_key(metadata[self.field])}")
+        return self._owner(f"key={key}")
+
+    def shards_for_filters(self, filters: Optional[Dict[str, Any]]) -> List[str]:
+        """Shards that can hold documents matching filters: all, unless they constrain the routing field"""
+        if self.field is None or not filters or self.field not in filters:
+            return list(self.shards)
+        values = filters[self.field]
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        owners = {self._owner(f"{self.field}={value_key(value)}") for value in values}
+        return [shard for shard in self.shards if shard in owners]
+
+    def owns(self, shard: str) -> Callable[[Path], bool]:
+        """Partition of the documents directory for one shard (sidecars are only read when routing by field)"""
+        def accept(path: Path) -> bool:
+            return self.shard_for(path.stem, read_sidecar(path) if self.field is not None else None) == shard
+        return accept
+
+
+class RemotePassage:
+    """Search hit returned by a shard node, text included"""
+    __slots__ = ("id", "score", "doc_key", "text")
+
+    def __init__(self, passage_id: int, score: float, doc_key: str, text: str):
+        self.id = passage_id
+        self.score = score
+        self.doc_key = doc_key
+        self.text = text
+
+    def with_id(self, passage_id: int, score: Optional[float] = None) -> "RemotePassage":
+        return RemotePassage(passage_id, self.score if score is None else score, self.doc_key, self.text)
+
+    def __repr__(self) -> str:
+        return f"RemotePassage(id={self.id}, score={self.score:.3f}, doc_key={self.doc_key!r})"
+
+
+Hit = Union[Passage, RemotePassage]
+
+
+class LocalShard:
+    """A shard held by a VectorStore in this process"""
+
+    def __init__(self, name: str, store: VectorStore):
+        self.name = name
+        self.store = store
+
+    @property
+    def document_count(self) -> int:
+        return self.store.document_count
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self.store.generation
+
+    def load(self):
+        self.store.load_documents()
+
+    def search_many(self, queries: List[str], top_k: int, nprobe: Optional[int], ef_search: Optional[int],
+                    min_score: Optional[float], mode: Optional[str], filters: Optional[Dict[str, Any]],
+                    query_embeddings: Optional[np.ndarray], timeout: Optional[float]) -> List[List[Hit]]:
+        # FAISS cannot be interrupted: a slow local search finishes in the background
+        return self.store.search_many(queries, top_k, nprobe, ef_search, min_score, mode, filters, query_embeddings)
+
+    def apply(self, upserts: Dict[str, str], deletes: Iterable[str],
+              metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
+        return self.store.apply(upserts, deletes, metadata)
+
+    def has_document(self, key: str) -> Optional[bool]:
+        return self.store.has_document(key)
+
+    def document_metadata(self, key: str) -> Dict[str, Any]:
+        return self.store.document_metadata(key)
+
+    def passage_vectors(self, passage_ids: Sequence[int]) -> Optional[np.ndarray]:
+        return self.store.passage_vectors(passage_ids)
+
+    def refresh(self) -> bool:
+        return self.store.refresh()
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+class RemoteShard:
+    """
+    A shard node reached over HTTP (its /api/search/batch, /api/index and /stats)
+
+    Each calling thread keeps its own keep-alive connection to the node.
+    Document counts are the last ones the node reported.
+    """
+
+    generation = None
+
+    def __init__(self, name: str, url: str, write_timeout: float = 300.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid shard URL '{url}'")
+        self.name = name
+        self.url = url.rstrip("/")
+        self.write_timeout = write_timeout
+        self.document_count = 0
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port = parts.hostname, parts.port
+        self._local = threading.local()
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None, timeout: Optional[float] = None) -> Any:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connection_class(self._host, self._port)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        try:
+            connection.request(method, path, json.dumps(body) if body is not None else None,
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next call rather than reuse a half-read connection
+            connection.close()
+            self._local.connection = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"{method} {self.url}{path} returned {response.status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def load(self):
+        """Check the node is up and read its document count (the node indexes its own partition)"""
+        try:
+            self.document_count = self._request("GET", "/stats", timeout=self.write_timeout)["passages"]["documents"]
+            logger.info(f"Shard {self.name} at {self.url}: {self.document_count} documents")
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError, KeyError) as e:
+            logger.warning(f"Shard {self.name} at {self.url} is not available yet: {e}")
+
+    def search_many(self, queries: List[str], top_k: int, nprobe: Optional[int], ef_search: Optional[int],
+                    min_score: Optional[float], mode: Optional[str], filters: Optional[Dict[str, Any]],
+                    query_embeddings: Optional[np.ndarray], timeout: Optional[float]) -> List[List[Hit]]:
+        results = []
+        for start in range(0, len(queries), REMOTE_MAX_QUERIES):
+            body = {
+                "queries": queries[start:start + REMOTE_MAX_QUERIES],
+                "top_k": min(top_k, REMOTE_MAX_TOP_K),
+                "min_score": min_score,
+                "nprobe": nprobe,
+                "ef_search": ef_search,
+                "mode": mode,
+                "filters": filters,
+            }
+            for response in self._request("POST", "/api/search/batch", body, timeout)["responses"]:
+                results.append([
+                    RemotePassage(hit["passage_id"], hit["relevance"], hit["doc_id"], hit["document"])
+                    for hit in response["results"]
+                ])
+        return results
+
+    def apply(self, upserts: Dict[str, str], deletes: Iterable[str],
+              metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
+        result = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        metadata = metadata or {}
+        items = list(upserts.items())
+        deletes = list(deletes)
+        for start in range(0, len(items), REMOTE_MAX_DOCUMENTS):
+            documents = [
+                {"id": key, "content": text, "metadata": metadata.get(key) or {}}
+                for key, text in items[start:start + REMOTE_MAX_DOCUMENTS]
+            ]
+            response = self._request("POST", "/api/index", {"documents": documents}, self.write_timeout)
+            self.document_count = response.pop("total")
+            for name, count in response.items():
+                result[name] += count
+        for start in range(0, len(deletes), REMOTE_MAX_DOCUMENTS):
+            body = {"ids": deletes[start:start + REMOTE_MAX_DOCUMENTS]}
+            response = self._request("POST", "/api/index/delete", body, self.write_timeout)
+            self.document_count = response.pop("total")
+            result["deleted"] += response["deleted"]
+        return result
+
+    def has_document(self, key: str) -> Optional[bool]:
+        return None
+
+    def document_metadata(self, key: str) -> Dict[str, Any]:
+        return {}
+
+    def passage_vectors(self, passage_ids: Sequence[int]) -> Optional[np.ndarray]:
+        return None
+
+    def refresh(self) -> bool:
+        return False
+
+    def stats(self) -> dict:
+        try:
+            stats = self._request("GET", "/stats", timeout=self.write_timeout)
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+            return {"url": self.url, "error": str(e)}
+        self.document_count = stats["passages"]["documents"]
+        return {"url": self.url, **{name: stats[name] for name in ("index", "lexical", "metadata", "passages")}}
+
+
+Shard = Union[LocalShard, RemoteShard]
+
+
+class ShardedVectorStore:
+    """
+    VectorStore interface over several shards
+
+    Searches are scatter-gather: queries are embedded once, every shard
+    that can hold matches searches them in parallel, and the per-shard
+    top_k lists are merged. Vector scores are cosine similarities and
+    merge exactly; BM25 scores are shard-local, so lexical and hybrid
+    rankings across shards are approximate. Hybrid hits are scored by
+    cosine similarity, as in VectorStore.
+
+    Writes go to the shard each document belongs on (see ShardRouter).
+    """
+
+    def __init__(self, shards: Sequence[Shard], router: ShardRouter, timeout: Optional[float] = 1.0,
+                 threads: Optional[int] = None):
+        """
+        Args:
+            shards: Shards in router order
+            router: Places documents on shards
+            timeout: Seconds to wait for each shard's answer; later shards
+                are left out of the result. None waits for every shard
+            threads: Threads searching shards concurrently (default 4 per shard)
+        """
+        if [shard.name for shard in shards] != router.shards:
+            raise ValueError("Shards must match the router's shards, in order")
+        self.shards = list(shards)
+        self.router = router
+        self.timeout = timeout
+        self.embedding_gen = shared_generator()
+        self.search_mode = os.getenv('SEARCH_MODE', 'hybrid').lower()
+        self.lexical_fast_path = os.getenv('LEXICAL_FAST_PATH', 'True') == 'True'
+        self.fusion_depth = int(os.getenv('HYBRID_DEPTH', 50))
+        self.rrf_k = int(os.getenv('RRF_K', 60))
+        self._numbers = {shard.name: number for number, shard in enumerate(self.shards)}
+        self._pool = ThreadPoolExecutor(max_workers=threads or 4 * len(self.shards), thread_name_prefix="shard")
+        self._change_listeners: List[Callable[[Set[str]], Any]] = []
+        logger.info(f"ShardedVectorStore initialized with {len(self.shards)} shards "
+                    f"({'by ' + router.field if router.field else 'by document key'})")
+
+    @property
+    def document_count(self) -> int:
+        return sum(shard.document_count for shard in self.shards)
+
+    @property
+    def generation(self) -> Optional[str]:
+        """Generations of the local shards together; changes whenever any of them does"""
+        generations = [shard.generation for shard in self.shards]
+        if all(generation is None for generation in generations):
+            return None
+        return ",".join(generation or "-" for generation in generations)
+
+    def load_documents(self):
+        """Load or build every local shard from its share of the documents directory"""
+        for shard in self.shards:
+            shard.load()
+        logger.info(f"✅ {len(self.shards)} shards hold {self.document_count} documents")
+
+    def add_change_listener(self, listener: Callable[[Set[str]], Any]):
+        """Call listener(keys) when documents change (local shards report their own changes)"""
+        self._change_listeners.append(listener)
+        for shard in self.shards:
+            if isinstance(shard, LocalShard):
+                shard.store.add_change_listener(listener)
+
+    def has_document(self, key: str) -> bool:
+        return any(shard.has_document(key) for shard in self.shards)
+
+    def document_metadata(self, key: str) -> Dict[str, Any]:
+        for shard in self.shards:
+            if shard.has_document(key):
+                return shard.document_metadata(key)
+        return {}
+
+    def passage_vectors(self, passage_ids: Sequence[int]) -> Optional[np.ndarray]:
+        """Stored embeddings of these passages, or None if any of their shards cannot return them"""
+        passage_ids = np.asarray(passage_ids, dtype=np.int64)
+        numbers = passage_ids >> SHARD_ID_BITS
+        vectors = None
+        for number in np.unique(numbers):
+            rows = numbers == number
+            found = None
+            if number < len(self.shards):
+                found = self.shards[number].passage_vectors(passage_ids[rows] & LOCAL_ID_MASK)
+            if found is None:
+                return None
+            if vectors is None:
+                vectors = np.empty((len(passage_ids), found.shape[1]), dtype=found.dtype)
+            vectors[rows] = found
+        return vectors
+
+    def refresh(self) -> bool:
+        """Switch local shards to snapshots published by other workers; True if any changed"""
+        return any([shard.refresh() for shard in self.shards])
+
+    def stats(self) -> dict:
+        return {
+            "sharding": {
+                "shards": len(self.shards),
+                "key": self.router.field or "hash",
+                "timeout_ms": self.timeout * 1000 if self.timeout is not None else None,
+                "documents": self.document_count,
+            },
+            "shards": {shard.name: shard.stats() for shard in self.shards},
+        }
+
+    def search(self, query: str, top_k: int = 5, min_score: Optional[float] = None,
+               mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> List[Hit]:
+        """Search for similar passages (see search_many)"""
+        return self.search_many([query], top_k=top_k, min_score=min_score, mode=mode, filters=filters)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, min_score: Optional[float] = None,
+                    mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> List[List[Hit]]:
+        """
+        Search every shard that can hold matches and merge their top_k lists
+
+        Arguments are those of VectorStore.search_many. Shards that fail or
+        miss the timeout are logged, recorded in
+        rag_shard_search_duration_seconds and left out, so the results
+        come from the shards that answered.
+
+        Returns:
+            One list of hits per query, best first; passage IDs carry the
+            shard number in their high bits
+        """
+        if not queries:
+            return []
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        targets = [self.shards[self._numbers[name]] for name in self.router.shards_for_filters(filters)]
+        # Empty local shards have no index to search (shard node counts may be out of date)
+        targets = [shard for shard in targets if isinstance(shard, RemoteShard) or shard.document_count]
+        if not targets:
+            return [[] for _ in queries]
+
+        # Once for all local shards instead of once per shard (shard nodes embed on their own);
+        # hybrid search also needs it here to score the fused candidates
+        query_embeddings = None
+        if mode == "hybrid" or (mode == "vector" and any(isinstance(shard, LocalShard) for shard in targets)):
+            query_embeddings = self.embedding_gen.embed(queries)
+
+        # Hybrid rankings are fused here: fused scores of different shards don't compare.
+        # min_score applies to the fused candidates, as in VectorStore
+        modes = ("vector", "lexical") if mode == "hybrid" else (mode,)
+        depth = max(top_k, self.fusion_depth) if mode == "hybrid" else top_k
+        shard_min_score = None if mode == "hybrid" else min_score
+        with timed("shards", len(queries)):
+            start = time.perf_counter()
+            futures = {
+                # A context per task: the shard's stages are attributed to this request
+                self._pool.submit(
+                    contextvars.copy_context().run, self._search_shard, shard, modes, queries, depth, nprobe,
+                    ef_search, shard_min_score, filters, query_embeddings
+                ): shard
+                for shard in targets
+            }
+            done, _ = wait(futures, timeout=self.timeout)
+
+        partial = {search_mode: [] for search_mode in modes}
+        for future, shard in futures.items():
+            if future not in done:
+                SHARD_SECONDS.observe(time.perf_counter() - start, shard.name, "timeout")
+                logger.warning(f"Shard {shard.name} did not answer within {self.timeout * 1000:.0f}ms, "
+                               f"leaving it out of {len(queries)} queries")
+                continue
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Shard {shard.name} search failed, leaving it out: {e}")
+                continue
+            base = self._numbers[shard.name] << SHARD_ID_BITS
+            for search_mode, mode_results in zip(modes, results):
+                partial[search_mode].append([[hit.with_id(base | hit.id) for hit in hits] for hits in mode_results])
+
+        merged = {
+            search_mode: [self._merge([results[i] for results in lists], depth) for i in range(len(queries))]
+            for search_mode, lists in partial.items()
+        }
+        if mode != "hybrid":
+            return merged[mode]
+        return [
+            self._fuse(query, query_embeddings[i], vector, lexical, top_k, min_score)
+            for i, (query, vector, lexical) in enumerate(zip(queries, merged["vector"], merged["lexical"]))
+        ]
+
+    def _search_shard(self, shard: Shard, modes: Sequence[str], queries: List[str], top_k: int,
+                      nprobe: Optional[int], ef_search: Optional[int], min_score: Optional[float],
+                      filters: Optional[Dict[str, Any]], query_embeddings: Optional[np.ndarray]) -> List[List[List[Hit]]]:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            results = [
+                shard.search_many(queries, top_k, nprobe, ef_search, min_score, mode, filters, query_embeddings,
+                                  self.timeout)
+                for mode in modes
+            ]
+            outcome = "ok"
+            return results
+        finally:
+            SHARD_SECONDS.observe(time.perf_counter() - start, shard.name, outcome)
+
+    def _fuse(self, query: str, query_embedding: np.ndarray, vector: List[Hit], lexical: List[Hit], top_k: int,
+              min_score: Optional[float]) -> List[Hit]:
+        """
+        Reciprocal rank fusion of the merged rankings, as VectorStore does for one index
+
+        Hits keep the fused order but carry (and are cut off at min_score
+        by) their cosine similarity; BM25-only hits are scored against their
+        stored vectors, or their text is embedded where a shard cannot
+        return vectors (e.g. shard nodes).
+        """
+        if self.lexical_fast_path and lexical and is_exact_match_query(query):
+            candidates = lexical
+        else:
+            hits = {hit.id: hit for hit in lexical}
+            hits.update((hit.id, hit) for hit in vector)
+            ids, _ = reciprocal_rank_fusion([[hit.id for hit in vector], [hit.id for hit in lexical]], k=self.rrf_k)
+            candidates = [hits[int(passage_id)] for passage_id in ids]
+
+        scores = {hit.id: hit.score for hit in vector}
+        missing = [hit for hit in candidates if hit.id not in scores]
+        if missing:
+            vectors = self.passage_vectors([hit.id for hit in missing])
+            if vectors is None:
+                vectors = self.embedding_gen.embed([hit.text for hit in missing])
+            scores.update(zip((hit.id for hit in missing), (vectors @ query_embedding).tolist()))
+        fused = [hit.with_id(hit.id, scores[hit.id]) for hit in candidates]
+        if min_score is not None:
+            fused = [hit for hit in fused if hit.score >= min_score]
+        return fused[:top_k]
+
+    @staticmethod
+    def _merge(lists: List[List[Hit]], top_k: int) -> List[Hit]:
+        """Best top_k of several lists sorted by descending score"""
+        merged, seen = [], set()
+        for hit in heapq.merge(*lists, key=lambda hit: -hit.score):
+            # A document being moved by the rebalance tool briefly lives on two shards
+            if (hit.doc_key, hit.text) in seen:
+                continue
+            seen.add((hit.doc_key, hit.text))
+            merged.append(hit)
+            if len(merged) == top_k:
+                break
+        return merged
+
+    def upsert(self, documents: Dict[str, str], metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
+        """Add or replace documents on the shards they belong on (see VectorStore.upsert)"""
+        return self.apply(documents, [], metadata)
+
+    def delete(self, keys: Iterable[str]) -> dict:
+        """Remove documents by key (see VectorStore.delete)"""
+        return self.apply({}, keys)
+
+    def apply(self, upserts: Dict[str, str], deletes: Iterable[str],
+              metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
+        """
+        Route a write to the shards
+
+        Each upserted document goes to its shard and is deleted from any
+        other shard that has it (e.g. its routing field changed), after it
+        was written, so it never disappears from search. Deletes go to
+        every shard: a document written under another shard layout may
+        not be where the router would put it now.
+        """
+        metadata = metadata or {}
+        deletes = list(deletes)
+        owners = {key: self.router.shard_for(key, metadata.get(key)) for key in upserts}
+        result = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        remote_keys = set()
+        for shard in self.shards:
+            shard_upserts = {key: text for key, text in upserts.items() if owners[key] == shard.name}
+            if not shard_upserts and not deletes:
+                continue
+            shard_metadata = {key: metadata[key] for key in shard_upserts if key in metadata}
+            for name, count in shard.apply(shard_upserts, deletes, shard_metadata).items():
+                result[name] += count
+            if isinstance(shard, RemoteShard):
+                remote_keys.update(shard_upserts, deletes)
+
+        # Shard nodes can't be asked cheaply; only a routing field moves documents between them
+        check_remote = self.router.field is not None
+        for shard in self.shards:
+            strays = []
+            for key in upserts:
+                if owners[key] != shard.name:
+                    found = shard.has_document(key)
+                    if found or (found is None and check_remote):
+                        strays.append(key)
+            if strays:
+                # Moved rather than added
+                moved = shard.apply({}, strays)["deleted"]
+                result["added"] -= moved
+                result["updated"] += moved
+                if isinstance(shard, RemoteShard):
+                    remote_keys.update(strays)
+
+        # Local shards notify listeners themselves
+        if remote_keys:
+            for listener in self._change_listeners:
+                try:
+                    listener(remote_keys)
+                except Exception as e:
+                    logger.error(f"Change listener failed: {e}")
+        return result
+
+
+def vector_store_from_env(index_path: str = "data/vector_index.faiss") -> Union[VectorStore, ShardedVectorStore]:
+    """
+    The store configured by SHARDS, SHARD_KEY, SHARD_ID and SHARD_URLS
+
+    - SHARDS unset or 1: a single VectorStore at index_path
+    - SHARDS=N: N local shards in this process
+    - SHARD_URLS=url,url,...: scatter-gather over shard nodes, one per URL
+    - SHARD_ID=i: shard node serving shard i of SHARDS
+    """
+    urls = [url.strip() for url in os.getenv('SHARD_URLS', '').split(",") if url.strip()]
+    router = ShardRouter.from_env(len(urls) or None)
+    shard_id = os.getenv('SHARD_ID', '')
+    if shard_id:
+        name = router.shards[int(shard_id)]
+        return VectorStore(shard_index_path(index_path, name), partition=router.owns(name))
+    if len(router.shards) == 1 and not urls:
+        return VectorStore(index_path)
+
+    timeout_ms = float(os.getenv('SHARD_TIMEOUT_MS', 1000))
+    if urls:
+        shards = [RemoteShard(name, url) for name, url in zip(router.shards, urls)]
+    else:
+        shards = [
+            LocalShard(name, VectorStore(shard_index_path(index_path, name), partition=router.owns(name)))
+            for name in router.shards
+        ]
+    return ShardedVectorStore(shards, router, timeout_ms / 1000 if timeout_ms > 0 else None)
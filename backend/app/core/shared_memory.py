@@ -0,0 +1,120 @@
+"""
+Memory accounting for multi-worker deployments
+Reads /proc/self/smaps to show how much of the snapshot files and of the
+process as a whole is shared with other workers rather than private
+"""
+
+import faiss
+from pathlib import Path
+import logging
+from typing import Dict, Iterable, Optional
+from . import snapshot
+
+logger = logging.getLogger(__name__)
+
+SMAPS_PATH = Path("/proc/self/smaps")
+SMAPS_ROLLUP_PATH = Path("/proc/self/smaps_rollup")
+
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _empty() -> Dict[str, int]:
+    return {field: 0 for field in _FIELDS}
+
+
+def _summary(kib: Dict[str, int]) -> dict:
+    """Convert smaps counters (KiB) to a bytes summary"""
+    return {
+        "rss_bytes": kib["Rss"] * 1024,
+        "pss_bytes": kib["Pss"] * 1024,
+        "shared_bytes": (kib["Shared_Clean"] + kib["Shared_Dirty"]) * 1024,
+        "private_bytes": (kib["Private_Clean"] + kib["Private_Dirty"]) * 1024,
+    }
+
+
+def mapped_files(prefixes: Iterable[str]) -> Optional[Dict[str, dict]]:
+    """
+    Resident, shared and private memory of every mapped file under prefixes
+
+    Pages of a file that several workers have mmapped show up as shared
+    here; a file loaded with read() instead does not appear at all.
+
+    Returns:
+        {path: summary}, or None where /proc/self/smaps is unavailable
+    """
+    prefixes = [str(Path(prefix).resolve()) for prefix in prefixes]
+    try:
+        lines = SMAPS_PATH.read_text().splitlines()
+    except OSError:
+        return None
+
+    files: Dict[str, Dict[str, int]] = {}
+    current = None
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        if not parts[0].endswith(":"):
+            # Mapping header: address perms offset dev inode [path]
+            path = " ".join(parts[5:])
+            current = files.setdefault(path, _empty()) if any(path.startswith(p) for p in prefixes) else None
+        elif current is not None and parts[0][:-1] in current:
+            current[parts[0][:-1]] += int(parts[1])
+    return {path: _summary(kib) for path, kib in files.items()}
+
+
+def process_memory() -> Optional[dict]:
+    """Whole-process resident/shared/private summary, or None off Linux"""
+    try:
+        lines = SMAPS_ROLLUP_PATH.read_text().splitlines()
+    except OSError:
+        return None
+    kib = _empty()
+    for line in lines:
+        parts = line.split()
+        if parts and parts[0][:-1] in kib:
+            kib[parts[0][:-1]] = int(parts[1])
+    return _summary(kib)
+
+
+def report(snapshot_dir: str) -> Optional[dict]:
+    """Memory summary for /stats: the process and the snapshot files it maps"""
+    files = mapped_files([snapshot_dir])
+    if files is None:
+        return None
+    return {
+        "process": process_memory(),
+        "snapshot_files": len(files),
+        "snapshot_rss_bytes": sum(summary["rss_bytes"] for summary in files.values()),
+        "snapshot_shared_bytes": sum(summary["shared_bytes"] for summary in files.values()),
+        "snapshot_private_bytes": sum(summary["private_bytes"] for summary in files.values()),
+    }
+
+
+def verify_shared(snapshot_dir: str, index_file: str) -> bool:
+    """
+    Check at startup that the index is mapped from the snapshot, not copied
+
+    A memory-mapped index is backed by the page cache, so every worker
+    mapping the same generation shares those pages. If the index file is
+    not mapped (e.g. the FAISS build cannot mmap this index type), each
+    worker holds a private copy and memory grows with the worker count.
+    That is always the case with FAISS releases older than the one pinned
+    in requirements.txt, which cannot mmap indexes at all.
+    """
+    if not snapshot.MMAP_SUPPORTED:
+        logger.warning(f"FAISS {faiss.__version__} cannot memory-map indexes; "
+                       f"every worker holds a private copy of {index_file}")
+        return False
+    files = mapped_files([snapshot_dir])
+    if files is None:
+        logger.info("Cannot verify page sharing: /proc/self/smaps unavailable")
+        return False
+    index_path = str(Path(index_file).resolve())
+    if index_path not in files:
+        logger.warning(f"Index {index_file} is not memory-mapped; every worker holds a private copy")
+        return False
+    summary = files[index_path]
+    logger.info(f"Index {index_file} is memory-mapped: {summary['rss_bytes'] // 1024} KiB resident, "
+                f"{summary['shared_bytes'] // 1024} KiB shared with other processes")
+    return True
@@ -0,0 +1,297 @@
+"""
+On-disk snapshot of the vector store
+Persists the FAISS index, the document table and a manifest so that startup
+can memory-map a previous build instead of re-embedding the whole corpus.
+Snapshots are immutable generations published with an atomic pointer swap,
+so several worker processes can map the same files read-only.
+"""
+
+import faiss
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .lexical import LexicalIndex
+from .passages import PassageTable
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout changes so stale snapshots get rebuilt
+SNAPSHOT_VERSION = 7
+
+# Generations kept besides the current one, for workers still switching over
+KEEP_GENERATIONS = 1
+
+# Memory-map flat codes (Flat, SQ and HNSW storage) so workers share the pages.
+# The flag needs the FAISS release pinned in requirements.txt; older ones lack
+# it (None here) and can only read the index into private memory.
+# IO_FLAG_MMAP is not a substitute since it makes IVF lists read-write on disk.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+MMAP_SUPPORTED = MMAP_FLAGS is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_no_mmap():
+    logger.warning(f"FAISS {faiss.__version__} cannot memory-map indexes (no IO_FLAG_MMAP_IFC); "
+                   f"every process reads a private copy. Install the faiss-cpu version in requirements.txt")
+
+
+def hash_corpus(files: Iterable[Path]) -> Dict[str, str]:
+    """
+    Compute a content hash for every corpus file
+
+    Args:
+        files: Paths of the source documents
+
+    Returns:
+        Mapping of file name to SHA-256 hex digest
+    """
+    hashes = {}
+    for path in sorted(files):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        hashes[path.name] = digest.hexdigest()
+    return hashes
+
+
+def build_manifest(model_name: str, embedding_dim: int, corpus_hashes: Dict[str, str],
+                   index_config: Optional[dict] = None, chunking: Optional[dict] = None) -> dict:
+    """Build the manifest describing a snapshot"""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "model_name": model_name,
+        "embedding_dim": embedding_dim,
+        "corpus": corpus_hashes,
+        "index": index_config or {},
+        "chunking": chunking or {},
+    }
+
+
+def _sequence_number(path: Path) -> int:
+    return int(path.name.rsplit("-", 1)[1])
+
+
+class IndexSnapshot:
+    """
+    Generational snapshot stored next to the FAISS index path
+
+    Layout for index_path="data/vector_index.faiss":
+    - data/vector_index.current          name of the live generation
+    - data/vector_index.lock             held while building or writing
+    - data/vector_index.gen-NNNNNN/      one immutable generation:
+        index.faiss                      FAISS index over passage IDs
+        documents.json                   document table (id, key, hash)
+        passages/                        passage table arrays (mmapped .npy)
+        lexical/                         BM25 postings arrays (mmapped .npy)
+        signatures.npy                   MinHash of each document in the
+                                         table, for near-duplicate checks
+        manifest.json                    model, dimension, corpus hashes and
+                                         the corpus/vector files it uses
+    - data/vector_index.corpus-NNNNNN    append-only passage text, one file
+                                         per full rebuild or compaction
+    - data/vector_index.vectors-NNNNNN   float32 embeddings by passage ID, only
+                                         when quantized results are re-scored
+
+    Writers save a new generation directory and then replace the pointer
+    file, so readers see either the old or the new generation, never a mix.
+    Corpus and vector files are only appended to, which keeps older
+    generations (and the mmaps of processes still using them) valid.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = Path(index_path)
+        self.stem = self.index_path.with_suffix("")
+        self.directory = self.index_path.parent
+        self.current_path = Path(f"{self.stem}.current")
+        self.lock_path = Path(f"{self.stem}.lock")
+
+    def index_file(self, generation: str) -> Path:
+        return self.directory / generation / "index.faiss"
+
+    def _files(self, kind: str) -> List[Path]:
+        return sorted(self.directory.glob(f"{self.stem.name}.{kind}-[0-9]*[0-9]"), key=_sequence_number)
+
+    def _new_path(self, kind: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        existing = self._files(kind)
+        sequence = _sequence_number(existing[-1]) + 1 if existing else 1
+        return Path(f"{self.stem}.{kind}-{sequence:06d}")
+
+    def new_corpus_path(self) -> Path:
+        """Path for a fresh corpus file"""
+        return self._new_path("corpus")
+
+    def new_vectors_path(self) -> Path:
+        """Path for a fresh raw vector file"""
+        return self._new_path("vectors")
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Exclusive inter-process lock for building or modifying the snapshot
+
+        Only one worker builds or writes at a time; the others block here
+        and then find the generation it published.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def current_generation(self) -> Optional[str]:
+        """Name of the live generation directory, or None before the first save"""
+        try:
+            return self.current_path.read_text(encoding='utf-8').strip() or None
+        except OSError:
+            return None
+
+    def read_manifest(self, generation: Optional[str] = None) -> Optional[dict]:
+        """Return the stored manifest, or None if there is no usable snapshot"""
+        generation = generation or self.current_generation()
+        if generation is None:
+            return None
+        manifest_path = self.directory / generation / "manifest.json"
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot manifest {manifest_path}: {e}")
+            return None
+
+    def matches(self, manifest: dict, ignore: Iterable[str] = ()) -> bool:
+        """
+        Check whether the stored snapshot was built from the same model, corpus and index config
+
+        Only the keys of `manifest` are compared, so build reports saved
+        alongside (e.g. recall) don't invalidate the snapshot.
+
+        Args:
+            manifest: Manifest for the current configuration and corpus
+            ignore: Keys to leave out, e.g. "corpus" to accept a snapshot
+                that can be brought up to date incrementally
+        """
+        stored = self.read_manifest()
+        return stored is not None and all(
+            stored.get(key) == value for key, value in manifest.items() if key not in ignore
+        )
+
+    def save(self, index: faiss.Index, table: List[dict], passages: PassageTable, lexical: LexicalIndex,
+             manifest: dict, vectors_path: Optional[Path] = None, signatures: Optional[np.ndarray] = None) -> str:
+        """
+        Write a new generation and make it current (call with lock() held)
+
+        signatures, if given, has one row per document table row.
+        The pointer file is replaced last, so an interrupted save never
+        leaves a snapshot that looks valid.
+
+        Returns:
+            Name of the new generation
+        """
+        generation = self._new_path("gen")
+        tmp_dir = generation.with_name(generation.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        faiss.write_index(index, str(tmp_dir / self.index_file(generation.name).name))
+        passages.save(tmp_dir / "passages")
+        lexical.save(tmp_dir / "lexical")
+        with open(tmp_dir / "documents.json", 'w', encoding='utf-8') as f:
+            json.dump(table, f)
+        if signatures is not None:
+            np.save(tmp_dir / "signatures.npy", signatures)
+        manifest = dict(manifest, files={
+            "corpus": passages.corpus_path.name,
+            "vectors": Path(vectors_path).name if vectors_path is not None else None,
+        })
+        with open(tmp_dir / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_dir, generation)
+
+        tmp_pointer = self.current_path.with_name(self.current_path.name + ".tmp")
+        tmp_pointer.write_text(generation.name, encoding='utf-8')
+        os.replace(tmp_pointer, self.current_path)
+        logger.info(f"Saved snapshot {generation.name} with {len(table)} documents / {len(passages)} passages")
+        return generation.name
+
+    def prune(self):
+        """
+        Delete generations and corpus/vector files no longer in use (call with lock() held)
+
+        The current generation and the KEEP_GENERATIONS before it are kept.
+        Processes that still mmap a deleted file keep working; the space is
+        reclaimed once they unmap it.
+        """
+        generations = self._files("gen")
+        current = self.current_generation()
+        if current is None or not any(path.name == current for path in generations):
+            return
+        current_number = _sequence_number(Path(current))
+        older = [path for path in generations if _sequence_number(path) < current_number]
+        keep = [self.directory / current] + older[len(older) - KEEP_GENERATIONS:]
+
+        referenced = set()
+        for path in keep:
+            files = (self.read_manifest(path.name) or {}).get("files", {})
+            referenced.update(name for name in files.values() if name)
+
+        for path in generations:
+            if path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        for path in self._files("corpus") + self._files("vectors"):
+            if path.name not in referenced:
+                path.unlink(missing_ok=True)
+
+    def load(self, generation: Optional[str] = None,
+             mmap: bool = True) -> Tuple[faiss.Index, List[dict], PassageTable, LexicalIndex, Optional[Path]]:
+        """
+        Load a generation (the current one by default)
+
+        Args:
+            generation: Generation directory name
+            mmap: Memory-map the index codes and passage arrays, so every
+                worker maps the same page cache instead of a private copy
+
+        Returns:
+            Tuple of (index, document table rows, passage table, lexical index,
+            raw vector file or None)
+        """
+        generation = generation or self.current_generation()
+        if generation is None:
+            raise FileNotFoundError(f"No snapshot generation in {self.current_path}")
+        directory = self.directory / generation
+        index_file = str(self.index_file(generation))
+        if mmap and not MMAP_SUPPORTED:
+            _warn_no_mmap()
+        try:
+            index = faiss.read_index(index_file, MMAP_FLAGS if mmap and MMAP_SUPPORTED else 0)
+        except RuntimeError as e:
+            # Not every index type supports mmap; fall back to a regular read
+            logger.warning(f"mmap load failed ({e}), reading index into memory")
+            index = faiss.read_index(index_file)
+
+        with open(directory / "documents.json", 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        with open(directory / "manifest.json", 'r', encoding='utf-8') as f:
+            files = json.load(f).get("files", {})
+
+        passages = PassageTable.load(directory / "passages", self.directory, mmap=mmap)
+        lexical = LexicalIndex.load(directory / "lexical", mmap=mmap)
+        vectors_path = self.directory / files["vectors"] if files.get("vectors") else None
+        return index, table, passages, lexical, vectors_path
+
+    def load_signatures(self, generation: str) -> Optional[np.ndarray]:
+        """Document signatures of a generation (mmapped), aligned with its document table; None if not stored"""
+        path = self.directory / generation / "signatures.npy"
+        return np.load(path, mmap_mode='r') if path.exists() else None
@@ -0,0 +1,74 @@
+"""
+Server-Sent Events helpers and a fake streaming LLM
+Shared by the FastAPI and Flask chat streams; dependency-free so either
+stack can import it
+"""
+
+import json
+import os
+import re
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\S+\s*")
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Format one Server-Sent Event
+
+    data is sent as a single JSON line, so payloads containing newlines
+    cannot break the framing.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class FakeStreamingLLM:
+    """
+    Deterministic stand-in for a streaming LLM
+
+    Produces the templated answer of the mock generator one word at a time,
+    optionally sleeping between tokens to mimic generation speed.
+    create() mirrors openai.ChatCompletion.create, including stream=True
+    chunks, so the OpenAI code path can run without an API key.
+    tokens_generated counts every token produced, which shows whether an
+    abandoned stream really stopped.
+    """
+
+    def __init__(self, token_delay_ms: float = 0.0):
+        self.token_delay = token_delay_ms / 1000.0
+        self.tokens_generated = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeStreamingLLM":
+        return cls(token_delay_ms=float(os.getenv('FAKE_LLM_TOKEN_DELAY_MS', 0)))
+
+    @staticmethod
+    def answer(query: str, context: str) -> str:
+        """The full answer stream() produces"""
+        if not context.strip():
+            return f"I couldn't find specific information about '{query}'. Please try a different question."
+        return f"Based on our university information: {context[:200]}... For more details, please check the sources provided."
+
+    def stream(self, query: str, context: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield the answer token by token (a token is a word plus its trailing whitespace)"""
+        for i, match in enumerate(_TOKEN.finditer(self.answer(query, context))):
+            if max_tokens is not None and i >= max_tokens:
+                return
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            self.tokens_generated += 1
+            yield match.group()
+
+    def create(self, messages: List[Dict[str, str]], stream: bool = False, max_tokens: Optional[int] = None,
+               **kwargs) -> Union[dict, Iterator[dict]]:
+        """openai.ChatCompletion.create lookalike: the system message is the context"""
+        context = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        query = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        tokens = self.stream(query, context, max_tokens)
+        if stream:
+            return ({"choices": [{"delta": {"content": token}, "finish_reason": None}]} for token in tokens)
+        return {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}]}
@@ -1,33 +1,303 @@
 """
 Vector store using FAISS for semantic search and retrieval
-Manages document embeddings and similarity search
+Manages passage embeddings and similarity search
 """
 
 import faiss
+import hashlib
+import json
 import numpy as np
 from pathlib import Path
 import logging
-from typing import List
-from app.core.embeddings import EmbeddingGenerator
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from . import shared_memory
+from .embeddings import shared_generator
+from .index_factory import (
+    METRICS, IndexBuilder, IndexConfig, base_index, build_index, bytes_per_vector, evaluate_recall, rescore,
+    search_parameters, similarity_scores, writable_copy
+)
+from .ingest import SourceDocument, read_documents
+from .lexical import (
+    Hits, LexicalIndex, LexicalIndexBuilder, is_exact_match_query, lexical_hits, reciprocal_rank_fusion
+)
+from .metadata import MetadataIndex
+from .metrics import timed
+from .near_duplicates import NUM_PERM, SIGNATURE_DTYPE, NearDuplicateFilter, minhash
+from .passages import Passage, PassageTable, Span, chunk_text
+from .raw_vectors import RawVectors
+from .snapshot import IndexSnapshot, build_manifest, hash_corpus
 
 logger = logging.getLogger(__name__)
 
+# Rewrite the corpus file once less than half of it is still referenced
+COMPACT_MIN_BYTES = 1 << 20
+COMPACT_MAX_GARBAGE = 0.5
+
+# Rebuild an index that cannot delete (HNSW) once this share of its vectors are tombstones
+REBUILD_MAX_GARBAGE = 0.2
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+
+def document_id(key: str) -> int:
+    """Stable non-negative int64 ID for a document key"""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def content_hash(text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Hash used to skip re-embedding unchanged documents"""
+    if metadata:
+        text += "\0" + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def tombstoned(index: Optional[faiss.Index],
+               passages: Optional[PassageTable]) -> Tuple[np.ndarray, Optional[faiss.IDSelector]]:
+    """IDs the index still holds for passages no longer in the table, and a selector that skips them"""
+    if index is None or passages is None or index.ntotal == len(passages):
+        return np.empty(0, dtype=np.int64), None
+    index_ids = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    dead = np.setdiff1d(index_ids, passages.ids, assume_unique=True)
+    return dead, faiss.IDSelectorNot(faiss.IDSelectorBatch(dead))
+
+
+@dataclass(frozen=True)
+class _IndexState:
+    """
+    Immutable view of the index, its passage table and the document table
+
+    Writers build a new state and swap it in with a single assignment, so
+    readers always see an index and tables that belong together.
+    """
+    index: Optional[faiss.Index] = None
+    passages: Optional[PassageTable] = None
+    lexical: Optional[LexicalIndex] = None
+    vectors: Optional[RawVectors] = None
+    keys: Dict[int, str] = field(default_factory=dict)
+    hashes: Dict[int, str] = field(default_factory=dict)
+    metadata: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    filters: MetadataIndex = field(default_factory=lambda: MetadataIndex({}))
+    # MinHash per document, and directory pages left out as near copies of another (key -> kept key)
+    signatures: Dict[int, np.ndarray] = field(default_factory=dict)
+    duplicates: Dict[str, str] = field(default_factory=dict)
+    # Vectors of removed passages that an index unable to delete (HNSW) still
+    # holds, and the selector unfiltered searches use to skip them
+    tombstones: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    live: Optional[faiss.IDSelector] = None
+
+
+class _WriteOp:
+    """A queued upsert/delete and, once applied, its result counts"""
+
+    def __init__(self, upserts: Dict[str, str], deletes: Iterable[str],
+                 metadata: Optional[Dict[str, Dict[str, Any]]] = None,
+                 signatures: Optional[Dict[str, np.ndarray]] = None, duplicates: Optional[Dict[str, str]] = None):
+        self.upserts = upserts
+        self.deletes = list(deletes)
+        self.metadata = metadata or {}
+        # Precomputed MinHash signatures, and a replacement for the duplicates map
+        self.signatures = signatures or {}
+        self.duplicates = duplicates
+        self.result: Optional[dict] = None
+
+
 class VectorStore:
     """
     FAISS-based vector store for efficient semantic document retrieval
     Stores embeddings and provides fast nearest-neighbor search
+    
+    Documents are split into overlapping passages and each passage gets its
+    own vector (IndexIDMap2 over passage IDs). Passage metadata is kept in
+    NumPy arrays and text is read from an mmapped corpus file on demand.
+    
+    Documents carry stable IDs, so they can be added, updated and deleted
+    without a rebuild. Writes are copy-on-write: they modify a clone of the
+    index and swap it in, never blocking concurrent searches. HNSW graphs
+    cannot delete: removed passages stay in the graph as tombstones that
+    searches skip, and once they pass REBUILD_MAX_GARBAGE of the index a
+    background thread rebuilds it from the stored vectors.
+    
+    With INDEX_STORAGE=fp16/sq8 the index holds quantized vectors; setting
+    INDEX_RESCORE_FACTOR also keeps float32 copies in an mmapped file and
+    re-scores top_k * factor candidates exactly.
+    
+    A BM25 inverted index over the same passages is kept in step with the
+    FAISS index for exact terms (course codes, emails, building names);
+    see search_many() for how the two are combined.
+    
+    Documents may carry flat metadata (e.g. department, term). A filter is
+    resolved to the allowed passage IDs before searching, so filtered
+    queries still return top_k results rather than a thinned-out top_k.
+    
+    Several worker processes can share one store: builds and writes happen
+    under a file lock, each publishes a new snapshot generation, and the
+    other workers map it read-only via refresh().
+    
+    Directory ingestion streams: files are read in parallel, pages that
+    are near copies of one already indexed (MinHash) are skipped, and
+    passages are embedded and added to the index in bounded batches.
     """
     
-    def __init__(self, index_path: str = "data/vector_index.faiss"):
-        """Initialize vector store"""
+    def __init__(self, index_path: str = "data/vector_index.faiss", index_config: Optional[IndexConfig] = None,
+                 partition: Optional[Callable[[Path], bool]] = None):
+        """
+        Initialize vector store
+        
+        Args:
+            index_path: Location of the FAISS snapshot
+            index_config: Index type and tuning; read from INDEX_* env vars if omitted
+            partition: Directory ingestion only indexes the .txt files it
+                accepts (one shard's share of the corpus); all files if omitted
+        """
         self.index_path = index_path
-        self.embedding_gen = EmbeddingGenerator()
-        self.documents: List[str] = []
-        self.index = None
+        self.partition = partition
+        self.snapshot = IndexSnapshot(index_path)
+        self.embedding_gen = shared_generator()
+        self.index_config = index_config or IndexConfig.from_env()
+        self.chunk_tokens = min(int(os.getenv('PASSAGE_TOKENS', 128)), self.embedding_gen.max_tokens)
+        self.chunk_overlap = int(os.getenv('PASSAGE_OVERLAP_TOKENS', 32))
+        self.recall_check = os.getenv('INDEX_RECALL_CHECK', 'True') == 'True'
+        self.recall_report: Optional[dict] = None
+        self.search_mode = os.getenv('SEARCH_MODE', 'hybrid').lower()
+        self.lexical_fast_path = os.getenv('LEXICAL_FAST_PATH', 'True') == 'True'
+        self.hybrid_parallel = os.getenv('HYBRID_PARALLEL', 'True') == 'True'
+        self.fusion_depth = int(os.getenv('HYBRID_DEPTH', 50))
+        self.rrf_k = int(os.getenv('RRF_K', 60))
+        self.filter_exact_max = int(os.getenv('FILTER_EXACT_MAX', 10000))
+        self.read_threads = int(os.getenv('INGEST_READ_THREADS', 4))
+        self.read_ahead = int(os.getenv('INGEST_READ_AHEAD', 64))
+        self.batch_passages = int(os.getenv('INGEST_BATCH_PASSAGES', 1024))
+        self.near_duplicates = os.getenv('NEAR_DUPLICATE_FILTER', 'True') == 'True'
+        self.near_duplicate_threshold = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.8))
+        self._lexical_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lexical") if self.hybrid_parallel else None
+        self._state = _IndexState()
+        self._manifest: Optional[dict] = None
+        self._generation: Optional[str] = None
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[_WriteOp] = []
+        self._change_listeners: List[Callable[[Set[str]], Any]] = []
+        self._rebuild_thread: Optional[threading.Thread] = None
         logger.info("VectorStore initialized")
     
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        return self._state.index
+    
+    @property
+    def document_count(self) -> int:
+        return len(self._state.keys)
+    
+    @property
+    def passages(self) -> Optional[PassageTable]:
+        return self._state.passages
+    
+    @property
+    def lexical(self) -> Optional[LexicalIndex]:
+        return self._state.lexical
+    
+    @property
+    def raw_vectors(self) -> Optional[RawVectors]:
+        return self._state.vectors
+    
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        return self._state.filters
+    
+    def document_metadata(self, key: str) -> Dict[str, Any]:
+        """Metadata stored with a document ({} if it has none or is unknown)"""
+        return self._state.metadata.get(document_id(key), {})
+    
+    def passage_vectors(self, passage_ids: Sequence[int]) -> Optional[np.ndarray]:
+        """Stored embeddings of these passages, or None if the index cannot return them"""
+        return self._allowed_vectors(self._state, np.asarray(passage_ids, dtype=np.int64))
+    
+    @property
+    def generation(self) -> Optional[str]:
+        """Snapshot generation currently being served"""
+        return self._generation
+    
+    def has_document(self, key: str) -> bool:
+        return document_id(key) in self._state.keys
+    
+    def documents(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """(key, text, metadata) of every indexed document, text rebuilt from the corpus file"""
+        state = self._state
+        if state.passages is None:
+            return
+        for doc_id, text in state.passages.documents():
+            yield state.keys[doc_id], text, state.metadata.get(doc_id, {})
+    
+    def stats(self) -> dict:
+        """Index, BM25, metadata and passage table sizes and memory sharing, as reported by /stats"""
+        state = self._state
+        passages = state.passages
+        return {
+            "index": {
+                "type": type(base_index(state.index)).__name__ if state.index is not None else None,
+                "vectors": state.index.ntotal if state.index is not None else 0,
+                "tombstones": len(state.tombstones),
+                "storage": self.index_config.storage,
+                "bytes_per_vector": bytes_per_vector(state.index) if state.index is not None else None,
+                "raw_vector_bytes": state.vectors.nbytes if state.vectors is not None else 0,
+                "recall": self.recall_report,
+                "generation": self.generation,
+            },
+            "lexical": {
+                "passages": len(state.lexical) if state.lexical is not None else 0,
+                "terms": len(state.lexical.vocab) if state.lexical is not None else 0,
+                "postings_bytes": state.lexical.nbytes if state.lexical is not None else 0,
+            },
+            "metadata": {
+                "fields": state.filters.fields,
+                "postings_bytes": state.filters.nbytes,
+            },
+            "passages": {
+                "documents": len(state.keys),
+                "passages": len(passages) if passages is not None else 0,
+                "table_bytes": passages.nbytes if passages is not None else 0,
+                "corpus_bytes": passages.corpus_bytes if passages is not None else 0,
+            },
+            "memory": shared_memory.report(self.snapshot.directory),
+        }
+    
+    def add_change_listener(self, listener: Callable[[Set[str]], Any]):
+        """
+        Call listener(keys) whenever documents are updated or deleted
+        
+        Covers writes made by this process and generations published by
+        other workers, so caches derived from document text (e.g. the
+        answer cache) can drop what they hold for those documents.
+        """
+        self._change_listeners.append(listener)
+    
+    def _notify_changed(self, keys: Set[str]):
+        if not keys:
+            return
+        for listener in self._change_listeners:
+            try:
+                listener(keys)
+            except Exception as e:
+                logger.error(f"Change listener failed: {e}")
+    
     def load_documents(self):
-        """Load documents from files and build FAISS index"""
+        """
+        Load documents from files and build FAISS index
+
+        Reuses the on-disk snapshot when its manifest matches the current
+        model and corpus. If only the corpus changed, the snapshot is loaded
+        and just the added, changed and removed files (or metadata sidecars)
+        are applied to it;
+        otherwise everything is re-embedded, streaming (see _build_streaming).
+        
+        Runs under the snapshot lock, so when several workers start at once
+        one of them builds and the rest load what it published.
+        """
         data_dir = Path("data/sample_documents")
         
         # Create sample documents if they don't exist
@@ -42,64 +312,794 @@ class VectorStore:
             logger.warning("No .txt files found, creating defaults")
             self._create_sample_documents()
             txt_files = list(data_dir.glob("*.txt"))
+        if self.partition is not None:
+            txt_files = [f for f in txt_files if self.partition(f)]
         
-        for txt_file in txt_files:
-            try:
-                with open(txt_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        self.documents.append(content)
-            except Exception as e:
-                logger.error(f"Error reading {txt_file}: {e}")
+        # Optional metadata sidecars (foo.json next to foo.txt) are part of the corpus
+        sidecars = [f.with_suffix(".json") for f in txt_files if f.with_suffix(".json").exists()]
+        corpus = hash_corpus(txt_files + sidecars)
+        manifest = self._build_manifest(corpus)
+        with self._write_lock, self.snapshot.lock():
+            if self.snapshot.matches(manifest, ignore=("corpus",)) and self._load_snapshot():
+                stored = self._manifest
+                if stored["corpus"] == corpus:
+                    logger.info(f"✅ Loaded snapshot {self.generation} with {self.document_count} documents "
+                                f"({len(self.passages)} passages)")
+                    return
+                
+                # Bring the snapshot up to date with only the files that changed
+                changed = [
+                    f for f in txt_files
+                    if any(stored["corpus"].get(name) != corpus.get(name) for name in (f.name, f.with_suffix(".json").name))
+                ]
+                removed = [Path(name).stem for name in stored["corpus"] if name.endswith(".txt") and name not in corpus]
+                self._manifest = manifest
+                result = self._apply_locked(self._directory_write(data_dir, changed, removed))
+                logger.info(f"✅ Updated snapshot from {len(changed)} changed and {len(removed)} removed files: "
+                            f"{result}")
+                return
+            
+            vectors = None
+            if self.index_config.rescore_factor > 0:
+                vectors = RawVectors.create(self.snapshot.new_vectors_path(), self.embedding_gen.embedding_dim)
+            self._state = _IndexState(passages=PassageTable.empty(self.snapshot.new_corpus_path()), vectors=vectors)
+            self._manifest = manifest
+            if not txt_files:
+                # A shard whose partition holds none of the files; API writes still go here
+                logger.info("No documents in this partition, starting empty")
+                return
+            self._build_streaming(sorted(txt_files))
+        
+        logger.info(f"✅ Indexed {self.document_count} documents ({len(self.passages)} passages) "
+                    f"in {self.embedding_gen.embedding_dim}D space")
+    
+    def open(self) -> bool:
+        """
+        Serve the stored snapshot without scanning the documents directory
         
-        if not self.documents:
+        Starts empty (accepting writes) if nothing has been stored yet.
+        Returns True if a snapshot was loaded.
+        
+        Raises:
+            ValueError: The snapshot was built with another model, index or
+                chunking configuration
+        """
+        manifest = self._build_manifest({})
+        with self._write_lock, self.snapshot.lock():
+            if self.snapshot.current_generation() is not None:
+                if not self.snapshot.matches(manifest, ignore=("corpus",)) or not self._load_snapshot():
+                    raise ValueError(f"Snapshot at {self.index_path} was built with a different configuration")
+                return True
+            vectors = None
+            if self.index_config.rescore_factor > 0:
+                vectors = RawVectors.create(self.snapshot.new_vectors_path(), self.embedding_gen.embedding_dim)
+            self._state = _IndexState(passages=PassageTable.empty(self.snapshot.new_corpus_path()), vectors=vectors)
+            self._manifest = manifest
+            return False
+    
+    def _build_manifest(self, corpus: Dict[str, str]) -> dict:
+        return build_manifest(
+            self.embedding_gen.model_name,
+            self.embedding_gen.embedding_dim,
+            corpus,
+            self.index_config.to_dict(),
+            {
+                "tokens": self.chunk_tokens,
+                "overlap": self.chunk_overlap,
+                "near_duplicates": self.near_duplicate_threshold if self.near_duplicates else None,
+            }
+        )
+    
+    def _read_documents(self, files: Iterable[Path],
+                        near_duplicates: Optional[NearDuplicateFilter]) -> Iterable[SourceDocument]:
+        signature = near_duplicates.signature if near_duplicates is not None else None
+        return read_documents(files, self.read_threads, self.read_ahead, signature)
+    
+    def _build_streaming(self, files: List[Path]):
+        """
+        Index files from scratch in bounded batches (write and snapshot locks held)
+        
+        Documents are read ahead on INGEST_READ_THREADS threads, near
+        duplicates of earlier files are skipped, and once INGEST_BATCH_PASSAGES
+        passages are chunked they are embedded and added to the index. Text
+        goes straight to the mmapped corpus file, so memory holds one batch
+        plus the index (and at most INDEX_TRAIN_SAMPLE embeddings while an
+        IVF index waits for its training sample). The new state is published
+        and snapshotted once, at the end.
+        """
+        near_duplicates = NearDuplicateFilter(self.near_duplicate_threshold) if self.near_duplicates else None
+        passages, vectors = self._state.passages, self._state.vectors
+        lexical = LexicalIndexBuilder()
+        keys, hashes, metadata, signatures, duplicates = {}, {}, {}, {}, {}
+        seen = 0
+        # "auto" may have to pick an index type before every file is read: extrapolate
+        builder = IndexBuilder(
+            self.index_config,
+            estimate_total=lambda: len(passages) * len(files) // max(1, seen),
+            check_recall=self.recall_check
+        )
+        batch: Dict[int, Tuple[str, List[Span]]] = {}
+        batch_passages = 0
+        
+        def index_batch():
+            nonlocal passages, vectors
+            passages, new_ids, _, new_texts = passages.with_documents(batch, ())
+            lexical.add(new_ids, new_texts)
+            embeddings = self.embedding_gen.embed(new_texts)
+            builder.add(embeddings, new_ids)
+            if vectors is not None:
+                vectors = vectors.appended(new_ids, embeddings)
+        
+        for document in self._read_documents(files, near_duplicates):
+            seen += 1
+            doc_id = document_id(document.key)
+            if near_duplicates is not None:
+                original = near_duplicates.check(document.key, document.signature)
+                if original is not None:
+                    duplicates[document.key] = original
+                    continue
+                signatures[doc_id] = document.signature
+            keys[doc_id] = document.key
+            hashes[doc_id] = content_hash(document.text, document.metadata)
+            if document.metadata:
+                metadata[doc_id] = document.metadata
+            spans = chunk_text(document.text, self.chunk_tokens, self.chunk_overlap, self.embedding_gen.token_spans)
+            batch[doc_id] = (document.text, spans)
+            batch_passages += len(spans)
+            if batch_passages >= self.batch_passages:
+                index_batch()
+                batch, batch_passages = {}, 0
+        if batch:
+            index_batch()
+        if not keys:
             raise ValueError("No documents loaded - cannot index")
         
-        # Create embeddings
-        logger.info(f"Embedding {len(self.documents)} documents...")
-        embeddings = self.embedding_gen.embed(self.documents)
+        index = builder.finish()
+        self.recall_report = builder.recall_report
+        self._state = _IndexState(
+            index=index, passages=passages, lexical=lexical.build(), vectors=vectors, keys=keys, hashes=hashes,
+            metadata=metadata, filters=MetadataIndex.build(passages, metadata), signatures=signatures,
+            duplicates=duplicates
+        )
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} near-duplicate documents")
+        self._save_snapshot()
+    
+    def _directory_write(self, data_dir: Path, changed: List[Path], removed: List[str]) -> _WriteOp:
+        """
+        Write that brings the index up to date with changed and removed files
         
-        # Build FAISS index
-        embedding_dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(embedding_dim)
-        self.index.add(embeddings.astype(np.float32))
+        Changed files go through the near-duplicate filter, checked against
+        every other indexed document. Pages that were skipped as copies of a
+        changed or removed document are read again, since the page they
+        copied may be gone.
+        """
+        state = self._state
+        near_duplicates, duplicates, revisit = None, None, []
+        if self.near_duplicates:
+            stale = {f.stem for f in changed} | set(removed)
+            revisit = [
+                data_dir / f"{key}.txt" for key, original in state.duplicates.items()
+                if original in stale and key not in stale and (data_dir / f"{key}.txt").exists()
+            ]
+            stale.update(f.stem for f in revisit)
+            near_duplicates = NearDuplicateFilter.from_signatures(
+                ((state.keys[doc_id], signature) for doc_id, signature in state.signatures.items()
+                 if state.keys[doc_id] not in stale),
+                self.near_duplicate_threshold
+            )
+            duplicates = {key: original for key, original in state.duplicates.items() if key not in stale}
         
-        logger.info(f"✅ Indexed {len(self.documents)} documents in {embedding_dim}D space")
+        updates, metadata, signatures = {}, {}, {}
+        deletes = list(removed)
+        for document in self._read_documents(changed + revisit, near_duplicates):
+            if near_duplicates is not None:
+                original = near_duplicates.check(document.key, document.signature)
+                if original is not None:
+                    # Dropped from the index if it only now became a copy
+                    duplicates[document.key] = original
+                    deletes.append(document.key)
+                    continue
+                signatures[document.key] = document.signature
+            updates[document.key] = document.text
+            if document.metadata:
+                metadata[document.key] = document.metadata
+        # Changed files that are now empty or unreadable
+        deletes += [f.stem for f in changed if f.stem not in updates and f.stem not in (duplicates or {})]
+        return _WriteOp(updates, deletes, metadata, signatures, duplicates)
     
-    def search(self, query: str, top_k: int = 5) -> List[str]:
+    def upsert(self, documents: Dict[str, str], metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
         """
-        Search for similar documents
+        Add or replace documents
+        
+        Only documents whose text or metadata changed are re-chunked and re-embedded.
+        
+        Embedding cost grows with the documents written, but every write
+        (together with any writes coalesced into it) publishes a snapshot
+        generation that rewrites the index, passage table and BM25 arrays,
+        i.e. I/O in proportion to the whole corpus. Passage text and raw
+        vectors are append-only and not rewritten. Send documents in batches
+        rather than one write per document.
+        
+        Args:
+            documents: Mapping of document key to text
+            metadata: Optional mapping of document key to {field: scalar value};
+                documents left out have no metadata
+        
+        Returns:
+            Counts of added, updated and unchanged documents
+        """
+        return self.apply(documents, [], metadata)
+    
+    def delete(self, keys: Iterable[str]) -> dict:
+        """
+        Remove documents by key
+        
+        Returns:
+            Count of deleted documents (unknown keys are ignored)
+        """
+        return self.apply({}, keys)
+    
+    def apply(self, upserts: Dict[str, str], deletes: Iterable[str],
+              metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> dict:
+        """
+        Queue a write and apply it together with any other pending writes
+        
+        Concurrent writers are coalesced: whoever holds the write lock
+        applies every queued operation in one copy-on-write index swap.
+        Writes from other processes are picked up first, under the
+        snapshot lock, so none of them are lost.
+        """
+        op = _WriteOp(upserts, deletes, metadata)
+        with self._pending_lock:
+            self._pending.append(op)
+        with self._write_lock:
+            if op.result is None:
+                with self.snapshot.lock():
+                    if self.snapshot.current_generation() not in (None, self._generation):
+                        self._load_snapshot()
+                    self._flush()
+        return op.result
+    
+    def _apply_locked(self, op: _WriteOp) -> dict:
+        """Apply a write while already holding the write and snapshot locks"""
+        with self._pending_lock:
+            self._pending.append(op)
+        self._flush()
+        return op.result
+    
+    def refresh(self) -> bool:
+        """
+        Switch to the newest snapshot generation if another process published one
+        
+        Cheap when nothing changed (one small file read), so it can be
+        polled. Returns True if a new generation was loaded.
+        """
+        generation = self.snapshot.current_generation()
+        if generation is None or generation == self._generation:
+            return False
+        with self._write_lock:
+            if generation == self._generation:
+                return False
+            try:
+                loaded = self._load_snapshot(generation)
+            except (OSError, RuntimeError) as e:
+                # e.g. pruned by a writer in the meantime; the next poll sees its successor
+                logger.warning(f"Could not switch to snapshot {generation}: {e}")
+                return False
+        if loaded:
+            logger.info(f"Switched to snapshot {generation} ({self.document_count} documents)")
+        return loaded
+    
+    def _flush(self):
+        """Apply all pending writes to a clone of the index and swap it in (write lock held)"""
+        with self._pending_lock:
+            ops, self._pending = self._pending, []
+        
+        state = self._state
+        keys, hashes, metadata = dict(state.keys), dict(state.hashes), dict(state.metadata)
+        signatures, duplicates = dict(state.signatures), state.duplicates
+        to_add: Dict[int, str] = {}
+        to_remove = set()
+        
+        for op in ops:
+            result = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+            for key, text in op.upserts.items():
+                doc_id = document_id(key)
+                doc_metadata = op.metadata.get(key) or {}
+                text_hash = content_hash(text, doc_metadata)
+                if hashes.get(doc_id) == text_hash:
+                    result["unchanged"] += 1
+                    continue
+                result["updated" if doc_id in keys else "added"] += 1
+                if doc_id in state.keys:
+                    to_remove.add(doc_id)
+                keys[doc_id], hashes[doc_id] = key, text_hash
+                if doc_metadata:
+                    metadata[doc_id] = doc_metadata
+                else:
+                    metadata.pop(doc_id, None)
+                if key in op.signatures:
+                    signatures[doc_id] = op.signatures[key]
+                elif self.near_duplicates:
+                    signatures[doc_id] = minhash(text)
+                else:
+                    signatures.pop(doc_id, None)
+                to_add[doc_id] = text
+            for key in op.deletes:
+                doc_id = document_id(key)
+                if doc_id not in keys:
+                    continue
+                result["deleted"] += 1
+                del keys[doc_id], hashes[doc_id]
+                metadata.pop(doc_id, None)
+                signatures.pop(doc_id, None)
+                to_add.pop(doc_id, None)
+                if doc_id in state.keys:
+                    to_remove.add(doc_id)
+            if op.duplicates is not None:
+                duplicates = op.duplicates
+            op.result = result
+        
+        if not to_add and not to_remove:
+            if duplicates != state.duplicates and state.index is not None:
+                self._state = replace(state, duplicates=duplicates)
+                self._save_snapshot()
+            return
+        changed = {state.keys[doc_id] for doc_id in to_remove}
+        
+        passages = state.passages if state.passages is not None else PassageTable.empty(self.snapshot.new_corpus_path())
+        chunked = {
+            doc_id: (text, chunk_text(text, self.chunk_tokens, self.chunk_overlap, self.embedding_gen.token_spans))
+            for doc_id, text in to_add.items()
+        }
+        passages, new_ids, removed_ids, new_texts = passages.with_documents(chunked, to_remove)
+        passages = self._maybe_compact(passages)
+        
+        index, vectors = self._updated_index(state.index, state.vectors, removed_ids, new_ids, new_texts, passages)
+        lexical = (state.lexical or LexicalIndex.empty()).with_passages(new_ids, new_texts, removed_ids)
+        tombstones, live = tombstoned(index, passages)
+        self._state = _IndexState(
+            index=index, passages=passages, lexical=lexical, vectors=vectors, keys=keys, hashes=hashes,
+            metadata=metadata, filters=MetadataIndex.build(passages, metadata), signatures=signatures,
+            duplicates=duplicates, tombstones=tombstones, live=live
+        )
+        logger.info(f"Applied {len(ops)} write(s): {len(to_add)} documents chunked into {len(new_ids)} passages, "
+                    f"{len(removed_ids)} passages removed, {len(keys)} documents")
+        self._save_snapshot()
+        self._notify_changed(changed)
+        if index is not None and len(tombstones) > REBUILD_MAX_GARBAGE * index.ntotal:
+            self._schedule_rebuild()
+    
+    def _maybe_compact(self, passages: PassageTable) -> PassageTable:
+        """Move live passages to a new corpus generation once the file is mostly garbage"""
+        corpus_bytes = passages.corpus_bytes
+        if corpus_bytes < COMPACT_MIN_BYTES or passages.live_bytes() > (1 - COMPACT_MAX_GARBAGE) * corpus_bytes:
+            return passages
+        compacted = passages.compacted(self.snapshot.new_corpus_path())
+        logger.info(f"Compacted corpus from {corpus_bytes} to {compacted.corpus_bytes} bytes")
+        return compacted
+    
+    def _updated_index(self, index: Optional[faiss.Index], vectors: Optional[RawVectors], removed_ids: np.ndarray,
+                       new_ids: np.ndarray, new_texts: List[str],
+                       passages: PassageTable) -> Tuple[Optional[faiss.Index], Optional[RawVectors]]:
+        """Return modified copies of index and raw vectors; the originals keep serving readers"""
+        if not len(passages):
+            return None, vectors
+        if index is None:
+            index, embeddings = self._build_index(passages, evaluate=True)
+        else:
+            index = writable_copy(index)
+            embeddings = None
+            if len(removed_ids):
+                try:
+                    index.remove_ids(removed_ids)
+                except RuntimeError:
+                    # HNSW cannot delete: the vectors become tombstones until _rebuild_index
+                    pass
+            if len(new_ids):
+                # embed() already returns contiguous float32, so FAISS reads it without a copy
+                embeddings = self.embedding_gen.embed(new_texts)
+                index.add_with_ids(embeddings, new_ids)
+        
+        if vectors is not None and len(new_ids):
+            # New passages are always the last rows of the table
+            vectors = vectors.appended(new_ids, embeddings[len(embeddings) - len(new_ids):])
+        return index, vectors
+    
+    def _build_index(self, passages: PassageTable, evaluate: bool = False) -> Tuple[faiss.Index, np.ndarray]:
+        """Embed every passage and build a fresh ID-mapped index"""
+        logger.info(f"Embedding {len(passages)} passages...")
+        embeddings = self.embedding_gen.embed(passages.texts())
+        index = build_index(embeddings, self.index_config, ids=passages.ids)
+        
+        # Report what an approximate or quantized index trades for its speed and size
+        if evaluate and self.recall_check and not isinstance(base_index(index), faiss.IndexFlat):
+            self.recall_report = evaluate_recall(
+                index, embeddings, ids=passages.ids, rescore_factor=self.index_config.rescore_factor
+            )
+        return index, embeddings
+    
+    def _schedule_rebuild(self):
+        """Start a background rebuild that drops the tombstones, unless one is running (write lock held)"""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(target=self._rebuild_index, name="index-rebuild", daemon=True)
+        self._rebuild_thread.start()
+    
+    def _rebuild_index(self):
+        """
+        Rebuild the index from the stored vectors of the live passages
+        
+        Nothing is re-embedded, and the graph is built outside the locks so
+        searches and writes carry on meanwhile. Passages written during the
+        build are reconciled under the write lock before the swap.
+        """
+        try:
+            state = self._state
+            ids = state.passages.ids.copy()
+            embeddings = self._allowed_vectors(state, ids)
+            if embeddings is None:
+                logger.warning(f"{type(base_index(state.index)).__name__} cannot return its vectors, not rebuilding")
+                return
+            logger.info(f"Rebuilding index without {len(state.tombstones)} tombstones...")
+            index = build_index(embeddings, self.index_config, ids=ids)
+            del embeddings
+            
+            with self._write_lock, self.snapshot.lock():
+                if self.snapshot.current_generation() not in (None, self._generation):
+                    self._load_snapshot()
+                current = self._state
+                if current.index is None or not current.passages:
+                    return
+                added = np.setdiff1d(current.passages.ids, ids, assume_unique=True)
+                if len(added):
+                    index.add_with_ids(self._allowed_vectors(current, added), added)
+                removed = np.setdiff1d(ids, current.passages.ids, assume_unique=True)
+                if len(removed):
+                    try:
+                        index.remove_ids(removed)
+                    except RuntimeError:
+                        pass
+                tombstones, live = tombstoned(index, current.passages)
+                self._state = replace(current, index=index, tombstones=tombstones, live=live)
+                self._save_snapshot()
+            logger.info(f"Rebuilt index over {index.ntotal} vectors")
+        except Exception as e:
+            # The tombstoned index keeps serving; the next write that removes passages retries
+            logger.error(f"Index rebuild failed: {e}")
+    
+    def _load_snapshot(self, generation: Optional[str] = None) -> bool:
+        """Adopt a stored generation; False if its raw vectors are missing and a rebuild is needed"""
+        generation = generation or self.snapshot.current_generation()
+        manifest = self.snapshot.read_manifest(generation)
+        if manifest is None:
+            return False
+        index, table, passages, lexical, vectors_path = self.snapshot.load(generation, mmap=True)
+        if not len(passages):
+            # Saved after deleting every document; the next write builds a configured index
+            index = None
+        vectors = None
+        if self.index_config.rescore_factor > 0:
+            if vectors_path is None:
+                logger.warning(f"Snapshot {generation} has no raw vectors for re-scoring, rebuilding index")
+                return False
+            vectors = RawVectors(vectors_path, self.embedding_gen.embedding_dim)
+            if len(vectors) < passages.next_id:
+                logger.warning(f"{vectors_path} is incomplete, rebuilding index")
+                return False
+        metadata = {row["id"]: row["metadata"] for row in table if row.get("metadata")}
+        signatures = {}
+        matrix = self.snapshot.load_signatures(generation)
+        if matrix is not None and len(matrix) == len(table):
+            # All-zero rows belong to documents stored without a signature
+            signatures = {row["id"]: matrix[i] for i, row in enumerate(table) if matrix[i].any()}
+        previous = self._state
+        tombstones, live = tombstoned(index, passages)
+        self._state = _IndexState(
+            index=index,
+            passages=passages,
+            lexical=lexical,
+            vectors=vectors,
+            keys={row["id"]: row["key"] for row in table},
+            hashes={row["id"]: row["hash"] for row in table},
+            metadata=metadata,
+            filters=MetadataIndex.build(passages, metadata),
+            signatures=signatures,
+            duplicates=manifest.get("duplicates", {}),
+            tombstones=tombstones,
+            live=live
+        )
+        self._manifest = manifest
+        self._generation = generation
+        self.recall_report = manifest.get("recall")
+        # Documents another process updated or deleted since our previous state
+        hashes = self._state.hashes
+        self._notify_changed({
+            key for doc_id, key in previous.keys.items() if hashes.get(doc_id) != previous.hashes[doc_id]
+        })
+        return True
+    
+    def _save_snapshot(self):
+        state = self._state
+        if state.passages is None or self._manifest is None:
+            return
+        index = state.index
+        if index is None:
+            # Every document was deleted: publish that too, or other workers and restarts would bring them back
+            index = faiss.IndexIDMap2(
+                faiss.IndexFlat(self.embedding_gen.embedding_dim, METRICS[self.index_config.metric])
+            )
+        manifest = dict(self._manifest)
+        if self.recall_report is not None:
+            manifest["recall"] = self.recall_report
+        manifest.pop("duplicates", None)
+        if state.duplicates:
+            manifest["duplicates"] = state.duplicates
+        table = []
+        signatures = np.zeros((len(state.keys), NUM_PERM), dtype=SIGNATURE_DTYPE)
+        for i, (doc_id, key) in enumerate(state.keys.items()):
+            row = {"id": doc_id, "key": key, "hash": state.hashes[doc_id]}
+            if doc_id in state.metadata:
+                row["metadata"] = state.metadata[doc_id]
+            if doc_id in state.signatures:
+                signatures[i] = state.signatures[doc_id]
+            table.append(row)
+        try:
+            self._generation = self.snapshot.save(
+                index, table, state.passages, state.lexical, manifest,
+                vectors_path=state.vectors.path if state.vectors is not None else None,
+                signatures=signatures if state.signatures else None
+            )
+            self.snapshot.prune()
+            # Serve the mapped files rather than this process's private copy,
+            # so the writer shares pages with the other workers too
+            self._load_snapshot(self._generation)
+        except (OSError, RuntimeError) as e:
+            # A failed save only costs a rebuild on the next start
+            logger.error(f"Failed to save snapshot: {e}")
+    
+    def search(self, query: str, top_k: int = 5, min_score: Optional[float] = None,
+               mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> List[Passage]:
+        """
+        Search for similar passages
         
         Args:
             query: Search query text
             top_k: Number of results to return
+            min_score: Drop hits with cosine similarity below this (not in lexical mode)
+            mode: "vector", "lexical" or "hybrid"; defaults to SEARCH_MODE
+            filters: Only return passages of documents whose metadata matches
         
         Returns:
-            List of matching documents
+            List of matching passages (id, score), best first (see search_many)
+        """
+        return self.search_many([query], top_k=top_k, min_score=min_score, mode=mode, filters=filters)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, min_score: Optional[float] = None,
+                    mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None,
+                    query_embeddings: Optional[np.ndarray] = None) -> List[List[Passage]]:
         """
-        if not self.index or not self.documents:
+        Search for several queries at once
+        
+        All queries are embedded in one forward pass and looked up with a
+        single index.search on the (n, d) query matrix. In hybrid mode the
+        BM25 index is searched as well (in parallel when HYBRID_PARALLEL is
+        set) and both rankings are merged with reciprocal rank fusion;
+        queries that name something literal (course code, email address)
+        and have lexical hits are ranked by BM25 alone.
+        
+        Metadata filters are resolved to the allowed passage IDs first.
+        Up to FILTER_EXACT_MAX of them are scored exactly against the query;
+        larger sets are passed to FAISS as an IDSelector, so the index only
+        considers matching vectors. Either way a filtered query returns
+        top_k results whenever that many passages match.
+        
+        Args:
+            queries: Search query texts
+            top_k: Number of results to return per query
+            nprobe: IVF lists to visit (higher = better recall, slower)
+            ef_search: HNSW candidate list size (higher = better recall, slower)
+            min_score: Drop hits whose cosine similarity is below this
+                threshold (vector and hybrid modes)
+            mode: "vector" (cosine scores), "lexical" (BM25 scores) or
+                "hybrid" (fused order, cosine scores); defaults to SEARCH_MODE
+            filters: {field: value} or {field: [value, ...]}; documents must
+                match every field and any of the listed values
+            query_embeddings: Embeddings of queries, if already computed
+                (e.g. once for every shard of a ShardedVectorStore)
+        
+        Returns:
+            One list of matching passages per query, in input order, best
+            first: by descending score in vector and lexical mode, by fused
+            rank in hybrid mode (where the attached cosine scores need not
+            be descending). Passage text is read from the corpus file only
+            when accessed
+        """
+        state = self._state
+        if state.index is None or not state.passages:
             logger.warning("Vector store not initialized")
+            return [[] for _ in queries]
+        
+        if not queries:
             return []
         
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        
+        allowed = None
+        if filters:
+            allowed = state.filters.allowed(filters)
+            if not len(allowed):
+                return [[] for _ in queries]
+        
         try:
-            # Embed query
-            query_embedding = self.embedding_gen.embed([query])
+            # Includes query embedding, which is also recorded on its own
+            with timed("search", len(queries)):
+                if mode == "lexical":
+                    hits = lexical_hits(state.lexical, queries, top_k, allowed)
+                elif mode == "vector":
+                    hits = self._vector_hits(state, queries, top_k, nprobe, ef_search, min_score, allowed,
+                                             query_embeddings)
+                else:
+                    hits = self._hybrid_hits(state, queries, top_k, nprobe, ef_search, min_score, allowed,
+                                             query_embeddings)
             
-            # Search
-            distances, indices = self.index.search(query_embedding.astype(np.float32), top_k)
-            
-            # Get results
-            results = [
-                self.documents[i] for i in indices[0] 
-                if i < len(self.documents)
-            ]
-            
-            logger.debug(f"Search for '{query[:50]}...' returned {len(results)} results")
+            results = [self._to_passages(state, ids[:top_k], scores[:top_k]) for ids, scores in hits]
+            logger.debug(f"Batched {mode} search for {len(queries)} queries returned "
+                         f"{sum(len(r) for r in results)} results")
             return results
         
         except Exception as e:
             logger.error(f"Search error: {e}")
-            return []
+            return [[] for _ in queries]
+    
+    def _hybrid_hits(self, state: _IndexState, queries: List[str], top_k: int, nprobe: Optional[int],
+                     ef_search: Optional[int], min_score: Optional[float],
+                     allowed: Optional[np.ndarray] = None, query_embeddings: Optional[np.ndarray] = None) -> List[Hits]:
+        """
+        Fuse vector and BM25 rankings, returning (ids, cosine scores) per query
+        
+        Candidates are ordered by reciprocal rank fusion but scored, and cut
+        off at min_score, by cosine similarity, so scores mean what they do
+        in vector mode; BM25-only candidates are scored against their stored
+        vectors. Exact-match queries with lexical hits keep the BM25 order
+        and skip the vector search.
+        """
+        depth = max(top_k, self.fusion_depth)
+        lexical_future = None
+        if self._lexical_pool is not None:
+            lexical_future = self._lexical_pool.submit(lexical_hits, state.lexical, queries, depth, allowed)
+        
+        # Embed while BM25 runs
+        if query_embeddings is None:
+            query_embeddings = self.embedding_gen.embed(queries)
+        exact = [self.lexical_fast_path and is_exact_match_query(query) for query in queries]
+        vector: Dict[int, Hits] = {}
+        
+        def search_vectors(positions: List[int]):
+            if positions:
+                found = self._vector_hits(
+                    state, [queries[i] for i in positions], depth, nprobe, ef_search, None, allowed,
+                    query_embeddings[positions]
+                )
+                vector.update(zip(positions, found))
+        
+        search_vectors([i for i, is_exact in enumerate(exact) if not is_exact])
+        if lexical_future is not None:
+            lexical = lexical_future.result()
+        else:
+            lexical = lexical_hits(state.lexical, queries, depth, allowed)
+        # Literal-looking queries that matched nothing lexically still get semantic results
+        search_vectors([i for i, is_exact in enumerate(exact) if is_exact and not len(lexical[i][0])])
+        
+        hits = []
+        for i, (lexical_ids, _) in enumerate(lexical):
+            if i in vector:
+                ids, _ = reciprocal_rank_fusion([vector[i][0], lexical_ids], k=self.rrf_k)
+            else:
+                ids = lexical_ids
+            scores = self._cosine_scores(state, query_embeddings[i], ids, vector.get(i))
+            if min_score is not None:
+                keep = scores >= min_score
+                ids, scores = ids[keep], scores[keep]
+            hits.append((ids, scores))
+        return hits
+    
+    def _cosine_scores(self, state: _IndexState, query: np.ndarray, ids: np.ndarray,
+                       known: Optional[Hits]) -> np.ndarray:
+        """Cosine similarity of each passage to the query, reusing the scores a vector search returned"""
+        found = dict(zip(known[0].tolist(), known[1].tolist())) if known is not None else {}
+        scores = np.array([found.get(passage_id, np.nan) for passage_id in ids.tolist()], dtype=np.float32)
+        missing = np.flatnonzero(np.isnan(scores))
+        if len(missing):
+            vectors = self._allowed_vectors(state, ids[missing])
+            if vectors is None:
+                # e.g. IVF without raw vectors; passage embeddings come from the embedding cache
+                rows = state.passages.rows(ids[missing])
+                vectors = self.embedding_gen.embed([state.passages.text_at(row) for row in rows])
+            scores[missing] = vectors @ query
+        return scores
+    
+    def _vector_hits(self, state: _IndexState, queries: List[str], top_k: int, nprobe: Optional[int],
+                     ef_search: Optional[int], min_score: Optional[float],
+                     allowed: Optional[np.ndarray] = None, query_embeddings: Optional[np.ndarray] = None) -> List[Hits]:
+        """Embed queries and search the FAISS index, returning (ids, cosine scores) per query"""
+        if query_embeddings is None:
+            query_embeddings = self.embedding_gen.embed(queries)
+        
+        selector = None
+        if allowed is not None:
+            if len(allowed) <= self.filter_exact_max:
+                candidates = self._allowed_vectors(state, allowed)
+                if candidates is not None:
+                    scores, indices = self._exact_top_k(query_embeddings, allowed, candidates, top_k)
+                    return self._keep_hits(indices, scores, min_score)
+                # IVF cannot reconstruct by ID: probe every list so no matching vector is skipped
+                try:
+                    nprobe = faiss.extract_index_ivf(state.index).nlist
+                except RuntimeError:
+                    pass
+            # Keep a reference: the parameters hold only a pointer to the selector
+            selector = faiss.IDSelectorBatch(allowed)
+        elif state.live is not None:
+            selector = state.live
+        
+        params = search_parameters(state.index, nprobe=nprobe, ef_search=ef_search, sel=selector)
+        rescore_factor = self.index_config.rescore_factor if state.vectors is not None else 0
+        n_candidates = top_k * rescore_factor if rescore_factor > 0 else top_k
+        with timed("index", len(queries)):
+            distances, indices = state.index.search(query_embeddings, n_candidates, params=params)
+        
+        if rescore_factor > 0:
+            # Exact cosine from the float32 copies reorders the quantized candidates
+            scores, indices = rescore(query_embeddings, indices, state.vectors.get(indices), top_k)
+        else:
+            scores = similarity_scores(distances, state.index.metric_type)
+        return self._keep_hits(indices, scores, min_score)
+    
+    def _allowed_vectors(self, state: _IndexState, allowed: np.ndarray) -> Optional[np.ndarray]:
+        """Vectors of the allowed passages, or None if the index cannot return them"""
+        if state.vectors is not None:
+            return state.vectors.get(allowed)
+        try:
+            return state.index.reconstruct_batch(allowed)
+        except RuntimeError:
+            return None
+    
+    @staticmethod
+    def _exact_top_k(queries: np.ndarray, ids: np.ndarray, vectors: np.ndarray,
+                     k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top k of a small candidate set; (scores, ids) of shape (n, min(k, len(ids)))"""
+        scores = queries @ vectors.T
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        return np.take_along_axis(scores, order, axis=1), ids[np.take_along_axis(top, order, axis=1)]
+    
+    @staticmethod
+    def _keep_hits(indices: np.ndarray, scores: np.ndarray, min_score: Optional[float]) -> List[Hits]:
+        # -1 marks padding when fewer than top_k hits exist
+        hits = []
+        for ids, id_scores in zip(indices, scores):
+            keep = ids >= 0
+            if min_score is not None:
+                keep &= id_scores >= min_score
+            hits.append((ids[keep], id_scores[keep]))
+        return hits
+    
+    def _to_passages(self, state: _IndexState, ids: np.ndarray, scores: np.ndarray) -> List[Passage]:
+        rows = state.passages.rows(ids)
+        return [
+            Passage(int(passage_id), float(score), state.keys[int(state.passages.doc_ids[row])], state.passages, int(row))
+            for passage_id, score, row in zip(ids, scores, rows)
+            if row >= 0
+        ]
     
     def _create_sample_documents(self):
         """Create default sample university documents"""
@@ -9,15 +9,24 @@ Architecture:
 - Local LLM inference (no cloud dependencies)
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
 from pathlib import Path
 import os
 
-from app.api import chat, search
+from app.api import chat, index, search
 from app.core.vector_store import VectorStore
+from app.core.sharding import vector_store_from_env
+from app.core.answer_cache import AnswerCache
+from app.core.batching import QueryBatcher
+from app.core.context_selection import ContextSelector
+from app.core.conversation import ContextPacker, session_store_from_env
+from app.core.executor import VectorStoreExecutor
+from app.core import metrics, shared_memory
 
 # Configure logging
 logging.basicConfig(
@@ -40,22 +49,91 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser devtools on the frontend's origin show the stage breakdown
+    expose_headers=["Server-Timing"],
 )
 
+# Per-request stage breakdown in a Server-Timing response header
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False') == 'True'
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Request latency histogram, stage labels and the optional Server-Timing header"""
+    # The API has no path parameters, so the path names the endpoint
+    timings = metrics.RequestTimings(request.url.path)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Unknown paths share one label, so probes cannot grow the series without bound
+        if status == 404:
+            timings.endpoint = "other"
+        total = timings.finish(request.method, status)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timings.server_timing(total)
+    return response
+
 # Initialize vector store on startup
 @app.on_event("startup")
 async def startup_event():
     """Initialize vector store and load embeddings"""
     try:
         logger.info("Initializing vector store...")
-        vector_store = VectorStore()
+        vector_store = vector_store_from_env()
         vector_store.load_documents()
         logger.info("✅ Vector store initialized successfully")
         app.state.vector_store = vector_store
+        
+        answer_cache = AnswerCache.from_env(vector_store.embedding_gen.embedding_dim)
+        if answer_cache is not None:
+            vector_store.add_change_listener(answer_cache.invalidate)
+        app.state.answer_cache = answer_cache
+        
+        app.state.sessions = session_store_from_env()
+        app.state.context_packer = ContextPacker.from_env()
+        app.state.context_selector = ContextSelector.from_env()
+        
+        executor = VectorStoreExecutor.from_env()
+        app.state.executor = executor
+        
+        query_batcher = QueryBatcher.from_env(vector_store, executor)
+        await query_batcher.start()
+        app.state.query_batcher = query_batcher
+        
+        if isinstance(vector_store, VectorStore) and vector_store.generation is not None:
+            shared_memory.verify_shared(
+                vector_store.snapshot.directory, vector_store.snapshot.index_file(vector_store.generation)
+            )
+        refresh_seconds = float(os.getenv('INDEX_REFRESH_SECONDS', 2))
+        if refresh_seconds > 0:
+            app.state.refresh_task = asyncio.create_task(refresh_snapshot(vector_store, executor, refresh_seconds))
     except Exception as e:
         logger.error(f"Failed to initialize vector store: {e}")
         raise
 
+async def refresh_snapshot(vector_store, executor: VectorStoreExecutor, interval: float):
+    """Pick up snapshot generations published by other workers"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await executor.run(vector_store.refresh)
+        except Exception as e:
+            logger.warning(f"Snapshot refresh failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers"""
+    refresh_task = getattr(app.state, "refresh_task", None)
+    if refresh_task is not None:
+        refresh_task.cancel()
+    query_batcher = getattr(app.state, "query_batcher", None)
+    if query_batcher is not None:
+        await query_batcher.stop()
+    executor = getattr(app.state, "executor", None)
+    if executor is not None:
+        executor.shutdown()
+
 # Mount static files for frontend
 static_path = Path(__file__).parent.parent.parent / "frontend"
 if static_path.exists():
@@ -64,6 +142,7 @@ if static_path.exists():
 # Include API routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(search.router, prefix="/api", tags=["search"])
+app.include_router(index.router, prefix="/api", tags=["index"])
 
 @app.get("/")
 async def root():
@@ -80,6 +159,24 @@ async def health():
     """Health check endpoint for monitoring"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms in the Prometheus text format (per worker process)"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+async def stats():
+    """Cache counters, index recall report and memory sharing for capacity planning"""
+    vector_store = getattr(app.state, "vector_store", None)
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+    return {
+        "embedding_cache": vector_store.embedding_gen.cache_stats(),
+        "answer_cache": app.state.answer_cache.stats() if app.state.answer_cache is not None else {},
+        "sessions": app.state.sessions.stats(),
+        **vector_store.stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
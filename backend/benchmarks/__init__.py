@@ -0,0 +1,14 @@
+"""
+Offline benchmarks of the retrieval and chat paths
+
+Run from backend/:
+    python -m benchmarks micro --sizes 1000,10000,100000 --out results/micro.json
+    python -m benchmarks agreement --backends onnx --out results/agreement.json
+    python -m benchmarks load --app fastapi --passages 10000 --out results/load.json
+    python -m benchmarks compare results/before.json results/after.json
+
+micro and load use the deterministic hash embedding model
+(EMBEDDING_BACKEND=hash) and, for load tests, the fake LLM, so nothing is
+downloaded or called over the network and results are comparable across
+commits. agreement checks a real model's optimized backends against it.
+"""
@@ -0,0 +1,161 @@
+"""Command line entry point: python -m benchmarks {micro,agreement,load,compare}"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+
+def _ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def _names(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def micro(args: argparse.Namespace):
+    # Before app.core is imported: the embedding model and cache are chosen on first use
+    os.environ["EMBEDDING_BACKEND"] = args.backend
+    os.environ["EMBEDDING_CACHE_MB"] = "0"
+    os.environ["EMBEDDING_CACHE_DIR"] = ""
+    from .micro import run
+    from .report import write_results
+
+    parameters = {
+        "sizes": args.sizes,
+        "batch_sizes": args.batch_sizes,
+        "index_types": args.index_types,
+        "modes": args.modes,
+        "store_max": args.store_max,
+        "queries": args.queries,
+        "seed": args.seed,
+        "min_seconds": args.min_seconds,
+    }
+    results = run(args.sizes, args.batch_sizes, args.index_types, args.modes, args.store_max,
+                  n_queries=args.queries, seed=args.seed, min_seconds=args.min_seconds)
+    write_results(args.out, "micro", parameters, results)
+    logging.info(f"Results written to {args.out}")
+
+
+def agreement(args: argparse.Namespace):
+    os.environ["EMBEDDING_CACHE_MB"] = "0"
+    from .agreement import run
+    from .report import write_results
+
+    parameters = {
+        "model": args.model,
+        "backends": args.backends,
+        "reference": args.reference,
+        "passages": args.passages,
+        "queries": args.queries,
+        "onnx_quantize": os.getenv('ONNX_QUANTIZE', 'True'),
+        "seed": args.seed,
+    }
+    results = run(args.model, args.backends, args.reference, args.passages, args.queries, seed=args.seed)
+    write_results(args.out, "agreement", parameters, results)
+    logging.info(f"Results written to {args.out}")
+
+
+def load(args: argparse.Namespace):
+    from .load import run_against, serve
+    from .report import write_results
+
+    parameters = {
+        "app": args.app,
+        "passages": args.passages,
+        "endpoints": args.endpoints,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "seed": args.seed,
+        "llm_delay_ms": args.llm_delay_ms,
+        "url": args.url,
+    }
+    if args.url:
+        results = run_against(args.url, args.app, args.endpoints, args.concurrency, args.requests, seed=args.seed)
+    else:
+        env = {"FAKE_LLM_TOKEN_DELAY_MS": str(args.llm_delay_ms)}
+        with serve(args.app, args.passages, args.seed, env) as base_url:
+            results = run_against(base_url, args.app, args.endpoints, args.concurrency, args.requests,
+                                  seed=args.seed)
+    write_results(args.out, "load", parameters, results)
+    logging.info(f"Results written to {args.out}")
+
+
+def compare(args: argparse.Namespace):
+    from .report import compare as compare_runs
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    candidate = json.loads(args.candidate.read_text(encoding="utf-8"))
+    rows = compare_runs(baseline, candidate, args.match)
+    if not rows:
+        print("No metrics in common")
+        return
+    width = max(len(metric) for metric, *_ in rows)
+    for metric, old, new, change in rows:
+        print(f"{metric:<{width}}  {old:>14.4f}  {new:>14.4f}  {change:>+8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro_parser = commands.add_parser("micro", help="embed, index build/search and VectorStore benchmarks")
+    micro_parser.add_argument("--sizes", type=_ints, default=[1000, 10000],
+                              help="corpus sizes in passages, e.g. 1000,100000,1000000")
+    micro_parser.add_argument("--batch-sizes", type=_ints, default=[1, 8, 32, 128])
+    micro_parser.add_argument("--index-types", type=_names, default=["flat", "hnsw", "ivf", "ivfpq"])
+    micro_parser.add_argument("--modes", type=_names, default=["vector", "hybrid"])
+    micro_parser.add_argument("--store-max", type=int, default=100_000,
+                              help="skip the end-to-end VectorStore benchmark above this many passages")
+    micro_parser.add_argument("--queries", type=int, default=256)
+    micro_parser.add_argument("--backend", default="hash",
+                              help="EMBEDDING_BACKEND to benchmark (hash needs no model download)")
+    micro_parser.add_argument("--min-seconds", type=float, default=1.0,
+                              help="minimum time spent on each timed operation")
+    micro_parser.add_argument("--seed", type=int, default=0)
+    micro_parser.add_argument("--out", type=Path, default=Path("results/micro.json"))
+    micro_parser.set_defaults(handler=micro)
+
+    agreement_parser = commands.add_parser("agreement",
+                                           help="cosine agreement of embedding backends with the reference")
+    agreement_parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    agreement_parser.add_argument("--backends", type=_names, default=["onnx"],
+                                  help="compared backends; set ONNX_QUANTIZE=False to check float32 ONNX")
+    agreement_parser.add_argument("--reference", default="sentence-transformers")
+    agreement_parser.add_argument("--passages", type=int, default=2000)
+    agreement_parser.add_argument("--queries", type=int, default=256)
+    agreement_parser.add_argument("--seed", type=int, default=0)
+    agreement_parser.add_argument("--out", type=Path, default=Path("results/agreement.json"))
+    agreement_parser.set_defaults(handler=agreement)
+
+    load_parser = commands.add_parser("load", help="concurrent load against /api/search and /api/chat")
+    load_parser.add_argument("--app", choices=["fastapi", "flask"], default="fastapi")
+    load_parser.add_argument("--passages", type=int, default=10000, help="size of the served synthetic corpus")
+    load_parser.add_argument("--endpoints", type=_names, default=["search", "chat"])
+    load_parser.add_argument("--concurrency", type=_ints, default=[1, 4, 16])
+    load_parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    load_parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    load_parser.add_argument("--llm-delay-ms", type=float, default=0.0,
+                             help="per-token delay of the fake LLM")
+    load_parser.add_argument("--seed", type=int, default=0)
+    load_parser.add_argument("--out", type=Path, default=Path("results/load.json"))
+    load_parser.set_defaults(handler=load)
+
+    compare_parser = commands.add_parser("compare", help="relative change of every metric between two runs")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("candidate", type=Path)
+    compare_parser.add_argument("--match", default="", help="only metrics whose path contains this")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+                        stream=sys.stderr)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Embedding backends compared on the synthetic corpus
+How closely each backend (e.g. onnx, or onnx with ONNX_QUANTIZE=True)
+reproduces the reference backend's embeddings: per-text cosine agreement
+and overlap of the top-k passages retrieved for each query, next to its
+embedding throughput.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from app.core.embeddings import EmbeddingGenerator
+from app.core.onnx_embeddings import cosine_agreement
+
+from .corpus import generate_passages, generate_queries
+from .micro import embed_corpus
+
+logger = logging.getLogger(__name__)
+
+
+def _top_k(passages: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ passages.T), axis=1, kind="stable")[:, :k]
+
+
+def run(model_name: str, backends: Sequence[str], reference: str = "sentence-transformers",
+        n_passages: int = 2000, n_queries: int = 256, k: int = 10, seed: int = 0) -> Dict[str, Any]:
+    """Every backend against reference on n_passages passages and n_queries queries"""
+    passages = [passage.text for passage in generate_passages(n_passages, seed)]
+    queries = generate_queries(n_queries, seed + 1)
+    k = min(k, n_passages)
+
+    embeddings = {}
+    results: List[Dict[str, Any]] = []
+    for backend in [reference, *[b for b in backends if b != reference]]:
+        # Uncached when EMBEDDING_CACHE_MB=0 (the CLI sets it), so every text is encoded
+        generator = EmbeddingGenerator(model_name, backend=backend)
+        start = time.perf_counter()
+        passage_vectors = embed_corpus(generator, passages)
+        seconds = time.perf_counter() - start
+        query_vectors = generator.embed(queries)
+        embeddings[backend] = (passage_vectors, query_vectors)
+        entry = {
+            "backend": backend,
+            "model": generator.model_name,
+            "texts_per_second": round(n_passages / seconds, 1),
+        }
+        if backend != reference:
+            expected_passages, expected_queries = embeddings[reference]
+            truth, found = _top_k(expected_passages, expected_queries, k), _top_k(passage_vectors, query_vectors, k)
+            entry["passages"] = cosine_agreement(expected_passages, passage_vectors)
+            entry["queries"] = cosine_agreement(expected_queries, query_vectors)
+            entry[f"top_{k}_overlap"] = round(
+                sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / truth.size, 4)
+            logger.info(f"{generator.model_name}: cosine agreement {entry['passages']['mean']:.5f} "
+                        f"(min {entry['passages']['min']:.5f}), top-{k} overlap {entry[f'top_{k}_overlap']:.3f}")
+        results.append(entry)
+    return {"reference": reference, "backends": results}
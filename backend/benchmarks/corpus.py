@@ -0,0 +1,152 @@
+"""
+Synthetic university corpora
+Deterministic for a given seed, so runs on different machines or commits
+embed, index and search exactly the same text
+"""
+
+from dataclasses import dataclass
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEPARTMENTS = [
+    ("CS", "Computer Science"), ("MATH", "Mathematics"), ("BIO", "Biology"), ("HIST", "History"),
+    ("ECON", "Economics"), ("PHYS", "Physics"), ("ENG", "English"), ("CHEM", "Chemistry"),
+    ("PSY", "Psychology"), ("ART", "Art History"), ("EE", "Electrical Engineering"), ("PHIL", "Philosophy"),
+]
+TOPICS = [
+    "machine learning", "algorithms", "databases", "number theory", "statistics", "genetics", "ecology",
+    "medieval Europe", "labor markets", "quantum mechanics", "poetry", "organic synthesis", "cognition",
+    "Renaissance painting", "signal processing", "ethics", "climate science", "public policy",
+    "computer vision", "game theory", "neuroscience", "cryptography", "thermodynamics", "linguistics",
+]
+TERMS = ["fall", "spring", "summer"]
+BUILDINGS = ["Hamilton Hall", "Science Center", "North Library", "Baker Hall", "Engineering Quad", "Founders Hall"]
+NAMES = ["Alvarez", "Chen", "Okafor", "Novak", "Patel", "Schmidt", "Tanaka", "Dubois", "Kowalski", "Haddad"]
+DAYS = ["Mondays and Wednesdays", "Tuesdays and Thursdays", "Fridays", "weekdays"]
+TIMES = ["9:00 am", "10:30 am", "1:00 pm", "3:30 pm", "6:00 pm"]
+PROGRAMS = ["undergraduate", "graduate", "part-time", "international", "exchange"]
+AMENITIES = ["laundry", "a study lounge", "a fitness room", "bike storage", "a shared kitchen", "meal plans"]
+MONTHS = ["January", "February", "March", "April", "October", "November"]
+
+TEMPLATES = [
+    "{code} {topic_title} is offered by the {dept} department in the {term} term. The course covers "
+    "{topic_a} and {topic_b}, meets {days} at {time} in {building} room {room}, and is taught by "
+    "Professor {name} ({email}).",
+    "Tuition for {program} students in {dept} is ${tuition:,} per year. Scholarships covering up to "
+    "{pct}% of tuition are available; apply before {month} {day} through the financial aid office.",
+    "The {dept} advising office in {building} is open {days} from {time}. Students planning to take "
+    "{code} should first complete {prereq}. Email {email} to book an appointment.",
+    "{building} residence hall houses {beds} students in single and double rooms. Housing costs "
+    "${housing:,} per semester and includes {amenity_a} and {amenity_b}.",
+    "Research in {dept} focuses on {topic_a}, {topic_b} and {topic_c}. The lab of Professor {name} "
+    "has {openings} openings for undergraduate research assistants every {term} term.",
+]
+
+QUERY_TEMPLATES = [
+    "What does {code} cover?",
+    "tuition for {program} students in {dept}",
+    "Who teaches {topic_a}?",
+    "housing costs in {building}",
+    "{dept} advising office hours",
+    "research openings in {topic_a}",
+    "{code}",
+    "{email}",
+]
+
+
+@dataclass
+class SyntheticPassage:
+    """One generated passage and the metadata of its document"""
+    doc_key: str
+    text: str
+    metadata: Dict[str, Any]
+
+
+def _fields(rng: random.Random, department: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+    code_dept, dept = department or rng.choice(DEPARTMENTS)
+    name = rng.choice(NAMES)
+    topic_a, topic_b, topic_c = rng.sample(TOPICS, 3)
+    prereq_dept, _ = rng.choice(DEPARTMENTS)
+    return {
+        "code": f"{code_dept} {rng.randint(100, 499)}",
+        "dept": dept,
+        "topic_title": topic_a.title(),
+        "topic_a": topic_a,
+        "topic_b": topic_b,
+        "topic_c": topic_c,
+        "term": rng.choice(TERMS),
+        "days": rng.choice(DAYS),
+        "time": rng.choice(TIMES),
+        "building": rng.choice(BUILDINGS),
+        "room": rng.randint(100, 450),
+        "name": name,
+        "email": f"{name.lower()}.{code_dept.lower()}@university.edu",
+        "program": rng.choice(PROGRAMS),
+        "tuition": rng.randrange(18_000, 62_000, 500),
+        "pct": rng.choice([25, 50, 75, 100]),
+        "month": rng.choice(MONTHS),
+        "day": rng.randint(1, 28),
+        "prereq": f"{prereq_dept} {rng.randint(100, 299)}",
+        "beds": rng.randrange(80, 900, 10),
+        "housing": rng.randrange(3_000, 9_000, 250),
+        "amenity_a": rng.choice(AMENITIES[:3]),
+        "amenity_b": rng.choice(AMENITIES[3:]),
+        "openings": rng.randint(1, 12),
+    }
+
+
+def generate_passages(n_passages: int, seed: int = 0, passages_per_document: int = 4) -> Iterator[SyntheticPassage]:
+    """
+    Yield n_passages passages, grouped passages_per_document to a document
+
+    Every passage of a document shares its department and term, so the
+    documents also exercise metadata filters.
+    """
+    rng = random.Random(seed)
+    department, term = DEPARTMENTS[0], TERMS[0]
+    for i in range(n_passages):
+        doc_number = i // passages_per_document
+        if i % passages_per_document == 0:
+            department, term = rng.choice(DEPARTMENTS), rng.choice(TERMS)
+        fields = _fields(rng, department)
+        fields["term"] = term
+        metadata = {"department": department[1], "term": term}
+        yield SyntheticPassage(f"doc_{doc_number:07d}", rng.choice(TEMPLATES).format(**fields), metadata)
+
+
+def generate_queries(n_queries: int, seed: int = 1) -> List[str]:
+    """Questions in the style of the corpus, including literal course codes and emails"""
+    rng = random.Random(seed)
+    return [rng.choice(QUERY_TEMPLATES).format(**_fields(rng)) for _ in range(n_queries)]
+
+
+def write_documents(directory: Path, n_passages: int, seed: int = 0, passages_per_document: int = 4) -> int:
+    """
+    Write the corpus as VectorStore input: one .txt per document plus a
+    metadata sidecar (.json)
+
+    Returns:
+        Number of documents written
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def flush(key: str, texts: List[str], metadata: Dict[str, Any]):
+        (directory / f"{key}.txt").write_text("\n\n".join(texts), encoding="utf-8")
+        (directory / f"{key}.json").write_text(json.dumps(metadata), encoding="utf-8")
+
+    # Passages of a document are consecutive, so one document is held at a time
+    written = 0
+    current, texts, metadata = None, [], {}
+    for passage in generate_passages(n_passages, seed, passages_per_document):
+        if passage.doc_key != current:
+            if current is not None:
+                flush(current, texts, metadata)
+                written += 1
+            current, texts, metadata = passage.doc_key, [], passage.metadata
+        texts.append(passage.text)
+    if current is not None:
+        flush(current, texts, metadata)
+        written += 1
+    return written
@@ -0,0 +1,196 @@
+"""
+Concurrent load generator for /api/search and /api/chat
+Starts the FastAPI or Flask app on a synthetic corpus in a scratch
+directory, with the hash embedding model and the fake LLM so nothing is
+downloaded or called over the network. Each concurrency level runs as a
+closed loop: every worker sends its next request as soon as the previous
+one is answered, over its own keep-alive connection.
+"""
+
+import contextlib
+import http.client
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .corpus import generate_queries, write_documents
+from .report import latency_summary
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Request bodies per app; the chat endpoints name the question differently
+ENDPOINTS: Dict[str, Dict[str, Tuple[str, Callable[[str], dict]]]] = {
+    "fastapi": {
+        "search": ("/api/search", lambda query: {"query": query, "top_k": 5}),
+        "chat": ("/api/chat", lambda query: {"query": query}),
+    },
+    "flask": {
+        "search": ("/api/search", lambda query: {"query": query, "top_k": 5}),
+        "chat": ("/api/chat", lambda query: {"message": query}),
+    },
+}
+
+# Offline stand-ins and settings that keep runs comparable
+SERVER_ENV = {
+    "EMBEDDING_BACKEND": "hash",
+    "EMBEDDING_CACHE_DIR": "",
+    "LLM_BACKEND": "fake",
+    "RETRIEVER_BACKEND": "local",
+    "ANSWER_CACHE_ENABLED": "False",
+    "INDEX_REFRESH_SECONDS": "0",
+    "WARMUP_ON_START": "True",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_command(app: str, port: int) -> Tuple[List[str], Path, str]:
+    """Command, PYTHONPATH entry and readiness path of an app"""
+    if app == "fastapi":
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning"]
+        return command, BACKEND_DIR, "/health"
+    program = (f"from backend import create_app; "
+               f"create_app().run(host='127.0.0.1', port={port}, threaded=True)")
+    return [sys.executable, "-c", program], BACKEND_DIR.parent, "/api/ready"
+
+
+def _get(base_url: str, path: str, timeout: float = 5.0) -> int:
+    parts = urlsplit(base_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+@contextlib.contextmanager
+def serve(app: str, n_passages: int, seed: int = 0, env: Optional[Dict[str, str]] = None,
+          startup_timeout: float = 600.0) -> Iterator[str]:
+    """Run app on a fresh synthetic corpus; yields its base URL once it is ready"""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{app}-") as workdir:
+        write_documents(Path(workdir) / "data" / "sample_documents", n_passages, seed)
+        port = _free_port()
+        command, pythonpath, ready_path = _server_command(app, port)
+        server_env = {**os.environ, **SERVER_ENV, **(env or {})}
+        server_env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(pythonpath), os.getenv("PYTHONPATH")]))
+        log = open(Path(workdir) / "server.log", "w")
+        process = subprocess.Popen(command, cwd=workdir, env=server_env, stdout=log, stderr=subprocess.STDOUT)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            started = time.monotonic()
+            while True:
+                if process.poll() is not None:
+                    log.flush()
+                    raise RuntimeError(f"{app} server exited with {process.returncode}:\n"
+                                       f"{(Path(workdir) / 'server.log').read_text()[-2000:]}")
+                try:
+                    if _get(base_url, ready_path) == 200:
+                        break
+                except OSError:
+                    pass
+                if time.monotonic() - started > startup_timeout:
+                    raise RuntimeError(f"{app} server not ready after {startup_timeout:.0f}s")
+                time.sleep(0.2)
+            logger.info(f"{app} server ready at {base_url} after {time.monotonic() - started:.1f}s")
+            yield base_url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+def drive(base_url: str, path: str, bodies: Sequence[dict], concurrency: int, n_requests: int,
+          timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    Send n_requests POSTs from concurrency workers (closed loop)
+
+    Bodies are used round robin. Returns throughput, latency percentiles
+    of successful requests and counts per status code.
+    """
+    parts = urlsplit(base_url)
+    sequence = itertools.count()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+        headers = {"Content-Type": "application/json"}
+        try:
+            while True:
+                i = next(sequence)
+                if i >= n_requests:
+                    return
+                body = json.dumps(bodies[i % len(bodies)])
+                start = time.perf_counter()
+                try:
+                    conn.request("POST", path, body, headers)
+                    response = conn.getresponse()
+                    response.read()
+                    status = str(response.status)
+                except (OSError, http.client.HTTPException) as e:
+                    status = type(e).__name__
+                    conn.close()
+                    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == "200":
+                        latencies.append(elapsed)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "seconds": round(wall, 4),
+        "requests_per_second": round(n_requests / wall, 1),
+        "statuses": statuses,
+        "error_rate": round(1 - statuses.get("200", 0) / n_requests, 4) if n_requests else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+
+def run_against(base_url: str, app: str, endpoints: Sequence[str], concurrency_levels: Sequence[int],
+                n_requests: int, n_queries: int = 512, seed: int = 0, warmup: int = 20) -> List[Dict[str, Any]]:
+    """Every endpoint at every concurrency level against a running server"""
+    queries = generate_queries(n_queries, seed + 1)
+    results = []
+    for name in endpoints:
+        path, body = ENDPOINTS[app][name]
+        bodies = [body(query) for query in queries]
+        drive(base_url, path, bodies, 1, warmup)
+        for concurrency in concurrency_levels:
+            result = drive(base_url, path, bodies, concurrency, n_requests)
+            logger.info(f"{path} x{concurrency}: {result['requests_per_second']} req/s, "
+                        f"p50 {result['latency'].get('p50_ms')} ms, p99 {result['latency'].get('p99_ms')} ms")
+            results.append({"endpoint": name, "path": path, **result})
+    return results
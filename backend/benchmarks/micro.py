@@ -0,0 +1,188 @@
+"""
+Microbenchmarks of the retrieval path
+- embed:  EmbeddingGenerator.embed throughput per batch size (cache off)
+- index:  build time, size and recall@k of each index type, and search
+          latency per query batch size, on the raw FAISS index
+- store:  VectorStore end to end - load_documents (chunk, embed, build,
+          snapshot) and search_many latency per batch size and search mode
+"""
+
+import contextlib
+import itertools
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+import faiss
+import numpy as np
+
+from app.core.embeddings import EmbeddingGenerator, shared_generator
+from app.core.index_factory import IndexConfig, build_index, bytes_per_vector, search_parameters
+
+from .corpus import generate_passages, generate_queries, write_documents
+from .report import latency_summary
+
+logger = logging.getLogger(__name__)
+
+
+def _repeat(fn: Callable[[], Any], min_runs: int, min_seconds: float) -> List[float]:
+    """Time fn until it ran at least min_runs times and min_seconds in total"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or time.perf_counter() - started < min_seconds:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _batches(items: Sequence, size: int) -> List[Sequence]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def bench_embed(generator: EmbeddingGenerator, texts: List[str], batch_sizes: Sequence[int],
+                min_seconds: float = 1.0) -> List[Dict[str, Any]]:
+    """Texts per second and per-call latency of embed() at each batch size"""
+    results = []
+    for batch_size in batch_sizes:
+        batches = itertools.cycle(_batches(texts, batch_size))
+        samples = _repeat(lambda: generator.embed(list(next(batches))), 3, min_seconds)
+        results.append({
+            "batch_size": batch_size,
+            "texts_per_second": round(batch_size * len(samples) / sum(samples), 1),
+            "latency": latency_summary(samples),
+        })
+    return results
+
+
+def embed_corpus(generator: EmbeddingGenerator, texts: List[str], batch_size: int = 256) -> np.ndarray:
+    vectors = np.empty((len(texts), generator.embedding_dim), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        vectors[start:start + batch_size] = generator.embed(texts[start:start + batch_size])
+    return vectors
+
+
+def bench_indexes(vectors: np.ndarray, queries: np.ndarray, index_types: Sequence[str],
+                  batch_sizes: Sequence[int], k: int = 10, min_seconds: float = 1.0) -> List[Dict[str, Any]]:
+    """Build each index type over vectors and search it with the query embeddings"""
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        try:
+            index = build_index(vectors, IndexConfig(index_type=index_type))
+        except RuntimeError as e:
+            # e.g. too few vectors to train IVF-PQ
+            results.append({"index_type": index_type, "error": str(e)})
+            continue
+        build_seconds = time.perf_counter() - start
+        params = search_parameters(index)
+        _, found = index.search(queries, k, params=params)
+        recall = sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / truth.size
+
+        searches = []
+        for batch_size in batch_sizes:
+            batches = itertools.cycle(_batches(queries, batch_size))
+            samples = _repeat(lambda: index.search(next(batches), k, params=params), 3, min_seconds)
+            searches.append({
+                "batch_size": batch_size,
+                "queries_per_second": round(batch_size * len(samples) / sum(samples), 1),
+                "latency": latency_summary(samples),
+            })
+        results.append({
+            "index_type": index_type,
+            "index": type(index).__name__,
+            "build_seconds": round(build_seconds, 4),
+            "bytes_per_vector": bytes_per_vector(index),
+            f"recall_at_{k}": round(recall, 4),
+            "search": searches,
+        })
+        logger.info(f"{index_type}: built in {build_seconds:.2f}s, recall@{k} {recall:.3f}")
+    return results
+
+
+@contextlib.contextmanager
+def _working_directory(path: Path) -> Iterator[None]:
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_store(n_passages: int, queries: List[str], batch_sizes: Sequence[int], modes: Sequence[str],
+                seed: int = 0, k: int = 5, min_seconds: float = 1.0) -> Dict[str, Any]:
+    """Index the synthetic corpus with a fresh VectorStore and time its searches"""
+    # Imported here: the store reads its settings from the environment on construction
+    from app.core.vector_store import VectorStore
+
+    with tempfile.TemporaryDirectory(prefix="bench-store-") as workdir, _working_directory(Path(workdir)):
+        documents = write_documents(Path("data/sample_documents"), n_passages, seed)
+        store = VectorStore()
+        start = time.perf_counter()
+        store.load_documents()
+        load_seconds = time.perf_counter() - start
+
+        searches = []
+        for mode in modes:
+            for batch_size in batch_sizes:
+                batches = itertools.cycle(_batches(queries, batch_size))
+                samples = _repeat(lambda: store.search_many(list(next(batches)), top_k=k, mode=mode), 3, min_seconds)
+                searches.append({
+                    "mode": mode,
+                    "batch_size": batch_size,
+                    "queries_per_second": round(batch_size * len(samples) / sum(samples), 1),
+                    "latency": latency_summary(samples),
+                })
+        return {
+            "documents": documents,
+            "passages": len(store.passages),
+            "index": type(store.index).__name__,
+            "load_documents_seconds": round(load_seconds, 4),
+            "recall": store.recall_report,
+            "search": searches,
+        }
+
+
+def run(sizes: Sequence[int], batch_sizes: Sequence[int], index_types: Sequence[str], modes: Sequence[str],
+        store_max: int, n_queries: int = 256, seed: int = 0, min_seconds: float = 1.0) -> Dict[str, Any]:
+    """All microbenchmarks for each corpus size (passages)"""
+    # The one VectorStore uses; uncached unless EMBEDDING_CACHE_MB says otherwise (the CLI turns it off)
+    generator = shared_generator()
+    queries = generate_queries(n_queries, seed + 1)
+    query_vectors = generator.embed(queries)
+    results = {
+        "model": generator.model_name,
+        "dimension": generator.embedding_dim,
+        "embed": bench_embed(generator, [p.text for p in generate_passages(max(batch_sizes) * 8, seed)],
+                             batch_sizes, min_seconds),
+        "sizes": [],
+    }
+    for size in sizes:
+        logger.info(f"Corpus of {size} passages")
+        texts = [passage.text for passage in generate_passages(size, seed)]
+        start = time.perf_counter()
+        vectors = embed_corpus(generator, texts)
+        embed_seconds = time.perf_counter() - start
+        del texts
+        entry = {
+            "size": size,
+            "embed_corpus_seconds": round(embed_seconds, 4),
+            "embed_corpus_texts_per_second": round(size / embed_seconds, 1),
+            "indexes": bench_indexes(vectors, query_vectors, index_types, batch_sizes, min_seconds=min_seconds),
+        }
+        del vectors
+        if size <= store_max:
+            entry["store"] = bench_store(size, queries, batch_sizes, modes, seed, min_seconds=min_seconds)
+        else:
+            entry["store"] = {"skipped": f"larger than --store-max {store_max}"}
+        results["sizes"].append(entry)
+    return results
@@ -0,0 +1,104 @@
+"""
+Benchmark results as JSON
+Every run records its parameters and environment next to the numbers, and
+compare() lines two runs up metric by metric
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict[str, float]:
+    """Percentiles and mean of latency samples, in milliseconds"""
+    samples = np.asarray(list(seconds), dtype=np.float64) * 1000
+    if not len(samples):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(samples.max()), 4),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Where the numbers come from: commit, machine and library versions"""
+    import faiss
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": getattr(faiss, "__version__", None),
+        "embedding_backend": os.getenv('EMBEDDING_BACKEND', 'sentence-transformers'),
+    }
+
+
+def write_results(path: Path, kind: str, parameters: Dict[str, Any], results: Any) -> Dict[str, Any]:
+    document = {
+        "kind": kind,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": parameters,
+        "environment": environment(),
+        "results": results,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2), encoding="utf-8")
+    return document
+
+
+# Fields that tell apart the entries of a result list
+_ID_FIELDS = ("backend", "size", "index_type", "mode", "endpoint", "concurrency", "batch_size")
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves keyed by path; list items are keyed by their identifying fields"""
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = str(i)
+            if isinstance(item, dict):
+                ids = [f"{k}={item[k]}" for k in _ID_FIELDS if k in item]
+                label = ",".join(ids) or label
+            flat.update(_flatten(item, f"{prefix}[{label}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix] = float(value)
+    return flat
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], pattern: str = "") -> List[Tuple[str, float, float, float]]:
+    """
+    (metric, baseline, candidate, relative change) for metrics present in both
+    runs whose path contains pattern
+    """
+    before, after = _flatten(baseline["results"]), _flatten(candidate["results"])
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        if pattern in metric:
+            old, new = before[metric], after[metric]
+            rows.append((metric, old, new, (new - old) / old if old else 0.0))
+    return rows
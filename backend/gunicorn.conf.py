@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for running several API workers on one box
+Usage (from backend/): gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported and the embedding model loaded once in the master
+process before workers are forked, so workers share the model weights
+copy-on-write. The first worker to start builds or updates the index
+snapshot under a file lock; the others memory-map the same generation.
+Sharing the index pages needs the faiss-cpu release pinned in
+requirements.txt: older ones cannot mmap an index, so each worker reads
+its own copy (startup logs a warning when that happens).
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8001)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv('WORKER_TIMEOUT', 120))
+
+
+def on_starting(server):
+    # Load the model before forking; inference only ever runs in the workers
+    from app.core.embeddings import shared_generator
+    shared_generator()
@@ -0,0 +1,63 @@
+"""Request latency metrics for the Flask app: /metrics and the optional Server-Timing header."""
+import contextvars
+import os
+from flask import Response, g, request
+from backend.app.core import metrics
+
+def in_request_context(iterable):
+    """
+    Iterate a streamed response body in the context of the current request.
+    
+    The body is produced after the request hooks have run, so without this
+    its stages would not be labelled with the request's endpoint.
+    """
+    # Copied now, while the request's timings are active
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+    
+    def body():
+        try:
+            while True:
+                try:
+                    item = context.run(next, iterator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                context.run(close)
+    
+    return body()
+
+def init_app(app):
+    """Time every request and serve the histograms at /metrics."""
+    # Per-request stage breakdown in a Server-Timing response header
+    server_timing = os.getenv('SERVER_TIMING', 'False') == 'True'
+
+    @app.before_request
+    def start_timings():
+        # The URL rule, not the path, so /api/chat/<session_id> is one label
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'other'
+        g.request_timings = metrics.RequestTimings(endpoint)
+
+    @app.after_request
+    def finish_timings(response):
+        timings = g.pop('request_timings', None)
+        if timings is not None:
+            total = timings.finish(request.method, response.status_code)
+            if server_timing:
+                response.headers['Server-Timing'] = timings.server_timing(total)
+        return response
+
+    @app.teardown_request
+    def abandon_timings(exc):
+        # Only still set when the request failed before a response was made
+        timings = g.pop('request_timings', None)
+        if timings is not None:
+            timings.finish(request.method, 500)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Latency histograms in the Prometheus text format (per worker process)."""
+        return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
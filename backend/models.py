@@ -0,0 +1,12 @@
+"""Database models."""
+from backend import db
+
+class ConversationTurn(db.Model):
+    """One message of a chat session (SESSION_STORE=sqlalchemy)."""
+    __tablename__ = 'conversation_turns'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), nullable=False, index=True)
+    role = db.Column(db.String(16), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.Float, nullable=False, index=True)
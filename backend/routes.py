@@ -1,20 +1,34 @@
 """API routes for University AI Assistant."""
-from flask import Blueprint, request, jsonify
-from backend.services.rag_service import RAGService
-from backend.services.chat_service import ChatService
-from backend.services.search_service import SemanticSearchService
+import uuid
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from backend.app.core.streaming import sse_event
+from backend.instrumentation import in_request_context
+from backend.services.container import ServiceContainer
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-rag_service = RAGService()
-chat_service = ChatService()
-search_service = SemanticSearchService()
+# Services are built on first use (or by the warm-up started in create_app)
+services = ServiceContainer()
+
+# Same bound as the FastAPI search endpoint
+MAX_TOP_K = 50
 
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
+    """Liveness check: the process is up, whether or not it has warmed up."""
     return jsonify({'status': 'healthy'}), 200
 
+@api_bp.route('/ready', methods=['GET'])
+def ready_check():
+    """
+    Readiness check: 200 once services are built and warmed up, 503 until then.
+
+    Starts the warm-up if nothing has (WARMUP_ON_START=False) or the last one failed.
+    """
+    services.start_warm_up()
+    status = services.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @api_bp.route('/search', methods=['POST'])
 def search():
     """Semantic search endpoint."""
@@ -24,20 +38,74 @@ def search():
     if not query:
         return jsonify({'error': 'Query is required'}), 400
     
-    results = search_service.search(query)
+    top_k = data.get('top_k')
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K):
+        return jsonify({'error': f'top_k must be an integer from 1 to {MAX_TOP_K}'}), 400
+    
+    filters = data.get('filters')
+    if filters is not None and not isinstance(filters, dict):
+        return jsonify({'error': 'Filters must be an object of field: value'}), 400
+    
+    results = services.search_service.search(query, top_k=top_k, filters=filters)
     return jsonify({'results': results}), 200
 
+def _session_id(data):
+    """Client's session_id, or a new one to continue the conversation with."""
+    session_id = data.get('session_id')
+    if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= 64):
+        return None
+    return session_id or uuid.uuid4().hex
+
 @api_bp.route('/chat', methods=['POST'])
 def chat():
-    """Chat endpoint with RAG."""
+    """Chat endpoint with RAG; pass the returned session_id back to continue the conversation."""
     data = request.get_json()
     message = data.get('message')
     
     if not message:
         return jsonify({'error': 'Message is required'}), 400
+    session_id = _session_id(data)
+    if session_id is None:
+        return jsonify({'error': 'session_id must be a string of at most 64 characters'}), 400
+    
+    response = services.chat_service.process_message(message, session_id)
+    return jsonify({'response': response, 'session_id': session_id}), 200
+
+@api_bp.route('/chat/<session_id>', methods=['DELETE'])
+def reset_chat(session_id):
+    """Forget a conversation."""
+    services.chat_service.reset_conversation(session_id)
+    return '', 204
+
+@api_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming chat endpoint (Server-Sent Events): sources, then answer tokens; session in X-Session-ID."""
+    data = request.get_json()
+    message = data.get('message')
+    
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+    session_id = _session_id(data)
+    if session_id is None:
+        return jsonify({'error': 'session_id must be a string of at most 64 characters'}), 400
+    
+    def events():
+        # When the client disconnects the server closes this generator, which
+        # closes stream_message and with it the model stream
+        stream = services.chat_service.stream_message(message, session_id)
+        try:
+            for event, payload in stream:
+                yield sse_event(event, payload)
+        except Exception:
+            yield sse_event('error', {'detail': 'Failed to generate response'})
+        finally:
+            stream.close()
     
-    response = chat_service.process_message(message)
-    return jsonify({'response': response}), 200
+    return Response(
+        stream_with_context(in_request_context(events())),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Session-ID': session_id}
+    )
 
 @api_bp.route('/index', methods=['POST'])
 def index_documents():
@@ -48,5 +116,11 @@ def index_documents():
     if not documents:
         return jsonify({'error': 'Documents are required'}), 400
     
-    rag_service.index_documents(documents)
-    return jsonify({'message': 'Documents indexed successfully'}), 200
+    report = services.rag_service.index_documents(documents)
+    services.chat_service.invalidate_documents(doc.get('id') for doc in documents)
+    # Bad metadata is the caller's error; failures reaching the embedding API or vector DB are upstream
+    if report.get('invalid_documents'):
+        return jsonify({'message': 'Some documents have invalid metadata', 'report': report}), 400
+    if report.get('failed_documents'):
+        return jsonify({'message': 'Some documents failed to index', 'report': report}), 502
+    return jsonify({'message': 'Documents indexed successfully', 'report': report}), 200
@@ -0,0 +1,115 @@
+"""
+Import-time profile of the Flask app's cold start
+Usage (from the repo root): python backend/scripts/profile_startup.py [--repeat 3] [--top 15] [--warm-up]
+
+Starts the app in fresh interpreters under `python -X importtime`:
+- lazy:  create_app() as it runs now (SDKs and services load on first use)
+- eager: the same, plus importing the SDKs the services used to import at
+         module load (openai, pinecone, langchain, faiss, sentence_transformers)
+
+and prints the median time until create_app() returns for each, the
+difference, and the slowest packages and app modules of the lazy start. With
+--warm-up it also times ServiceContainer.warm_up(), i.e. until /api/ready
+would report ready. SDKs that are not installed are skipped and listed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+EAGER_MODULES = ["openai", "pinecone", "langchain.text_splitter", "faiss", "sentence_transformers"]
+
+_PROGRAM = """
+import importlib, json, time
+started = time.perf_counter()
+missing = []
+for name in {eager!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        missing.append(name)
+from backend import create_app
+app = create_app()
+result = {{"startup": time.perf_counter() - started, "missing": missing}}
+if {warm_up!r}:
+    from backend.routes import services
+    started = time.perf_counter()
+    result["ready"] = services.warm_up()
+    result["warm_up"] = time.perf_counter() - started
+print(json.dumps(result))
+"""
+
+
+def run_once(eager: bool, warm_up: bool) -> Tuple[dict, List[Tuple[int, str]]]:
+    """
+    One cold start; returns the program's timings and (cumulative us, name)
+    per third-party package (its outermost import) and per app module
+    """
+    program = _PROGRAM.format(eager=EAGER_MODULES if eager else [], warm_up=warm_up)
+    env = {**os.environ, "WARMUP_ON_START": "False"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", program],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Startup failed:\n{proc.stderr[-2000:]}")
+    imports: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        group = name if name.startswith("backend.") else name.split(".")[0]
+        imports[group] = max(imports.get(group, 0), int(cumulative))
+    imports.pop("backend", None)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), [(us, name) for name, us in imports.items()]
+
+
+def profile(eager: bool, repeat: int, warm_up: bool) -> Dict[str, object]:
+    runs = [run_once(eager, warm_up) for _ in range(repeat)]
+    timings = [timing for timing, _ in runs]
+    report = {
+        "startup_seconds": statistics.median(t["startup"] for t in timings),
+        "missing": timings[0]["missing"],
+        "imports": runs[-1][1],
+    }
+    if warm_up:
+        report["warm_up_seconds"] = statistics.median(t["warm_up"] for t in timings)
+        report["ready"] = all(t["ready"] for t in timings)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per mode (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--warm-up", action="store_true", help="Also time building and warming the services")
+    args = parser.parse_args()
+
+    lazy = profile(False, args.repeat, args.warm_up)
+    eager = profile(True, args.repeat, False)
+
+    print(f"Cold start, lazy:  {lazy['startup_seconds'] * 1000:8.1f} ms")
+    print(f"Cold start, eager: {eager['startup_seconds'] * 1000:8.1f} ms")
+    print(f"Saved:             {(eager['startup_seconds'] - lazy['startup_seconds']) * 1000:8.1f} ms")
+    if eager["missing"]:
+        print(f"(not installed, so not part of the eager time: {', '.join(eager['missing'])})")
+    if args.warm_up:
+        state = "ready" if lazy["ready"] else "NOT ready (see log)"
+        print(f"Warm-up:           {lazy['warm_up_seconds'] * 1000:8.1f} ms, {state}")
+
+    phase = "lazy start + warm-up" if args.warm_up else "lazy start"
+    print(f"\nSlowest imports ({phase}, including what they import):")
+    for cumulative, name in sorted(lazy["imports"], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Move documents between local shards after the shard count changes
+Usage (from backend/): python scripts/rebalance_shards.py --shards 6 [--key department] [--dry-run]
+
+Opens every shard under data/shards/ (and the new ones), finds the
+documents that the router for the new count places elsewhere - about 1/N
+of them when adding a shard, thanks to rendezvous hashing - and moves them
+in batches: written to their new shard first, then deleted from the old
+one, so every document stays searchable throughout. Shards beyond the new
+count are drained and removed. With --from-unsharded, the documents of
+the single store at --index-path are copied into the shards (the store
+itself is left as it is).
+
+Writes go through each shard's snapshot lock, so running workers pick them
+up; restart them with SHARDS set to the new count afterwards so new writes
+are routed the same way. Moved documents are re-embedded on their new
+shard (cheap with EMBEDDING_CACHE_DIR). Shard nodes on other machines have
+to be rebalanced where their data lives.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.sharding import ShardRouter, shard_index_path, shard_names  # noqa: E402
+from app.core.vector_store import VectorStore  # noqa: E402
+
+logger = logging.getLogger("rebalance_shards")
+
+Move = Tuple[str, str, dict]
+
+# Source name of the single store read by --from-unsharded
+UNSHARDED = "unsharded"
+
+
+def existing_shards(index_path: str) -> List[str]:
+    """Names of the shards that have a directory next to index_path"""
+    root = Path(shard_index_path(index_path, "shard-00")).parents[1]
+    return sorted(path.name for path in root.glob("shard-[0-9]*") if path.is_dir())
+
+
+def plan(stores: Dict[str, VectorStore], router: ShardRouter) -> Dict[Tuple[str, str], List[Move]]:
+    """(source, target) -> documents to move, for every misplaced document"""
+    moves: Dict[Tuple[str, str], List[Move]] = defaultdict(list)
+    for source, store in stores.items():
+        for key, text, metadata in store.documents():
+            target = router.shard_for(key, metadata)
+            if target != source:
+                moves[source, target].append((key, text, metadata))
+    return moves
+
+
+def rebalance(index_path: str, count: int, field: str = None, batch_size: int = 500, dry_run: bool = False,
+              from_unsharded: bool = False) -> dict:
+    old = existing_shards(index_path)
+    router = ShardRouter(shard_names(count), field)
+    stores = {}
+    for name in sorted(set(old) | set(router.shards)):
+        if dry_run and name not in old:
+            continue
+        stores[name] = VectorStore(shard_index_path(index_path, name))
+        stores[name].open()
+    if from_unsharded:
+        stores[UNSHARDED] = VectorStore(index_path)
+        if not stores[UNSHARDED].open():
+            raise SystemExit(f"No snapshot at {index_path}")
+    before = {name: store.document_count for name, store in stores.items()}
+
+    moves = plan(stores, router)
+    for (source, target), documents in sorted(moves.items()):
+        logger.info(f"{source} -> {target}: {len(documents)} documents")
+        if dry_run:
+            continue
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            stores[target].upsert(
+                {key: text for key, text, _ in batch},
+                {key: metadata for key, _, metadata in batch if metadata}
+            )
+            if source != UNSHARDED:
+                stores[source].delete([key for key, _, _ in batch])
+
+    if not dry_run:
+        for name in old:
+            if name not in router.shards and stores[name].document_count == 0:
+                shutil.rmtree(Path(shard_index_path(index_path, name)).parent)
+                logger.info(f"Removed drained shard {name}")
+    return {
+        "moved": sum(len(documents) for documents in moves.values()),
+        "before": before,
+        "after": {name: store.document_count for name, store in stores.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="new shard count")
+    parser.add_argument("--key", default=os.getenv('SHARD_KEY', 'hash'),
+                        help="hash, or the metadata field documents are placed by")
+    parser.add_argument("--index-path", default="data/vector_index.faiss")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    parser.add_argument("--from-unsharded", action="store_true",
+                        help="also copy the documents of the single store at --index-path into the shards")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    report = rebalance(args.index_path, args.shards, None if args.key == "hash" else args.key,
+                       args.batch_size, args.dry_run, args.from_unsharded)
+    print(f"{'Would move' if args.dry_run else 'Moved'} {report['moved']} documents")
+    for name, count in report["before"].items():
+        print(f"  {name}: {count:>8} -> {report['after'][name]:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,22 @@
 """Services module for University AI Assistant."""
-from backend.services.rag_service import RAGService
-from backend.services.chat_service import ChatService
-from backend.services.search_service import SemanticSearchService
+import importlib
 
-__all__ = ['RAGService', 'ChatService', 'SemanticSearchService']
+# Resolved on first access, so importing one service does not import them all
+_EXPORTS = {
+    'RAGService': 'backend.services.rag_service',
+    'ChatService': 'backend.services.chat_service',
+    'SemanticSearchService': 'backend.services.search_service',
+    'IngestionPipeline': 'backend.services.ingestion',
+    'Retriever': 'backend.services.retrievers',
+    'PineconeRetriever': 'backend.services.retrievers',
+    'LocalRetriever': 'backend.services.retrievers',
+    'ServiceContainer': 'backend.services.container',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
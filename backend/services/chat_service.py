@@ -1,22 +1,41 @@
 """Chat Service for conversational AI."""
 import os
-from typing import List, Dict, Any
-import openai
+import re
+import time
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from backend.app.core.answer_cache import AnswerCache
+from backend.app.core.context_selection import ContextChunk, ContextSelector
+from backend.app.core.conversation import ContextPacker, Turn
+from backend.app.core.metrics import record_stage, timed
+from backend.app.core.streaming import FakeStreamingLLM
+from backend.services.clients import openai_sdk
 from backend.services.rag_service import RAGService
+from backend.services.sessions import session_store_from_env
+
+# Chunk IDs are "<doc_id>_chunk_<n>" (Pinecone) or consecutive passage IDs (local index)
+_CHUNK_POSITION = re.compile(r'(?:_chunk_)?(\d+)$')
 
 class ChatService:
     """Chat service with RAG integration."""
     
-    def __init__(self):
-        """Initialize chat service."""
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.rag_service = RAGService()
+    def __init__(self, rag_service: Optional[RAGService] = None):
+        """Initialize chat service (sharing rag_service if one is given)."""
+        self.rag_service = rag_service or RAGService()
         self.model = 'gpt-3.5-turbo'
-        self.conversation_history = []
+        # Conversation memory per session_id; history and passages share one prompt budget
+        self.sessions = session_store_from_env()
+        self.packer = ContextPacker.from_env()
+        # Over-fetched chunks are deduplicated and MMR-selected before packing
+        self.top_k = int(os.getenv('CHAT_TOP_K', 5))
+        self.fetch_factor = int(os.getenv('CONTEXT_FETCH_FACTOR', 3))
+        self.selector = ContextSelector.from_env()
+        # Keyed on query embeddings of the retrieval backend
+        self.answer_cache = AnswerCache.from_env(self.rag_service.dimension)
+        # LLM_BACKEND=fake answers from a local stand-in (tests, no API key needed)
+        self.fake_llm = FakeStreamingLLM.from_env() if os.getenv('LLM_BACKEND', 'openai') == 'fake' else None
     
-    def _build_context(self, query: str) -> str:
-        """Build context from RAG retrieval."""
-        results = self.rag_service.retrieve(query, top_k=5)
+    def _build_context(self, results: List[Dict[str, Any]]) -> str:
+        """Build context from RAG retrieval results."""
         context = "\n".join([
             f"- {result.get('metadata', {}).get('text', '')}"
             for result in results
@@ -32,26 +51,171 @@ Use the following context to answer questions:
 
 Provide accurate, concise, and helpful responses."""
     
-    def process_message(self, message: str) -> str:
-        """Process user message and return response."""
-        context = self._build_context(message)
-        system_prompt = self._build_system_prompt(context)
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message}
-        ]
-        
-        response = openai.ChatCompletion.create(
+    def _completion(self, messages: List[Dict[str, str]], stream: bool = False):
+        """Call the chat model (or the fake one)."""
+        create = self.fake_llm.create if self.fake_llm is not None else openai_sdk().ChatCompletion.create
+        return create(
             model=self.model,
             messages=messages,
             temperature=0.7,
-            max_tokens=500
+            max_tokens=500,
+            stream=stream
         )
+    
+    def _sources(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Cited chunks in the shape returned to clients."""
+        return [
+            {
+                'id': result.get('id'),
+                'score': result.get('score'),
+                'text': result.get('metadata', {}).get('text', ''),
+                'doc_id': result.get('metadata', {}).get('doc_id', '')
+            }
+            for result in results
+        ]
+    
+    def _cache_answer(self, embedding: List[float], answer: str, results: List[Dict[str, Any]]) -> None:
+        if self.answer_cache is not None and results:
+            sources = {str(result.get('metadata', {}).get('doc_id')) for result in results}
+            self.answer_cache.put(embedding, {'response': answer, 'sources': self._sources(results)}, sources)
+    
+    def _history(self, session_id: Optional[str]) -> List[Turn]:
+        return self.sessions.history(session_id) if session_id else []
+    
+    def _cached(self, embedding: List[float], history: List[Turn]):
+        """Cached answer, only for opening questions (a follow-up depends on the conversation)."""
+        if self.answer_cache is None or history:
+            return None
+        return self.answer_cache.get(embedding)
+    
+    def _remember(self, session_id: Optional[str], message: str, answer: str) -> None:
+        if session_id:
+            self.sessions.append(session_id, Turn('user', message), Turn('assistant', answer))
+    
+    def _retrieve(self, message: str, embedding: List[float]) -> List[Dict[str, Any]]:
+        """
+        Retrieve fetch_factor times top_k chunks and keep a diverse top_k.
+        
+        Near-duplicate chunks are dropped and neighbors from one document are
+        merged into a single result (first chunk's id, best score).
+        """
+        with timed('retrieve'):
+            results = self.rag_service.retrieve(message, top_k=self.top_k * self.fetch_factor, query_embedding=embedding)
+        chunks = []
+        for result in results:
+            metadata = result.get('metadata', {})
+            position = _CHUNK_POSITION.search(str(result.get('id', '')))
+            chunks.append(ContextChunk(
+                metadata.get('text', ''), result.get('score') or 0.0, str(metadata.get('doc_id', '')),
+                int(position.group(1)) if position else None
+            ))
+        with timed('select', len(chunks)):
+            picked = self.selector.select(chunks, self.top_k)
+        selected = []
+        for chunk in picked:
+            result = dict(results[chunk.members[0]])
+            result['score'] = chunk.score
+            result['metadata'] = {**result.get('metadata', {}), 'text': chunk.text}
+            selected.append(result)
+        return selected
+    
+    def _build_messages(self, message: str, history: List[Turn],
+                        results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+        """
+        Fit history and retrieved chunks into the token budget.
+        
+        Returns the chat messages and the chunks that made it into the prompt.
+        """
+        with timed('pack'):
+            packed = self.packer.pack(message, history, [result.get('metadata', {}).get('text', '') for result in results])
+        results = [results[i] for i in packed.passages]
+        system_prompt = self._build_system_prompt(self._build_context(results))
+        if packed.summary:
+            system_prompt += f"\n\n{packed.summary}"
+        messages = [{"role": "system", "content": system_prompt}]
+        messages += [{"role": turn.role, "content": turn.content} for turn in packed.history]
+        messages.append({"role": "user", "content": message})
+        return messages, results
+    
+    def process_message(self, message: str, session_id: Optional[str] = None) -> str:
+        """
+        Process user message and return response.
+        
+        With a session_id, earlier turns of that session are part of the
+        prompt (within the token budget) and this turn is remembered. An
+        opening question reuses the answer to a near-identical one.
+        """
+        history = self._history(session_id)
+        embedding = self.rag_service.embed_query(message)
+        cached = self._cached(embedding, history)
+        if cached is not None:
+            self._remember(session_id, message, cached.answer['response'])
+            return cached.answer['response']
+        
+        results = self._retrieve(message, embedding)
+        messages, results = self._build_messages(message, history, results)
+        
+        with timed('generate'):
+            response = self._completion(messages)
         
         assistant_message = response['choices'][0]['message']['content']
+        if not history:
+            self._cache_answer(embedding, assistant_message, results)
+        self._remember(session_id, message, assistant_message)
         return assistant_message
     
-    def reset_conversation(self) -> None:
-        """Reset conversation history."""
-        self.conversation_history = []
+    def stream_message(self, message: str, session_id: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Process user message as a stream of (event, data) pairs.
+        
+        Yields ('sources', [...]) first, then ('token', {'text': ...}) as the
+        model produces them and finally ('done', {'cached': bool}). Closing the
+        generator (e.g. when the client disconnects) closes the model stream,
+        so no further tokens are generated; only completed answers are added
+        to the session.
+        """
+        history = self._history(session_id)
+        embedding = self.rag_service.embed_query(message)
+        cached = self._cached(embedding, history)
+        if cached is not None:
+            yield 'sources', cached.answer['sources']
+            yield 'token', {'text': cached.answer['response']}
+            self._remember(session_id, message, cached.answer['response'])
+            yield 'done', {'cached': True}
+            return
+        
+        results = self._retrieve(message, embedding)
+        messages, results = self._build_messages(message, history, results)
+        yield 'sources', self._sources(results)
+        
+        # Generated after the response headers, so recorded in the histogram only
+        started = time.perf_counter()
+        chunks = self._completion(messages, stream=True)
+        parts = []
+        try:
+            for chunk in chunks:
+                text = chunk['choices'][0].get('delta', {}).get('content')
+                if text:
+                    parts.append(text)
+                    yield 'token', {'text': text}
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            record_stage('generate', time.perf_counter() - started)
+        
+        answer = "".join(parts)
+        if not history:
+            self._cache_answer(embedding, answer, results)
+        self._remember(session_id, message, answer)
+        yield 'done', {'cached': False}
+    
+    def invalidate_documents(self, doc_ids: Iterable[Any]) -> int:
+        """Drop cached answers that cite any of these documents."""
+        if self.answer_cache is None:
+            return 0
+        return self.answer_cache.invalidate(str(doc_id) for doc_id in doc_ids)
+    
+    def reset_conversation(self, session_id: str) -> None:
+        """Forget a session's conversation history."""
+        self.sessions.clear(session_id)
@@ -0,0 +1,42 @@
+"""Process-wide API clients, imported and configured on first use."""
+import os
+import threading
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def openai_sdk():
+    """
+    The openai module with its API key set and a pooled HTTP session.
+
+    The SDK is imported on first use, so workers that never call OpenAI
+    (e.g. RETRIEVER_BACKEND=local with LLM_BACKEND=fake) never load it.
+    Every request reuses the same keep-alive connections instead of
+    opening a new TLS connection each time.
+    """
+    with _lock:
+        if 'openai' not in _clients:
+            import openai
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            pool_size = int(os.getenv('HTTP_POOL_SIZE', 10))
+            session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+            openai.api_key = os.getenv('OPENAI_API_KEY')
+            openai.requestssession = session
+            _clients['openai'] = openai
+        return _clients['openai']
+
+
+def pinecone_index(name: str):
+    """Index handle from one shared Pinecone client."""
+    with _lock:
+        if 'pinecone' not in _clients:
+            from pinecone import Pinecone
+            _clients['pinecone'] = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
+        key = f'pinecone_index:{name}'
+        if key not in _clients:
+            _clients[key] = _clients['pinecone'].Index(name)
+        return _clients[key]
@@ -0,0 +1,117 @@
+"""Service container: one lazily built instance of each service per process."""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Builds each service on first use and shares it afterwards.
+
+    ChatService and SemanticSearchService get the container's RAGService
+    instead of building their own, so a worker holds one retriever and one
+    set of API clients. Service modules are imported inside the factories,
+    so importing the routes does not pull in the SDKs or the model.
+
+    warm_up() builds everything ahead of the first request; `ready` tells
+    a readiness probe when it has finished. start_warm_up() runs it on a
+    background thread, at startup or on the first readiness probe.
+    """
+
+    def __init__(self):
+        # Re-entrant: building chat_service asks for rag_service
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        # Separate from _lock, which is held while services are built
+        self._warm_up_lock = threading.Lock()
+        self._warming = False
+        self.ready = False
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    started = time.monotonic()
+                    instance = factory()
+                    self._instances[name] = instance
+                    logger.info(f"Built {name} in {time.monotonic() - started:.2f}s")
+        return instance
+
+    @property
+    def rag_service(self):
+        from backend.services.rag_service import RAGService
+        return self._get('rag_service', RAGService)
+
+    @property
+    def chat_service(self):
+        from backend.services.chat_service import ChatService
+        return self._get('chat_service', lambda: ChatService(rag_service=self.rag_service))
+
+    @property
+    def search_service(self):
+        from backend.services.search_service import SemanticSearchService
+        return self._get('search_service', lambda: SemanticSearchService(rag_service=self.rag_service))
+
+    def warm_up(self) -> bool:
+        """
+        Build all services and embed one query, so the embedding model is
+        loaded (or the API connection opened) before real traffic arrives.
+
+        Returns:
+            True once the container is ready; errors are logged and kept in
+            warmup_error, leaving the container not ready.
+        """
+        started = time.monotonic()
+        try:
+            self.search_service
+            self.chat_service
+            self.rag_service.embed_query('warm-up')
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}", exc_info=True)
+            self.warmup_error = str(e)
+            return False
+        self.warmup_seconds = time.monotonic() - started
+        self.warmup_error = None
+        self.ready = True
+        logger.info(f"Services warmed up in {self.warmup_seconds:.2f}s")
+        return True
+
+    def start_warm_up(self) -> bool:
+        """
+        Run warm_up() on a background thread unless ready or already warming.
+
+        A failed warm-up can be started again, e.g. by the next readiness probe.
+
+        Returns:
+            True if a warm-up was started
+        """
+        with self._warm_up_lock:
+            if self.ready or self._warming:
+                return False
+            self._warming = True
+        threading.Thread(target=self._warm_up_in_background, name='warm-up', daemon=True).start()
+        return True
+
+    def _warm_up_in_background(self) -> None:
+        try:
+            self.warm_up()
+        finally:
+            with self._warm_up_lock:
+                self._warming = False
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for /api/ready."""
+        return {
+            'ready': self.ready,
+            'warming': self._warming,
+            'services': sorted(self._instances),
+            'warmup_seconds': self.warmup_seconds,
+            'error': self.warmup_error
+        }
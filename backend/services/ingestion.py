@@ -0,0 +1,311 @@
+"""Streaming ingestion pipeline: split, batch-embed, upsert with retries and checkpoints."""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from backend.app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# (vector id, embedding, metadata) as accepted by index.upsert
+Vector = Tuple[str, List[float], Dict[str, Any]]
+
+
+def document_hash(doc: Dict[str, Any]) -> str:
+    """Hash of a document's content and metadata, so edited documents are re-ingested."""
+    payload = json.dumps([doc.get('content', ''), doc.get('metadata', {})], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IngestionCheckpoint:
+    """
+    Append-only record of fully ingested documents.
+
+    One line per document ("<id>\\t<content hash>\\t<chunk count>"), written
+    once all of its chunks are upserted. A rerun skips documents already
+    recorded with the same hash, so an interrupted job resumes where it
+    stopped. The last chunk count recorded for an ID tells the pipeline
+    which chunks an edited document left behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._done = set()
+        self._chunks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) < 2:
+                        continue
+                    self._done.add(self._entry(fields[0], fields[1]))
+                    # Lines written before chunk counts were recorded have two fields
+                    if len(fields) > 2:
+                        self._chunks[fields[0]] = int(fields[2])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    @staticmethod
+    def _entry(doc_id: Any, content_hash: str) -> str:
+        return f"{doc_id}\t{content_hash}"
+
+    def is_done(self, doc_id: Any, content_hash: str) -> bool:
+        return self._entry(doc_id, content_hash) in self._done
+
+    def chunk_count(self, doc_id: Any) -> Optional[int]:
+        """Chunks of the last recorded version of a document, or None if unknown."""
+        return self._chunks.get(str(doc_id))
+
+    def mark_done(self, doc_id: Any, content_hash: str, chunks: int = 0) -> None:
+        entry = self._entry(doc_id, content_hash)
+        with self._lock:
+            if entry in self._done:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{entry}\t{chunks}\n")
+            self._done.add(entry)
+            self._chunks[str(doc_id)] = chunks
+
+
+@dataclass
+class IngestionReport:
+    """Counts for one pipeline run."""
+    documents: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    vectors_upserted: int = 0
+    vectors_deleted: int = 0
+    embedding_requests: int = 0
+    upsert_requests: int = 0
+    retries: int = 0
+    failed_documents: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _Chunk:
+    doc_id: Any
+    content_hash: str
+    vector_id: str
+    text: str
+    metadata: Dict[str, Any]
+
+
+class IngestionPipeline:
+    """
+    split -> batched embedding -> bounded-concurrency workers -> chunked upserts
+
+    Documents are consumed lazily and at most `concurrency * 2` embedding
+    batches are in flight, so memory stays bounded however large the crawl.
+    Every embedding call and upsert is retried with exponential backoff;
+    a batch that still fails marks its documents as failed without stopping
+    the run, and they are retried on the next run because they are not
+    checkpointed.
+
+    Chunk IDs are "<doc id>_chunk_<n>", so a new version of a document
+    overwrites its old chunks. When it has fewer chunks than the version in
+    the checkpoint, the leftover IDs are deleted before it is checkpointed;
+    without a checkpoint those are not known and stay in the index.
+
+    `embed` and `index` are plain callables/objects, so the pipeline runs
+    the same against OpenAI/Pinecone or local stand-ins
+    (see backend.services.local_backends).
+    """
+
+    def __init__(
+        self,
+        splitter,
+        embed: Callable[[List[str]], List[List[float]]],
+        index,
+        embed_batch_size: int = 64,
+        upsert_batch_size: int = 100,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        checkpoint: Optional[IngestionCheckpoint] = None
+    ):
+        """
+        Args:
+            splitter: Object with split_text(text) -> List[str]
+            embed: Embeds a list of texts in one request
+            index: Vector DB with upsert(vectors=[(id, values, metadata), ...])
+                and delete(ids=[...])
+            embed_batch_size: Chunks per embedding request
+            upsert_batch_size: Vectors per upsert request
+            concurrency: Batches embedded and upserted in parallel
+            max_retries: Retries per request before the batch fails
+            backoff_base: First retry delay in seconds, doubled per attempt
+            backoff_max: Upper bound on the retry delay
+            checkpoint: Progress record for resuming; None disables resume
+        """
+        self.splitter = splitter
+        self.embed = embed
+        self.index = index
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.checkpoint = checkpoint
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, splitter, embed, index, checkpoint_path: Optional[str] = None) -> 'IngestionPipeline':
+        """Build a pipeline configured by INGEST_* environment variables ('' checkpoint path disables resume)."""
+        if checkpoint_path is None:
+            checkpoint_path = os.getenv('INGEST_CHECKPOINT_PATH', 'data/ingest_checkpoint.tsv')
+        return cls(
+            splitter,
+            embed,
+            index,
+            embed_batch_size=int(os.getenv('INGEST_EMBED_BATCH_SIZE', 64)),
+            upsert_batch_size=int(os.getenv('INGEST_UPSERT_BATCH_SIZE', 100)),
+            concurrency=int(os.getenv('INGEST_CONCURRENCY', 4)),
+            max_retries=int(os.getenv('INGEST_MAX_RETRIES', 5)),
+            backoff_base=float(os.getenv('INGEST_BACKOFF_SECONDS', 0.5)),
+            checkpoint=IngestionCheckpoint(checkpoint_path) if checkpoint_path else None
+        )
+
+    def run(self, documents: Iterable[Dict[str, Any]]) -> IngestionReport:
+        """Ingest documents ({'id', 'content', optional 'metadata'}) and report what happened."""
+        started = time.monotonic()
+        report = IngestionReport()
+        remaining: Dict[Tuple[Any, str], int] = {}
+        counts: Dict[Tuple[Any, str], int] = {}
+        failed = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ingest') as pool:
+            in_flight = set()
+            for batch in self._batches(documents, report, remaining, counts, failed):
+                # Backpressure: stop reading documents while enough batches are queued
+                if len(in_flight) >= self.concurrency * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(pool.submit(self._process, batch, report, remaining, counts, failed))
+            # _process records batch failures itself; anything raised here is a bug, not a failed batch
+            for future in wait(in_flight).done:
+                future.result()
+
+        report.failed_documents = sorted(str(doc_id) for doc_id in failed)
+        report.seconds = time.monotonic() - started
+        logger.info(f"Ingested {report.documents - len(failed)} documents ({report.vectors_upserted} vectors), "
+                    f"skipped {report.skipped}, failed {len(failed)} in {report.seconds:.1f}s")
+        return report
+
+    def _batches(self, documents: Iterable[Dict[str, Any]], report: IngestionReport,
+                 remaining: Dict[Tuple[Any, str], int], counts: Dict[Tuple[Any, str], int],
+                 failed: set) -> Iterator[List[_Chunk]]:
+        """Split documents into chunks and group them into embedding batches."""
+        batch: List[_Chunk] = []
+        for doc in documents:
+            doc_id = doc.get('id')
+            content_hash = document_hash(doc)
+            if self.checkpoint is not None and self.checkpoint.is_done(doc_id, content_hash):
+                report.skipped += 1
+                continue
+            report.documents += 1
+
+            chunks = self.splitter.split_text(doc.get('content', ''))
+            if not chunks:
+                self._finish(doc_id, content_hash, 0, report, failed)
+                continue
+            with self._lock:
+                # A document listed twice in one run is checkpointed once all copies are upserted
+                key = (doc_id, content_hash)
+                remaining[key] = remaining.get(key, 0) + len(chunks)
+                counts[key] = len(chunks)
+                report.chunks += len(chunks)
+            for i, chunk in enumerate(chunks):
+                metadata = {**doc.get('metadata', {}), 'text': chunk, 'doc_id': doc_id}
+                batch.append(_Chunk(doc_id, content_hash, f"{doc_id}_chunk_{i}", chunk, metadata))
+                if len(batch) >= self.embed_batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _process(self, batch: List[_Chunk], report: IngestionReport, remaining: Dict[Tuple[Any, str], int],
+                 counts: Dict[Tuple[Any, str], int], failed: set) -> None:
+        """Embed one batch and upsert it in chunks; runs on a worker thread."""
+        try:
+            embeddings = self._with_retry(self.embed, report, [chunk.text for chunk in batch])
+            with self._lock:
+                report.embedding_requests += 1
+            vectors: List[Vector] = [
+                (chunk.vector_id, embedding, chunk.metadata) for chunk, embedding in zip(batch, embeddings)
+            ]
+            for start in range(0, len(vectors), self.upsert_batch_size):
+                part = vectors[start:start + self.upsert_batch_size]
+                with timed('upsert', len(part)):
+                    self._with_retry(lambda: self.index.upsert(vectors=part), report)
+                with self._lock:
+                    report.upsert_requests += 1
+                    report.vectors_upserted += len(part)
+
+            finished = []
+            with self._lock:
+                for chunk in batch:
+                    key = (chunk.doc_id, chunk.content_hash)
+                    remaining[key] -= 1
+                    if not remaining[key]:
+                        del remaining[key]
+                        if chunk.doc_id not in failed:
+                            finished.append((key, counts[key]))
+            for (doc_id, content_hash), count in finished:
+                self._finish(doc_id, content_hash, count, report, failed)
+        except Exception as e:
+            doc_ids = {chunk.doc_id for chunk in batch}
+            logger.error(f"Ingestion batch failed for documents {sorted(map(str, doc_ids))}: {e}")
+            with self._lock:
+                failed.update(doc_ids)
+
+    def _finish(self, doc_id: Any, content_hash: str, chunks: int, report: IngestionReport, failed: set) -> None:
+        """Delete chunks left over from a longer previous version, then checkpoint the document."""
+        if self.checkpoint is None:
+            return
+        previous = self.checkpoint.chunk_count(doc_id) or 0
+        stale = [f"{doc_id}_chunk_{i}" for i in range(chunks, previous)]
+        try:
+            for start in range(0, len(stale), self.upsert_batch_size):
+                part = stale[start:start + self.upsert_batch_size]
+                self._with_retry(lambda: self.index.delete(ids=part), report)
+                with self._lock:
+                    report.vectors_deleted += len(part)
+        except Exception as e:
+            # Not checkpointed, so the next run deletes them again
+            logger.error(f"Deleting stale chunks of document {doc_id} failed: {e}")
+            with self._lock:
+                failed.add(doc_id)
+            return
+        self.checkpoint.mark_done(doc_id, content_hash, chunks)
+
+    def _with_retry(self, fn: Callable, report: IngestionReport, *args):
+        """Call fn, retrying failures with jittered exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Ingestion request failed ({e}), retry {attempt + 1}/{self.max_retries} "
+                               f"in {delay:.2f}s")
+                with self._lock:
+                    report.retries += 1
+                time.sleep(delay)
@@ -0,0 +1,114 @@
+"""Local stand-ins for the embedding API and the vector database (tests, offline runs)."""
+import hashlib
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeEmbeddingClient:
+    """
+    Deterministic embedding "API".
+
+    Hashes words into a fixed-size bag-of-words vector, so texts sharing
+    words are similar. Can simulate request latency and transient failures
+    to exercise batching and retries.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.dim = dim
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.inputs = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts in one simulated request."""
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("Simulated embedding API failure")
+        with self._lock:
+            self.inputs += len(texts)
+        return [self._vector(text) for text in texts]
+
+
+class InMemoryIndex:
+    """
+    Minimal Pinecone-compatible index: upsert(vectors=...), delete(ids=...) and query(...).
+
+    Supports the same metadata filters as RAGService sends ($eq / $in) and
+    can simulate latency and transient upsert failures.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.upserts = 0
+        self.vectors: Dict[str, Tuple[List[float], Dict[str, Any]]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[Tuple[str, List[float], Dict[str, Any]]]) -> Dict[str, int]:
+        with self._lock:
+            self.upserts += 1
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("Simulated vector DB failure")
+        with self._lock:
+            for vector_id, values, metadata in vectors:
+                self.vectors[vector_id] = (list(values), dict(metadata))
+        return {'upserted_count': len(vectors)}
+
+    def delete(self, ids: List[str]) -> Dict[str, Any]:
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("Simulated vector DB failure")
+        with self._lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+        return {}
+
+    @staticmethod
+    def _matches(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+        for field, condition in (filter or {}).items():
+            value = metadata.get(field)
+            if '$in' in condition and value not in condition['$in']:
+                return False
+            if '$eq' in condition and value != condition['$eq']:
+                return False
+        return True
+
+    def query(self, vector: List[float], top_k: int = 5, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with self._lock:
+            items = list(self.vectors.items())
+        matches = [
+            {
+                'id': vector_id,
+                'score': sum(a * b for a, b in zip(values, vector)),
+                **({'metadata': metadata} if include_metadata else {})
+            }
+            for vector_id, (values, metadata) in items
+            if self._matches(metadata, filter)
+        ]
+        matches.sort(key=lambda match: -match['score'])
+        return {'matches': matches[:top_k]}
@@ -1,54 +1,57 @@
 """RAG Service for document indexing and retrieval."""
-import os
-from typing import List, Dict, Any
-import openai
-from pinecone import Pinecone
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Any, Iterable, Optional
+from backend.services.retrievers import PineconeRetriever, Retriever, shared_retriever
 
 class RAGService:
     """Retrieval-Augmented Generation Service."""
     
-    def __init__(self):
-        """Initialize RAG service with Pinecone and OpenAI."""
-        self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-        self.index = self.pc.Index(os.getenv('PINECONE_INDEX', 'university-ai'))
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.chunk_size = int(os.getenv('CHUNK_SIZE', 500))
-        self.chunk_overlap = int(os.getenv('CHUNK_OVERLAP', 50))
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap
-        )
+    def __init__(self, index=None, embedding_client=None, retriever: Optional[Retriever] = None):
+        """
+        Initialize RAG service with the configured retrieval backend.
+        
+        RETRIEVER_BACKEND selects Pinecone + OpenAI ('pinecone', default) or
+        the in-process FAISS VectorStore shared with the FastAPI app ('local').
+        
+        Args:
+            index: Pinecone-compatible index to use instead of PINECONE_INDEX
+                (e.g. local_backends.InMemoryIndex)
+            embedding_client: Object with embed(texts) -> vectors to use instead
+                of the OpenAI API (e.g. local_backends.FakeEmbeddingClient)
+            retriever: Backend to use as-is; overrides RETRIEVER_BACKEND
+        """
+        if retriever is None:
+            if index is not None or embedding_client is not None:
+                retriever = PineconeRetriever(index, embedding_client)
+            else:
+                retriever = shared_retriever()
+        self.retriever = retriever
     
-    def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding from OpenAI."""
-        response = openai.Embedding.create(
-            input=text,
-            model='text-embedding-ada-002'
-        )
-        return response['data'][0]['embedding']
+    @property
+    def dimension(self) -> int:
+        """Embedding dimension of the backend."""
+        return self.retriever.dimension
     
-    def index_documents(self, documents: List[Dict[str, Any]]) -> None:
-        """Index documents in vector database."""
-        vectors = []
-        for doc in documents:
-            chunks = self.splitter.split_text(doc.get('content', ''))
-            for i, chunk in enumerate(chunks):
-                embedding = self._get_embedding(chunk)
-                vectors.append((
-                    f"{doc.get('id')}_chunk_{i}",
-                    embedding,
-                    {'text': chunk, 'doc_id': doc.get('id')}
-                ))
+    def index_documents(self, documents: Iterable[Dict[str, Any]],
+                        checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Index documents in vector database.
         
-        self.index.upsert(vectors=vectors)
+        With Pinecone, chunks are embedded in batches and upserted by a
+        bounded pool of workers, with retries and a resume checkpoint (see
+        IngestionPipeline); the local store re-embeds only changed documents.
+        
+        Returns:
+            Ingestion report: IngestionReport with Pinecone (counts, retries,
+            failed document IDs), LocalIndexReport with the local store
+            (counts, documents rejected for invalid metadata)
+        """
+        return self.retriever.index_documents(documents, checkpoint_path)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, e.g. to reuse one embedding for caching and retrieval."""
+        return self.retriever.embed_query(query)
     
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Retrieve relevant documents from vector database."""
-        query_embedding = self._get_embedding(query)
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
-        return results.get('matches', [])
+    def retrieve(self, query: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant documents, restricted to matching metadata if filters are given."""
+        return self.retriever.retrieve(query, top_k=top_k, filters=filters, query_embedding=query_embedding)
@@ -0,0 +1,246 @@
+"""Retrieval backends for RAGService: Pinecone + OpenAI embeddings, or the local FAISS VectorStore."""
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Protocol
+from backend.app.core.metrics import timed
+from backend.services.clients import openai_sdk, pinecone_index
+from backend.services.ingestion import IngestionPipeline
+
+logger = logging.getLogger(__name__)
+
+RETRIEVER_BACKENDS = ('pinecone', 'local')
+
+
+class Retriever(Protocol):
+    """
+    What RAGService needs from a retrieval backend.
+
+    Matches are Pinecone-shaped dicts ({'id', 'score', 'metadata': {'text',
+    'doc_id', ...document metadata}}), so callers do not depend on the backend.
+    """
+
+    dimension: int
+
+    def embed_query(self, query: str) -> List[float]:
+        ...
+
+    def retrieve(self, query: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        ...
+
+    def index_documents(self, documents: Iterable[Dict[str, Any]],
+                        checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+
+@dataclass
+class LocalIndexReport:
+    """
+    Counts for one write to the local store.
+
+    The store chunks and embeds inside a single write, so unlike
+    IngestionReport there are no chunk, request or retry counts, and no
+    upstream failures: documents are only rejected for invalid metadata.
+    """
+    documents: int = 0
+    added: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid_documents: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class PineconeRetriever:
+    """OpenAI embeddings and a Pinecone index (two network round trips per query)."""
+
+    def __init__(self, index=None, embedding_client=None):
+        """
+        Args:
+            index: Pinecone-compatible index to use instead of PINECONE_INDEX
+                (e.g. local_backends.InMemoryIndex)
+            embedding_client: Object with embed(texts) -> vectors to use instead
+                of the OpenAI API (e.g. local_backends.FakeEmbeddingClient)
+        """
+        if index is None:
+            index = pinecone_index(os.getenv('PINECONE_INDEX', 'university-ai'))
+        self.index = index
+        self.embedding_client = embedding_client
+        self.embedding_model = 'text-embedding-ada-002'
+        self.dimension = getattr(embedding_client, 'dim', None) or int(os.getenv('VECTOR_DB_DIMENSION', 1536))
+        self._splitter = None
+
+    @property
+    def splitter(self):
+        """Text splitter, built on first indexing (langchain is slow to import)."""
+        if self._splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=int(os.getenv('CHUNK_SIZE', 500)),
+                chunk_overlap=int(os.getenv('CHUNK_OVERLAP', 50))
+            )
+        return self._splitter
+
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for many texts in one request."""
+        with timed('embed', len(texts)):
+            if self.embedding_client is not None:
+                return self.embedding_client.embed(texts)
+            response = openai_sdk().Embedding.create(
+                input=texts,
+                model=self.embedding_model
+            )
+        return [item['embedding'] for item in sorted(response['data'], key=lambda item: item['index'])]
+
+    def embed_query(self, query: str) -> List[float]:
+        return self._get_embeddings([query])[0]
+
+    def retrieve(self, query: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        kwargs = {'filter': self._metadata_filter(filters)} if filters else {}
+        with timed('search'):
+            results = self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                include_metadata=True,
+                **kwargs
+            )
+        return results.get('matches', [])
+
+    def index_documents(self, documents: Iterable[Dict[str, Any]],
+                        checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """Batched, concurrent, resumable ingestion; see IngestionPipeline."""
+        pipeline = IngestionPipeline.from_env(self.splitter, self._get_embeddings, self.index, checkpoint_path)
+        return pipeline.run(documents).to_dict()
+
+    @staticmethod
+    def _metadata_filter(filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Translate {field: value | [values]} into a Pinecone metadata filter."""
+        return {
+            field: {'$in': list(value)} if isinstance(value, (list, tuple)) else {'$eq': value}
+            for field, value in filters.items()
+        }
+
+
+class LocalRetriever:
+    """
+    In-process retrieval with the FastAPI stack's VectorStore (or its
+    ShardedVectorStore when SHARDS is set).
+
+    Same engine as the FastAPI app (local embedding model, FAISS + BM25
+    hybrid search, metadata filters, snapshots), so a query is an in-memory
+    lookup instead of two network calls. Workers sharing LOCAL_INDEX_PATH
+    pick up each other's writes by polling for new snapshot generations.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, refresh_seconds: Optional[float] = None):
+        # Imported here so Pinecone deployments never load the local embedding model
+        from backend.app.core.sharding import vector_store_from_env
+        from backend.app.core.metadata import validate_metadata
+
+        self._validate_metadata = validate_metadata
+        self.store = vector_store_from_env(index_path or os.getenv('LOCAL_INDEX_PATH', 'data/vector_index.faiss'))
+        self.store.load_documents()
+        self.dimension = self.store.embedding_gen.embedding_dim
+        if refresh_seconds is None:
+            refresh_seconds = float(os.getenv('INDEX_REFRESH_SECONDS', 2))
+        self.refresh_seconds = refresh_seconds
+        self._refreshed_at = time.monotonic()
+
+    def _maybe_refresh(self) -> None:
+        """Switch to snapshots published by other workers, checking at most every refresh_seconds."""
+        if self.refresh_seconds <= 0 or time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        self._refreshed_at = time.monotonic()
+        try:
+            self.store.refresh()
+        except Exception as e:
+            logger.warning(f"Snapshot refresh failed: {e}")
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.store.embedding_gen.embed([query])[0].tolist()
+
+    def retrieve(self, query: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Search the local store.
+
+        query_embedding is not needed: the store embeds the query itself and
+        a query embedded by embed_query() is served from the embedding cache.
+        """
+        self._maybe_refresh()
+        return [
+            {
+                'id': str(passage.id),
+                'score': passage.score,
+                'metadata': {
+                    **self.store.document_metadata(passage.doc_key),
+                    'text': passage.text,
+                    'doc_id': passage.doc_key
+                }
+            }
+            for passage in self.store.search(query, top_k=top_k, filters=filters)
+        ]
+
+    def index_documents(self, documents: Iterable[Dict[str, Any]],
+                        checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add or replace documents in one copy-on-write write.
+
+        No checkpoint is needed: unchanged documents are skipped by content
+        hash, so re-sending a batch only re-embeds what changed. Returns a
+        LocalIndexReport as a dict.
+        """
+        started = time.monotonic()
+        report = LocalIndexReport()
+        upserts: Dict[str, str] = {}
+        metadata: Dict[str, Dict[str, Any]] = {}
+        invalid = []
+        for doc in documents:
+            key = str(doc.get('id'))
+            report.documents += 1
+            try:
+                metadata[key] = self._validate_metadata(doc.get('metadata') or {})
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Skipping document {key}: {e}")
+                invalid.append(key)
+                continue
+            upserts[key] = doc.get('content', '')
+
+        if upserts:
+            result = self.store.upsert(upserts, metadata)
+            report.added = result.get('added', 0)
+            report.updated = result.get('updated', 0)
+            report.skipped = result.get('unchanged', 0)
+            report.documents -= report.skipped
+        report.invalid_documents = sorted(invalid)
+        report.seconds = time.monotonic() - started
+        return report.to_dict()
+
+
+_shared_retrievers: Dict[str, Retriever] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_retriever(backend: Optional[str] = None) -> Retriever:
+    """
+    Process-wide retriever for RETRIEVER_BACKEND ('pinecone' or 'local').
+
+    The routes, ChatService and SemanticSearchService each create a
+    RAGService; sharing the backend keeps one index (and, for 'local', one
+    embedding model) per process.
+    """
+    backend = (backend or os.getenv('RETRIEVER_BACKEND', 'pinecone')).lower()
+    if backend not in RETRIEVER_BACKENDS:
+        raise ValueError(f"Unknown RETRIEVER_BACKEND '{backend}', expected one of {RETRIEVER_BACKENDS}")
+    with _shared_lock:
+        if backend not in _shared_retrievers:
+            _shared_retrievers[backend] = LocalRetriever() if backend == 'local' else PineconeRetriever()
+        return _shared_retrievers[backend]
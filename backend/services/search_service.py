@@ -1,24 +1,23 @@
 """Semantic search service."""
 import os
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, Optional
 from backend.services.rag_service import RAGService
 
 class SemanticSearchService:
     """Semantic search service using vector embeddings."""
     
-    def __init__(self):
-        """Initialize semantic search service."""
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.rag_service = RAGService()
+    def __init__(self, rag_service: Optional[RAGService] = None):
+        """Initialize semantic search service (sharing rag_service if one is given)."""
+        self.rag_service = rag_service or RAGService()
         self.top_k = int(os.getenv('TOP_K_RESULTS', 5))
     
-    def search(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
+    def search(self, query: str, top_k: int = None, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Perform semantic search on indexed documents."""
         if top_k is None:
             top_k = self.top_k
         
-        results = self.rag_service.retrieve(query, top_k=top_k)
+        # Filters are applied by the index, so top_k matching results come back
+        results = self.rag_service.retrieve(query, top_k=top_k, filters=filters)
         
         formatted_results = []
         for result in results:
@@ -31,20 +30,7 @@ class SemanticSearchService:
         
         return formatted_results
     
-    def search_with_filters(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Perform semantic search with filters."""
-        results = self.rag_service.retrieve(query, top_k=self.top_k)
-        
-        if filters:
-            results = self._apply_filters(results, filters)
-        
-        return results
-    
-    def _apply_filters(self, results: List[Dict], filters: Dict[str, Any]) -> List[Dict]:
-        """Apply filters to search results."""
-        filtered = []
-        for result in results:
-            metadata = result.get('metadata', {})
-            if all(metadata.get(k) == v for k, v in filters.items()):
-                filtered.append(result)
-        return filtered
+    def search_with_filters(self, query: str, filters: Dict[str, Any] = None,
+                            top_k: int = None) -> List[Dict[str, Any]]:
+        """Perform semantic search restricted to documents whose metadata matches filters."""
+        return self.search(query, top_k=top_k, filters=filters)
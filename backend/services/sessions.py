@@ -0,0 +1,81 @@
+"""Chat session stores for the Flask app."""
+import os
+import threading
+import time
+from typing import List
+from backend import db
+from backend.app.core.conversation import Turn, session_store_from_env as core_session_store
+from backend.models import ConversationTurn
+
+class SQLSessionStore:
+    """
+    Sessions in the app database (Flask-SQLAlchemy `db`), shared by all workers.
+    
+    Same interface and limits as the in-memory store; needs an app context,
+    which every request has.
+    """
+    
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600.0, max_turns: int = 50,
+                 prune_every: int = 100):
+        self.max_sessions = max_sessions
+        self.ttl = ttl_seconds
+        self.max_turns = max_turns
+        self.prune_every = prune_every
+        self._appends = 0
+        self._lock = threading.Lock()
+    
+    def history(self, session_id: str) -> List[Turn]:
+        rows = (ConversationTurn.query.filter_by(session_id=session_id)
+                .order_by(ConversationTurn.id.desc()).limit(self.max_turns).all())
+        if not rows or time.time() - rows[0].created_at > self.ttl:
+            return []
+        return [Turn(row.role, row.content) for row in reversed(rows)]
+    
+    def append(self, session_id: str, *turns: Turn) -> None:
+        now = time.time()
+        db.session.add_all([
+            ConversationTurn(session_id=session_id, role=turn.role, content=turn.content, created_at=now)
+            for turn in turns
+        ])
+        db.session.flush()
+        keep = (db.session.query(ConversationTurn.id).filter_by(session_id=session_id)
+                .order_by(ConversationTurn.id.desc()).limit(self.max_turns).subquery())
+        (ConversationTurn.query.filter_by(session_id=session_id)
+         .filter(ConversationTurn.id.notin_(db.select(keep.c.id)))
+         .delete(synchronize_session=False))
+        with self._lock:
+            self._appends += 1
+            prune = self._appends % self.prune_every == 0
+        if prune:
+            self._prune(now)
+        db.session.commit()
+    
+    def _prune(self, now: float) -> None:
+        """Drop expired sessions and the least recently active ones beyond max_sessions."""
+        last_active = db.func.max(ConversationTurn.created_at)
+        expired = (db.session.query(ConversationTurn.session_id).group_by(ConversationTurn.session_id)
+                   .having(last_active < now - self.ttl).subquery())
+        surplus = (db.session.query(ConversationTurn.session_id).group_by(ConversationTurn.session_id)
+                   .order_by(last_active.desc()).offset(self.max_sessions).subquery())
+        for stale in (expired, surplus):
+            (ConversationTurn.query.filter(ConversationTurn.session_id.in_(db.select(stale.c.session_id)))
+             .delete(synchronize_session=False))
+    
+    def clear(self, session_id: str) -> None:
+        ConversationTurn.query.filter_by(session_id=session_id).delete()
+        db.session.commit()
+    
+    def stats(self) -> dict:
+        sessions = db.session.query(db.func.count(db.distinct(ConversationTurn.session_id))).scalar()
+        return {'backend': 'sqlalchemy', 'sessions': sessions, 'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl, 'max_turns': self.max_turns}
+
+def session_store_from_env():
+    """SESSION_STORE=sqlalchemy keeps sessions in the app database; memory and sqlite as in the FastAPI app."""
+    if os.getenv('SESSION_STORE', 'memory').lower() != 'sqlalchemy':
+        return core_session_store()
+    return SQLSessionStore(
+        max_sessions=int(os.getenv('SESSION_MAX', 10000)),
+        ttl_seconds=float(os.getenv('SESSION_TTL_SECONDS', 3600)),
+        max_turns=int(os.getenv('SESSION_MAX_TURNS', 50))
+    )
@@ -0,0 +1,14 @@
+"""
+Test setup: import path and an embedding backend that needs no model download
+Run from the repository root: python -m pytest backend/tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Both apps are imported as backend.* (the FastAPI core as backend.app.core, as the Flask app does)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault('EMBEDDING_BACKEND', 'hash')
+os.environ.setdefault('EMBEDDING_CACHE_DIR', '')
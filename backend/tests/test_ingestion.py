@@ -0,0 +1,81 @@
+"""IngestionPipeline retries, checkpoints and re-ingestion of edited documents"""
+
+from backend.services.ingestion import IngestionCheckpoint, IngestionPipeline
+from backend.services.local_backends import FakeEmbeddingClient, InMemoryIndex
+
+
+class WordSplitter:
+    """Chunks of 10 words"""
+
+    def split_text(self, text):
+        words = text.split()
+        return [" ".join(words[i:i + 10]) for i in range(0, len(words), 10)]
+
+
+def _document(doc_id, words):
+    return {"id": doc_id, "content": " ".join(f"{doc_id}word{i}" for i in range(words))}
+
+
+def _pipeline(index, embed, checkpoint_path, **kwargs):
+    return IngestionPipeline(WordSplitter(), embed, index, embed_batch_size=8, upsert_batch_size=5,
+                             concurrency=4, backoff_base=0.0, checkpoint=IngestionCheckpoint(str(checkpoint_path)),
+                             **kwargs)
+
+
+def test_retries_absorb_injected_failures(tmp_path):
+    embeddings = FakeEmbeddingClient(dim=32, failure_rate=0.2)
+    index = InMemoryIndex(failure_rate=0.2)
+    documents = [_document(f"d{i}", 30) for i in range(40)]
+
+    report = _pipeline(index, embeddings.embed, tmp_path / "checkpoint.tsv", max_retries=10).run(documents)
+
+    assert report.retries > 0
+    assert report.failed_documents == []
+    assert report.chunks == report.vectors_upserted == len(index.vectors) == 120
+
+
+def test_failed_documents_are_retried_on_next_run(tmp_path):
+    documents = [_document(f"d{i}", 30) for i in range(40)]
+    # Without retries some batches fail for good and their documents stay out of the checkpoint
+    first = _pipeline(InMemoryIndex(failure_rate=0.3), FakeEmbeddingClient(dim=32).embed,
+                      tmp_path / "checkpoint.tsv", max_retries=0).run(documents)
+    assert first.failed_documents
+    assert first.documents == 40
+
+    index = InMemoryIndex()
+    second = _pipeline(index, FakeEmbeddingClient(dim=32).embed, tmp_path / "checkpoint.tsv").run(documents)
+
+    assert second.failed_documents == []
+    assert second.documents == len(first.failed_documents)
+    assert second.skipped == 40 - len(first.failed_documents)
+
+
+def test_resumed_run_skips_checkpointed_documents(tmp_path):
+    documents = [_document(f"d{i}", 25) for i in range(20)]
+    _pipeline(InMemoryIndex(), FakeEmbeddingClient(dim=32).embed, tmp_path / "checkpoint.tsv").run(documents[:12])
+
+    embeddings = FakeEmbeddingClient(dim=32)
+    index = InMemoryIndex()
+    report = _pipeline(index, embeddings.embed, tmp_path / "checkpoint.tsv").run(documents)
+
+    assert (report.skipped, report.documents) == (12, 8)
+    assert report.chunks == len(index.vectors) == 8 * 3
+    assert embeddings.inputs == 8 * 3
+
+
+def test_edited_document_drops_surplus_chunks(tmp_path):
+    index = InMemoryIndex()
+    embeddings = FakeEmbeddingClient(dim=32)
+    _pipeline(index, embeddings.embed, tmp_path / "checkpoint.tsv").run([_document("a", 50), _document("b", 20)])
+    assert len(index.vectors) == 5 + 2
+
+    edited = {"id": "a", "content": "a much shorter version"}
+    report = _pipeline(index, embeddings.embed, tmp_path / "checkpoint.tsv").run([edited, _document("b", 20)])
+
+    assert (report.documents, report.skipped, report.vectors_deleted) == (1, 1, 4)
+    assert sorted(index.vectors) == ["a_chunk_0", "b_chunk_0", "b_chunk_1"]
+    assert index.vectors["a_chunk_0"][1]["text"] == "a much shorter version"
+
+    # Emptied documents lose every chunk
+    _pipeline(index, embeddings.embed, tmp_path / "checkpoint.tsv").run([{"id": "b", "content": ""}])
+    assert sorted(index.vectors) == ["a_chunk_0"]
@@ -0,0 +1,36 @@
+"""VectorStore writes and snapshots"""
+
+from backend.app.core.vector_store import VectorStore
+
+
+def _store(tmp_path) -> VectorStore:
+    store = VectorStore(str(tmp_path / "vector_index.faiss"))
+    store.open()
+    return store
+
+
+def test_upsert_survives_reopen(tmp_path):
+    _store(tmp_path).upsert({"a": "Parking permits cost $200", "b": "Tuition is due in August"})
+
+    reopened = _store(tmp_path)
+    assert reopened.document_count == 2
+    assert reopened.search("parking permits", top_k=1, mode="vector")[0].doc_key == "a"
+
+
+def test_delete_all_survives_reopen(tmp_path):
+    store = _store(tmp_path)
+    peer = _store(tmp_path)
+    store.upsert({"a": "Parking permits cost $200", "b": "Tuition is due in August"})
+    assert peer.refresh()
+
+    store.delete(["a", "b"])
+
+    assert store.document_count == 0
+    assert peer.refresh() and peer.document_count == 0
+    reopened = _store(tmp_path)
+    assert reopened.document_count == 0
+    assert reopened.search("parking permits") == []
+
+    # The emptied store still takes writes
+    reopened.upsert({"c": "Library hours are 8am to midnight"})
+    assert [p.doc_key for p in _store(tmp_path).search("library hours", mode="vector")] == ["c"]